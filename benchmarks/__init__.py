@@ -0,0 +1 @@
+"""Benchmarks for ExcelCppSyntaxHighlight (run with python -m benchmarks.<name>)."""
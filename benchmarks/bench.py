@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""Run the standard scenarios and compare them against a stored baseline.
+
+Each scenario processes a synthetic workbook several times with
+``process_excel`` and records the time of every phase (load, detect, lex,
+save and the total).  A comparison reports the change of the median per
+phase and flags it when it exceeds the threshold and a one-sided
+Mann-Whitney U test finds the runs significantly slower.
+
+Usage:
+    python -m benchmarks.bench --save-baseline baseline.json
+    python -m benchmarks.bench --compare baseline.json [--threshold 10]
+
+Exits with status 1 when a phase regressed.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+
+import openpyxl
+import pygments
+
+from benchmarks.synthetic import make_workbook
+from cpp_highlight.models import RunStats
+from cpp_highlight.processor import process_excel
+
+BASELINE_FORMAT = 1
+
+# make_workbook arguments per scenario; rows are multiplied by --scale
+SCENARIOS = {
+    "detect-heavy": dict(rows=20000, columns=2, code_ratio=0.02, max_lines=3),
+    "lex-heavy": dict(rows=1500, columns=1, code_ratio=1.0, max_lines=40),
+    "duplicate-heavy": dict(
+        rows=10000, columns=1, code_ratio=0.8, max_lines=8, distinct=50
+    ),
+    "many-sheets": dict(sheets=40, rows=150, columns=2),
+}
+
+PHASES = ("load", "detect", "lex", "save", "total")
+
+# Up to this many rank combinations the p-value is computed exactly
+_EXACT_LIMIT = 20000
+
+
+def environment() -> Dict[str, str]:
+    """Return the versions a baseline was measured with."""
+    return {
+        "python": platform.python_version(),
+        "pygments": pygments.__version__,
+        "openpyxl": openpyxl.__version__,
+        "machine": platform.machine(),
+    }
+
+
+def run_scenario(
+    name: str, runs: int, scale: float, tmp: str
+) -> Dict[str, List[float]]:
+    """Process a scenario's workbook ``runs`` times.
+
+    Returns:
+        Seconds per run, by phase
+    """
+    params = dict(SCENARIOS[name])
+    params["rows"] = max(1, int(params["rows"] * scale))
+    input_path = os.path.join(tmp, f"{name}.xlsx")
+    output_path = os.path.join(tmp, f"{name}_output.xlsx")
+    make_workbook(input_path, **params)
+
+    # One unmeasured run warms imports and caches
+    process_excel(input_path, output_path)
+
+    samples = {phase: [] for phase in PHASES}
+    for _ in range(runs):
+        stats = RunStats()
+        start = time.perf_counter()
+        process_excel(input_path, output_path, stats=stats)
+        samples["total"].append(time.perf_counter() - start)
+        samples["load"].append(stats.load_seconds.total)
+        samples["detect"].append(stats.detect_seconds.total)
+        samples["lex"].append(stats.lex_seconds.total)
+        samples["save"].append(stats.save_seconds.total)
+    return samples
+
+
+def run_all(
+    names: List[str], runs: int, scale: float
+) -> Dict[str, Dict[str, List[float]]]:
+    """Run scenarios, printing progress to stderr."""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in names:
+            print(f"running {name} ({runs} runs)...", file=sys.stderr)
+            results[name] = run_scenario(name, runs, scale, tmp)
+    return results
+
+
+def _ranks(values: List[float]) -> List[float]:
+    """Return 1-based ranks, averaged over ties."""
+    order = sorted(range(len(values)), key=values.__getitem__)
+    ranks = [0.0] * len(values)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[order[k]] = (i + j) / 2 + 1
+        i = j + 1
+    return ranks
+
+
+def rank_sum_p(before: List[float], after: List[float]) -> float:
+    """One-sided Mann-Whitney U p-value that ``after`` tends to be larger.
+
+    Exact for small samples, normal approximation otherwise.  With three or
+    fewer runs per side no difference can reach p < 0.05.
+    """
+    ranks = _ranks(before + after)
+    observed = sum(ranks[len(before) :])
+    n, m = len(after), len(before)
+    if math.comb(n + m, n) <= _EXACT_LIMIT:
+        sums = [sum(combo) for combo in combinations(ranks, n)]
+        return sum(1 for s in sums if s >= observed - 1e-9) / len(sums)
+    mean = n * (n + m + 1) / 2
+    sd = math.sqrt(n * m * (n + m + 1) / 12)
+    return 0.5 * math.erfc((observed - 0.5 - mean) / sd / math.sqrt(2))
+
+
+def compare(
+    baseline: Dict[str, Dict[str, List[float]]],
+    current: Dict[str, Dict[str, List[float]]],
+    threshold: float,
+    alpha: float = 0.05,
+    min_delta: float = 0.005,
+) -> List[Tuple[str, str, float, float, float, Optional[float], str]]:
+    """Compare phase timings of scenarios present in both results.
+
+    Args:
+        baseline: Seconds per run by phase, by scenario
+        current: The same for the new runs
+        threshold: Relative change of the median that matters, e.g. 0.1
+        alpha: Significance level of the rank-sum test
+        min_delta: Seconds the median must move by at least, so phases of a
+            few milliseconds do not report timer noise
+
+    Returns:
+        (scenario, phase, baseline median, current median, relative change,
+        p-value or None if not tested, verdict) rows; verdict is "slower",
+        "faster" or "same"
+    """
+    rows = []
+    for name, phases in current.items():
+        if name not in baseline:
+            continue
+        for phase in PHASES:
+            before, after = baseline[name][phase], phases[phase]
+            old, new = statistics.median(before), statistics.median(after)
+            change = (new - old) / old if old else 0.0
+            verdict, p = "same", None
+            if abs(new - old) < min_delta:
+                pass
+            elif change > threshold:
+                p = rank_sum_p(before, after)
+                verdict = "slower" if p < alpha else "same"
+            elif change < -threshold:
+                p = rank_sum_p(after, before)
+                verdict = "faster" if p < alpha else "same"
+            rows.append((name, phase, old, new, change, p, verdict))
+    return rows
+
+
+def print_summary(results: Dict[str, Dict[str, List[float]]]) -> None:
+    """Print the median time of each phase per scenario."""
+    print(f"{'scenario':<16} " + " ".join(f"{phase:>9}" for phase in PHASES))
+    for name, phases in results.items():
+        medians = (statistics.median(phases[phase]) for phase in PHASES)
+        print(f"{name:<16} " + " ".join(f"{value:>8.3f}s" for value in medians))
+
+
+def print_comparison(rows) -> None:
+    """Print the rows returned by ``compare`` as a table."""
+    print(
+        f"{'scenario':<16} {'phase':<7} {'baseline':>9} {'current':>9} "
+        f"{'change':>8} {'p':>6}  verdict"
+    )
+    for name, phase, old, new, change, p, verdict in rows:
+        p_text = "-" if p is None else f"{p:.3f}"
+        print(
+            f"{name:<16} {phase:<7} {old:>8.3f}s {new:>8.3f}s "
+            f"{change:>+7.1%} {p_text:>6}  {verdict}"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.bench",
+        description="Run benchmark scenarios and compare them to a baseline",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--save-baseline", metavar="PATH", help="Write results to PATH")
+    mode.add_argument(
+        "--compare", metavar="PATH", help="Compare against the baseline at PATH"
+    )
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=list(SCENARIOS),
+        help="Scenario to run (repeatable, default: all)",
+    )
+    parser.add_argument(
+        "--runs", type=int, default=5, help="Measured runs per scenario (default: 5)"
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=None,
+        help="Multiply the scenarios' row counts (default: 1, or the baseline's)",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="Percent change of a phase median that counts (default: 10)",
+    )
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=0.05,
+        help="Significance level of the rank-sum test (default: 0.05)",
+    )
+    parser.add_argument(
+        "--min-delta",
+        type=float,
+        default=5.0,
+        help="Milliseconds a phase median must change by to count (default: 5)",
+    )
+    args = parser.parse_args(argv)
+
+    baseline = None
+    scale = args.scale
+    names = args.scenario or list(SCENARIOS)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("format") != BASELINE_FORMAT:
+            parser.error(f"{args.compare} is not a baseline of this version")
+        if scale is None:
+            scale = baseline["scale"]
+        elif scale != baseline["scale"]:
+            parser.error(f"--scale differs from the baseline's ({baseline['scale']})")
+        names = [name for name in names if name in baseline["scenarios"]]
+        if baseline["environment"] != environment():
+            print(
+                f"note: baseline measured with {baseline['environment']}",
+                file=sys.stderr,
+            )
+    scale = 1.0 if scale is None else scale
+
+    results = run_all(names, args.runs, scale)
+
+    if args.save_baseline:
+        record = {
+            "format": BASELINE_FORMAT,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "environment": environment(),
+            "runs": args.runs,
+            "scale": scale,
+            "scenarios": results,
+        }
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=1)
+        print_summary(results)
+        print(f"\nBaseline written to {args.save_baseline}")
+        return 0
+
+    if baseline is None:
+        print_summary(results)
+        return 0
+
+    rows = compare(
+        baseline["scenarios"],
+        results,
+        args.threshold / 100,
+        args.alpha,
+        args.min_delta / 1000,
+    )
+    print_comparison(rows)
+    regressions = [row for row in rows if row[-1] == "slower"]
+    if regressions:
+        print(
+            f"\n{len(regressions)} phase(s) slower than the baseline by more "
+            f"than {args.threshold:g}%"
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Compare allocations of list-based and streaming highlighting.
+
+The list-based pipeline materializes ``list(lex(...))``, slices off the
+trailing newline and walks the tokens a second time for the row height.
+``CellHighlighter.highlight`` builds runs and the line count in one pass.
+
+Usage: python -m benchmarks.bench_alloc [cells]
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+
+from openpyxl.cell.rich_text import CellRichText
+from pygments import lex
+from pygments.token import Token
+
+from benchmarks.synthetic import code_snippet
+from cpp_highlight.config import BudgetSettings
+from cpp_highlight.core import CellHighlighter, calculate_required_height
+from cpp_highlight.models import TextBlock
+
+
+def list_highlight(highlighter: CellHighlighter, text: str):
+    """Highlight the way it was done before streaming."""
+    tokens = list(lex(text, highlighter.lexer))
+    if tokens and tokens[-1][0] == Token.Text.Whitespace and tokens[-1][1] == "\n":
+        tokens = tokens[:-1]
+    blocks = []
+    for token_type, value in tokens:
+        font = highlighter._token_fonts.get(token_type)
+        if font is None:
+            font = highlighter._font_for(token_type)
+        blocks.append(TextBlock(text=value, font=font))
+    return CellRichText(*blocks), calculate_required_height(tokens, highlighter.font)
+
+
+def measure(highlight, texts):
+    """Return (seconds, peak traced bytes) of highlighting every text once.
+
+    Time is taken without tracing, which slows allocation-heavy code down.
+    """
+    start = time.perf_counter()
+    for text in texts:
+        highlight(text)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for text in texts:
+        highlight(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    cells = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rng = random.Random(0)
+    texts = [code_snippet(rng, rng.randint(1, 40)) for _ in range(cells)]
+    texts.append(code_snippet(rng, 2_000))
+
+    # The list-based pipeline knows no budget
+    highlighter = CellHighlighter(budget=BudgetSettings.unlimited())
+    for text in texts:
+        expected = list_highlight(highlighter, text)
+        assert highlighter.highlight(text) == expected, "streaming output differs"
+
+    # Keep only one cell's result alive, as the processor does per cell
+    list_time, list_peak = measure(lambda t: list_highlight(highlighter, t), texts)
+    stream_time, stream_peak = measure(highlighter.highlight, texts)
+
+    print(f"cells:     {len(texts)} (largest {max(map(len, texts))} chars)")
+    print(f"list:      {list_time:.3f}s, peak {list_peak / 1024:.0f} KiB")
+    print(
+        f"streaming: {stream_time:.3f}s, peak {stream_peak / 1024:.0f} KiB "
+        f"({list_peak / stream_peak:.2f}x less)"
+    )
+
+
+if __name__ == "__main__":
+    main()
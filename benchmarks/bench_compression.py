@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""Compare save time and file size of the output compression modes.
+
+Usage: python -m benchmarks.bench_compression [cells]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_save import make_highlighted
+from cpp_highlight.writer import COMPRESSION_MODES, save_workbook
+
+
+def main():
+    cells = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    wb = make_highlighted(cells)
+    print(f"cells:     {cells}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in COMPRESSION_MODES:
+            path = os.path.join(tmp, f"{mode}.xlsx")
+            start = time.perf_counter()
+            save_workbook(wb, path, mode)
+            elapsed = time.perf_counter() - start
+            size = os.path.getsize(path) / 1e6
+            print(f"{mode + ':':<10} {elapsed:.3f}s  {size:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Compare peak memory of eager and deferred rich text.
+
+Highlights every cell of a plain-text workbook and saves it, once with a
+CellRichText per cell and once with LazyRichText values, and reports the
+tracemalloc peak of each against saving the plain workbook.
+
+Usage: python -m benchmarks.bench_deferred [cells]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+from openpyxl import Workbook
+
+from benchmarks.synthetic import code_snippet
+from cpp_highlight.core import CellHighlighter
+from cpp_highlight.writer import save_workbook
+
+
+def plain_workbook(cells: int) -> Workbook:
+    rng = random.Random(0)
+    wb = Workbook()
+    ws = wb.active
+    for row in range(1, cells + 1):
+        ws.cell(row=row, column=1, value=code_snippet(rng, rng.randint(1, 6)))
+    return wb
+
+
+def measure(cells: int, mode: str, path: str):
+    """Return (seconds, peak traced bytes) of highlighting and saving."""
+    highlighter = CellHighlighter()
+    # Warm the font and markup caches outside the measurement
+    highlighter.highlight("int x = 0; // warm up")
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    wb = plain_workbook(cells)
+    for (cell,) in wb.active.iter_rows():
+        if mode == "eager":
+            cell.value, _ = highlighter.highlight(cell.value)
+        elif mode == "deferred":
+            runs, _ = highlighter.highlight_runs(cell.value)
+            cell.value = highlighter.defer(runs)
+    save_workbook(wb, path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    cells = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {
+            mode: measure(cells, mode, os.path.join(tmp, f"{mode}.xlsx"))
+            for mode in ("plain", "eager", "deferred")
+        }
+        sheet = "xl/worksheets/sheet1.xml"
+        with zipfile.ZipFile(os.path.join(tmp, "eager.xlsx")) as a, zipfile.ZipFile(
+            os.path.join(tmp, "deferred.xlsx")
+        ) as b:
+            assert a.read(sheet) == b.read(sheet), "deferred output differs"
+
+    print(f"cells:     {cells}")
+    for mode, (elapsed, peak) in results.items():
+        print(f"{mode + ':':<10} {elapsed:.2f}s, peak {peak / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""Compare per-cell and column-wide C++ detection.
+
+Usage: python -m benchmarks.bench_detection [rows]
+"""
+
+import sys
+import time
+
+from benchmarks.synthetic import make_column
+from cpp_highlight.core import is_cpp_code
+from cpp_highlight.core.batch import BatchDetector
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    column = make_column(rows)
+
+    start = time.perf_counter()
+    per_cell = [is_cpp_code(text) for text in column]
+    per_cell_time = time.perf_counter() - start
+
+    detector = BatchDetector()
+    start = time.perf_counter()
+    batch = detector.detect(column)
+    batch_time = time.perf_counter() - start
+
+    assert per_cell == batch.tolist(), "batch decisions differ from is_cpp_code"
+
+    print(f"rows:      {rows}")
+    print(f"detected:  {sum(per_cell)}")
+    print(f"per-cell:  {per_cell_time:.3f}s")
+    print(f"batch:     {batch_time:.3f}s ({per_cell_time / batch_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Compare one-pass language classification with one scan per language.
+
+Classifies a column of code and prose cells into all registered languages
+once with a single classifier, and once by scanning each cell with a
+separate classifier per language and picking the best-scoring one.
+
+Usage: python -m benchmarks.bench_languages [rows]
+"""
+
+import sys
+import time
+
+from benchmarks.synthetic import make_column
+from cpp_highlight.core import is_cpp_code
+from cpp_highlight.core.languages import LANGUAGES, LanguageClassifier
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    column = make_column(rows)
+
+    start = time.perf_counter()
+    for text in column:
+        is_cpp_code(text)
+    cpp_time = time.perf_counter() - start
+
+    classifier = LanguageClassifier()
+    start = time.perf_counter()
+    for text in column:
+        classifier.classify(text)
+    one_pass_time = time.perf_counter() - start
+
+    separate = [LanguageClassifier([name]) for name in LANGUAGES]
+    start = time.perf_counter()
+    for text in column:
+        for detector in separate:
+            detector.scores(text)
+    separate_time = time.perf_counter() - start
+
+    print(f"rows:      {rows}, {len(LANGUAGES)} languages")
+    print(f"is_cpp_code: {cpp_time:.3f}s (C++ only, stops early)")
+    print(f"one pass:    {one_pass_time:.3f}s")
+    print(
+        f"per language: {separate_time:.3f}s "
+        f"({separate_time / one_pass_time:.1f}x one pass)"
+    )
+
+
+if __name__ == "__main__":
+    main()
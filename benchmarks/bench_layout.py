@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Time wrapped line counting with and without NumPy.
+
+Counts the displayed lines of synthetic code cells in a default-width
+column, where most lines wrap, and in a wide one, where few do.
+
+Usage: python -m benchmarks.bench_layout [cells]
+"""
+
+import random
+import sys
+import time
+
+from benchmarks.synthetic import code_snippet
+from cpp_highlight.core.layout import chars_per_line, wrapped_line_counts
+
+
+def timed(texts, limits, numpy_module):
+    """Return (seconds, counts) of one counting pass."""
+    saved = sys.modules.get("numpy")
+    sys.modules["numpy"] = numpy_module
+    try:
+        start = time.perf_counter()
+        counts = wrapped_line_counts(texts, limits)
+        return time.perf_counter() - start, counts
+    finally:
+        sys.modules["numpy"] = saved
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    rng = random.Random(0)
+    texts = [code_snippet(rng, rng.randint(1, 12)) for _ in range(count)]
+    import numpy
+
+    print(f"cells:     {count}")
+    for width in (8.43, 100):
+        limits = [chars_per_line(width)] * count
+        python_time, expected = timed(texts, limits, None)
+        numpy_time, counts = timed(texts, limits, numpy)
+        assert counts == expected, "NumPy counts differ from plain Python"
+        print(
+            f"width {width:>6}: python {python_time:.3f}s, numpy {numpy_time:.3f}s "
+            f"({python_time / numpy_time:.1f}x), {sum(counts)} lines"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Compare the IPC cost of rich text and ColorRuns results.
+
+Pickles worker batches both ways, as HighlightPool sends them, and times
+the round trip plus materializing the runs in the parent.
+
+Usage: python -m benchmarks.bench_runs [cells]
+"""
+
+import pickle
+import random
+import sys
+import time
+
+from benchmarks.synthetic import code_snippet
+from cpp_highlight.core import CellHighlighter
+
+BATCH_SIZE = 64
+
+
+def round_trip(batches):
+    """Return (pickled bytes, seconds) of dumping and loading every batch."""
+    size = 0
+    start = time.perf_counter()
+    loaded = []
+    for batch in batches:
+        data = pickle.dumps(batch, pickle.HIGHEST_PROTOCOL)
+        size += len(data)
+        loaded.append(pickle.loads(data))
+    return size, time.perf_counter() - start, loaded
+
+
+def main():
+    cells = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    rng = random.Random(0)
+    texts = [code_snippet(rng, rng.randint(1, 6)) for _ in range(cells)]
+    worker, parent = CellHighlighter(), CellHighlighter()
+
+    rich = [worker.highlight(text) for text in texts]
+    runs = [worker.highlight_runs(text) for text in texts]
+
+    def batched(results):
+        return [results[k : k + BATCH_SIZE] for k in range(0, cells, BATCH_SIZE)]
+
+    rich_size, rich_time, _ = round_trip(batched(rich))
+    runs_size, runs_time, loaded = round_trip(batched(runs))
+
+    start = time.perf_counter()
+    materialized = [parent.materialize(r) for batch in loaded for r, _ in batch]
+    materialize_time = time.perf_counter() - start
+    assert materialized == [r for r, _ in rich], "materialized runs differ"
+
+    print(f"cells:     {cells}")
+    print(f"rich text: {rich_size / cells:.0f} B/cell, {rich_time:.3f}s round trip")
+    print(
+        f"runs:      {runs_size / cells:.0f} B/cell, {runs_time:.3f}s round trip "
+        f"+ {materialize_time:.3f}s to materialize ({rich_size / runs_size:.1f}x less)"
+    )
+
+
+if __name__ == "__main__":
+    main()
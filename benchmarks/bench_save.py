@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Compare workbook save time with openpyxl's writer and the fast writer.
+
+Usage: python -m benchmarks.bench_save [cells]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+import zipfile
+
+from openpyxl import Workbook
+
+from benchmarks.synthetic import code_snippet
+from cpp_highlight.core import CellHighlighter
+from cpp_highlight.writer import save_workbook
+
+
+def make_highlighted(cells: int, seed: int = 0) -> Workbook:
+    """Build a workbook with ``cells`` highlighted cells in one column."""
+    rng = random.Random(seed)
+    highlighter = CellHighlighter()
+    wb = Workbook()
+    ws = wb.active
+    for row in range(1, cells + 1):
+        rich_text, _ = highlighter.highlight(code_snippet(rng, rng.randint(1, 6)))
+        ws.cell(row=row, column=1, value=rich_text)
+    return wb
+
+
+def main():
+    cells = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    start = time.perf_counter()
+    wb = make_highlighted(cells)
+    print(f"cells:     {cells} ({time.perf_counter() - start:.1f}s to highlight)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        default_path = os.path.join(tmp, "default.xlsx")
+        fast_path = os.path.join(tmp, "fast.xlsx")
+
+        start = time.perf_counter()
+        wb.save(default_path)
+        default_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        save_workbook(wb, fast_path)
+        fast_time = time.perf_counter() - start
+
+        sheet = "xl/worksheets/sheet1.xml"
+        with zipfile.ZipFile(default_path) as a, zipfile.ZipFile(fast_path) as b:
+            assert a.read(sheet) == b.read(sheet), "fast writer output differs"
+
+    print(f"openpyxl:  {default_time:.3f}s")
+    print(f"fast:      {fast_time:.3f}s ({default_time / fast_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Compare fixed-size batches with cost-aware batches on skewed cells.
+
+Lexes a workbook-like mix of cells (mostly a few lines, a few of thousands)
+once, serially, to measure each cell's time, then replays both batching
+policies on simulated workers that each take the next batch when free, as
+a process pool does.  Simulating keeps the comparison meaningful on
+machines with fewer cores than workers.
+
+Usage: python -m benchmarks.bench_scheduler [cells] [workers]
+"""
+
+import heapq
+import random
+import sys
+import time
+
+from benchmarks.synthetic import code_snippet
+from cpp_highlight.core import CellHighlighter
+from cpp_highlight.scheduler import plan_batches
+
+
+def skewed_cells(rng: random.Random, count: int):
+    """Return cells of mostly 1-5 lines with one in 200 of 500-2000 lines."""
+    cells = []
+    for row in range(1, count + 1):
+        lines = rng.randint(500, 2000) if rng.random() < 0.005 else rng.randint(1, 5)
+        cells.append((f"Sheet!A{row}", code_snippet(rng, lines)))
+    return cells
+
+
+def makespan(batches, seconds, workers: int) -> float:
+    """Return when the last of ``workers`` finishes the batches in order."""
+    free_at = [0.0] * workers
+    for batch in batches:
+        start = heapq.heappop(free_at)
+        heapq.heappush(free_at, start + sum(seconds[i] for i in batch))
+    return max(free_at)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    items = skewed_cells(random.Random(0), count)
+
+    highlighter = CellHighlighter()
+    seconds = []
+    for location, text in items:
+        start = time.perf_counter()
+        highlighter.highlight_runs(text, location)
+        seconds.append(time.perf_counter() - start)
+    total = sum(seconds)
+    print(f"cells:     {count}, {workers} workers, {total:.2f}s of lexing")
+
+    fixed = [
+        list(range(start, min(start + 64, count))) for start in range(0, count, 64)
+    ]
+    scheduled = plan_batches(items, workers, 64)
+    for name, batches in (("fixed", fixed), ("scheduled", scheduled)):
+        span = makespan(batches, seconds, workers)
+        utilization = total / (span * workers)
+        print(
+            f"{name + ':':<10} {len(batches):>4} batches, {span:.2f}s, "
+            f"{utilization:.0%} utilization"
+        )
+
+
+if __name__ == "__main__":
+    main()
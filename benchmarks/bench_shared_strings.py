@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Compare inline and shared highlighted values on a duplicate-heavy workbook.
+
+Every cell repeats one of a few distinct values.  Reports the save time,
+output size and time to load the output again with each mode.
+
+Usage: python -m benchmarks.bench_shared_strings [rows] [distinct]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import openpyxl
+
+from benchmarks.synthetic import make_workbook
+from cpp_highlight.models import RunStats
+from cpp_highlight.processor import process_excel
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    distinct = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "in.xlsx")
+        make_workbook(input_path, rows=rows, code_ratio=0.8, distinct=distinct)
+        print(f"rows:      {rows} x 2, {distinct} distinct values")
+        for shared in (False, True):
+            output_path = os.path.join(tmp, f"out-{shared}.xlsx")
+            stats = RunStats()
+            process_excel(input_path, output_path, stats=stats, shared_strings=shared)
+            start = time.perf_counter()
+            openpyxl.load_workbook(output_path)
+            load_time = time.perf_counter() - start
+            size = os.path.getsize(output_path) / 1e6
+            print(
+                f"{'shared' if shared else 'inline'}:    "
+                f"save {stats.save_seconds.total:.3f}s  {size:.2f} MB  "
+                f"load {load_time:.3f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Compare serial, cell-pool and per-sheet processing of a multi-sheet workbook.
+
+Usage: python -m benchmarks.bench_sheets [sheets] [rows] [jobs]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import make_workbook
+from cpp_highlight.processor import process_excel
+
+
+def main():
+    sheets = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    jobs = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "input.xlsx")
+        make_workbook(input_path, sheets=sheets, rows=rows)
+        print(f"sheets:    {sheets} x {rows} rows, {jobs} jobs")
+
+        runs = [
+            ("serial", dict()),
+            ("cells", dict(jobs=jobs)),
+            ("sheets", dict(jobs=jobs, per_sheet=True)),
+        ]
+        baseline = None
+        for name, options in runs:
+            start = time.perf_counter()
+            count = process_excel(
+                input_path, os.path.join(tmp, f"{name}.xlsx"), **options
+            )
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(
+                f"{name + ':':<10} {elapsed:.3f}s ({baseline / elapsed:.1f}x, "
+                f"{count} cells)"
+            )
+
+
+if __name__ == "__main__":
+    main()
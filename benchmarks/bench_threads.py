@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Compare highlighting cells in threads and in processes.
+
+Highlights the same cells serially, with HighlightThreads and with
+HighlightPool, and checks that all three agree.  Run it once with a regular
+interpreter and once with a free-threaded build (``python3.13t``) to see
+what the GIL costs; the header line says which kind is running.
+
+Usage: python -m benchmarks.bench_threads [cells] [workers]
+"""
+
+import os
+import random
+import sys
+import sysconfig
+import time
+
+from benchmarks.synthetic import code_snippet
+from cpp_highlight.core import CellHighlighter
+from cpp_highlight.parallel import HighlightPool, HighlightThreads
+
+
+def interpreter() -> str:
+    """Describe the interpreter and whether the GIL is enabled."""
+    free_threaded = bool(sysconfig.get_config_var("Py_GIL_DISABLED"))
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", lambda: True)
+    gil = "enabled" if is_gil_enabled() else "disabled"
+    build = "free-threaded build" if free_threaded else "default build"
+    return f"Python {sys.version.split()[0]}, {build}, GIL {gil}"
+
+
+def main():
+    cells = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    rng = random.Random(0)
+    items = [
+        (f"Sheet!A{row}", code_snippet(rng, rng.randint(1, 20)))
+        for row in range(1, cells + 1)
+    ]
+    print(interpreter())
+    print(f"cells:     {cells}, {workers} workers")
+
+    highlighter = CellHighlighter()
+    runs = [
+        ("serial", None),
+        ("threads", HighlightThreads(highlighter, workers)),
+        ("processes", HighlightPool(highlighter, workers)),
+    ]
+    baseline = expected = None
+    for name, pool in runs:
+        start = time.perf_counter()
+        if pool is None:
+            results = [highlighter.highlight(text, loc) for loc, text in items]
+        else:
+            with pool:
+                results = pool.highlight(items)
+        elapsed = time.perf_counter() - start
+        expected = expected or results
+        assert results == expected, f"{name} results differ"
+        baseline = baseline or elapsed
+        print(f"{name + ':':<10} {elapsed:.3f}s ({baseline / elapsed:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Synthetic cell contents and workbooks for benchmarks."""
+
+import random
+from typing import List, Optional
+
+from openpyxl import Workbook
+
+CODE_LINES = [
+    "#include <vector>",
+    "#include \"config.h\"",
+    "using namespace std;",
+    "int main(int argc, char* argv[]) {",
+    "    std::vector<int> values = {1, 2, 3, 4, 5};",
+    "    for (int i = 0; i < 10; ++i) {",
+    "        if (values[i] > 3) { continue; }",
+    "        total += values[i] * 2;",
+    "    }",
+    "    cout << \"total: \" << total << endl;",
+    "    return 0;",
+    "}",
+    "class Widget : public Base {",
+    "public:",
+    "    explicit Widget(const std::string& name);",
+    "    void draw() const override;",
+    "private:",
+    "    int width_ = 0;  // pixels",
+    "};",
+    "/* initialise lookup table */",
+    "static const double kScale = 1.5e-3;",
+    "template <typename T> T clamp(T v, T lo, T hi);",
+]
+
+PROSE_WORDS = (
+    "the requirement shall be verified by inspection before release and "
+    "reviewed by the owner of each interface with the test plan attached"
+).split()
+
+
+def code_snippet(rng: random.Random, lines: int) -> str:
+    """Return a C++-looking snippet with ``lines`` lines."""
+    return "\n".join(rng.choice(CODE_LINES) for _ in range(lines))
+
+
+def prose(rng: random.Random, words: int) -> str:
+    """Return plain English-like text with ``words`` words."""
+    return " ".join(rng.choice(PROSE_WORDS) for _ in range(words)).capitalize()
+
+
+def make_column(
+    rows: int,
+    code_ratio: float = 0.3,
+    max_lines: int = 12,
+    seed: int = 0,
+) -> List[str]:
+    """Build a column of cell values mixing code snippets and prose."""
+    rng = random.Random(seed)
+    values = []
+    for _ in range(rows):
+        if rng.random() < code_ratio:
+            values.append(code_snippet(rng, rng.randint(1, max_lines)))
+        else:
+            values.append(prose(rng, rng.randint(3, 40)))
+    return values
+
+
+def make_workbook(
+    path: str,
+    sheets: int = 1,
+    rows: int = 1000,
+    columns: int = 2,
+    code_ratio: float = 0.3,
+    max_lines: int = 12,
+    seed: int = 0,
+    distinct: Optional[int] = None,
+) -> None:
+    """Write a workbook of synthetic cells to ``path``.
+
+    With ``distinct``, every cell repeats one of that many distinct values.
+    """
+    pool = None
+    if distinct is not None:
+        pool = make_column(distinct, code_ratio, max_lines, seed=seed)
+    rng = random.Random(seed)
+
+    wb = Workbook()
+    wb.remove(wb.active)
+    for sheet in range(sheets):
+        ws = wb.create_sheet(f"Sheet{sheet + 1}")
+        for col in range(columns):
+            if pool is not None:
+                values = [rng.choice(pool) for _ in range(rows)]
+            else:
+                values = make_column(
+                    rows, code_ratio, max_lines, seed=seed + sheet * columns + col
+                )
+            for row, value in enumerate(values, start=1):
+                ws.cell(row=row, column=col + 1, value=value)
+    wb.save(path)
@@ -9,7 +9,11 @@ This file provides backward compatibility for direct script execution.
 For package usage, use: python -m cpp_highlight
 """
 
+import multiprocessing
+
 from cpp_highlight.cli import main
 
 if __name__ == "__main__":
+    # Worker processes of the frozen executable re-enter here
+    multiprocessing.freeze_support()
     main()
@@ -20,19 +20,41 @@ a = Analysis(
         'pygments',
         'pygments.lexers',
         'pygments.lexers.cpp',
+        'pygments.lexers.c_cpp',
+        'pygments.lexers.jvm',
+        'pygments.lexers.dotnet',
+        'pygments.lexers.shell',
         'pygments.formatters.html',
         'pygments.styles.default',
         # Package modules
         'cpp_highlight',
         'cpp_highlight.cli',
         'cpp_highlight.processor',
+        'cpp_highlight.watch',
+        'cpp_highlight.journal',
+        'cpp_highlight.errors',
+        'cpp_highlight.aio',
+        'cpp_highlight.ingest',
+        'cpp_highlight.memory',
+        'cpp_highlight.metrics',
+        'cpp_highlight.parallel',
+        'cpp_highlight.scheduler',
+        'cpp_highlight.writer',
         'cpp_highlight.config',
         'cpp_highlight.config.settings',
         'cpp_highlight.config.theme',
         'cpp_highlight.core',
         'cpp_highlight.core.detection',
+        'cpp_highlight.core.batch',
+        'cpp_highlight.core.incremental',
+        'cpp_highlight.core.languages',
+        'cpp_highlight.core.layout',
+        'cpp_highlight.core.lex_cache',
         'cpp_highlight.core.highlighter',
+        'cpp_highlight.core.scanner',
         'cpp_highlight.models',
+        'cpp_highlight.models.runs',
+        'cpp_highlight.models.stats',
         'cpp_highlight.models.text_block',
     ],
     hookspath=[],
@@ -42,25 +64,25 @@ a = Analysis(
     noarchive=False,
     optimize=0,
 )
-pyz = PYZ(a.pure)
-
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.datas,
-    [],
-    name='cpp_highlight',
-    debug=False,
-    bootloader_ignore_signals=False,
-    strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
-    console=True,
-    disable_windowed_traceback=False,
-    argv_emulation=False,
-    target_arch=None,
-    codesign_identity=None,
-    entitlements_file=None,
-)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    a.binaries,
+    a.datas,
+    [],
+    name='cpp_highlight',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=True,
+    upx_exclude=[],
+    runtime_tmpdir=None,
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
@@ -0,0 +1,157 @@
+"""Asyncio API for highlighting from an event loop.
+
+Nothing here blocks the loop: workbooks are loaded, scanned, filled in and
+saved in the loop's default executor and cells are lexed in a configurable one.
+Errors are raised as ``cpp_highlight.errors`` exceptions; unlike
+``process_excel``, these functions never exit the process.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import Executor
+from typing import List, Optional, Sequence, Tuple
+
+from openpyxl.cell.rich_text import CellRichText
+
+from cpp_highlight.config import BudgetSettings
+from cpp_highlight.core import CellHighlighter
+from cpp_highlight.models import ColorRuns, RunStats
+from cpp_highlight.parallel import highlight_items, worker_config
+from cpp_highlight.processor import (
+    _apply_results,
+    _detect_sheet,
+    _load_workbook,
+    _save_output,
+)
+from cpp_highlight.writer import SharedStrings
+
+
+async def _highlight_batch(
+    executor: Optional[Executor],
+    config: tuple,
+    items: List[Tuple[str, str]],
+    stats: RunStats,
+) -> List[Tuple[Optional[ColorRuns], Optional[float]]]:
+    """Lex ``(location, text)`` items in ``executor`` and add up their stats."""
+    loop = asyncio.get_running_loop()
+    results, batch_stats = await loop.run_in_executor(
+        executor, highlight_items, config, items
+    )
+    stats.merge(batch_stats)
+    return results
+
+
+async def highlight_async(
+    text: str,
+    location: Optional[str] = None,
+    highlighter: CellHighlighter = None,
+    executor: Optional[Executor] = None,
+) -> Tuple[Optional[CellRichText], Optional[float]]:
+    """Highlight one cell like ``CellHighlighter.highlight``.
+
+    Args:
+        text: Source code to highlight
+        location: Cell reference used when logging budget fallbacks
+        highlighter: Theme, font, lexer and budget to use; its stats are
+            updated and it builds the rich text (default: a new one)
+        executor: Thread or process pool to lex in (default: the loop's
+            default executor)
+
+    Returns:
+        Tuple of (rich text, required row height), or (None, None)
+    """
+    if highlighter is None:
+        # Building a highlighter reads theme.json
+        loop = asyncio.get_running_loop()
+        highlighter = await loop.run_in_executor(None, CellHighlighter)
+    ((runs, height),) = await _highlight_batch(
+        executor, worker_config(highlighter), [(location, text)], highlighter.stats
+    )
+    if runs is None:
+        return None, None
+    return highlighter.materialize(runs), height
+
+
+async def process_excel_async(
+    input_path: str,
+    output_path: str,
+    executor: Optional[Executor] = None,
+    batch_detect: bool = False,
+    budget: BudgetSettings = None,
+    stats: RunStats = None,
+    compression: str = "default",
+    highlighter: CellHighlighter = None,
+    batch_size: int = 64,
+    languages: Optional[Sequence[str]] = None,
+    shared_strings: bool = False,
+) -> int:
+    """Process an Excel file like ``process_excel``, from an event loop.
+
+    Cells are lexed ``batch_size`` at a time in ``executor``, so several
+    workbooks can be processed concurrently by one process; their saves
+    may overlap, as each keeps its writer state (and shared strings) to
+    itself.  Cancelling
+    the task stops it at the next sheet or batch; the output is replaced
+    only by a complete save.
+
+    Args:
+        input_path: Path to input Excel file
+        output_path: Path to output Excel file
+        executor: Thread or process pool to lex in (default: the loop's
+            default executor)
+        batch_detect: Detect code column by column with NumPy
+        budget: Per-cell size and time budget (default: no limit)
+        stats: Run statistics to fill in
+        compression: Zip compression of the output, one of
+            cpp_highlight.writer.COMPRESSION_MODES
+        highlighter: Highlighter that builds the cell values; ``budget`` is
+            ignored when it is given.  It must not be shared by workbooks
+            processed at the same time.
+        batch_size: Cells per executor call
+        languages: Languages to detect, each cell lexed with its language's
+            lexer (default: C++ only)
+        shared_strings: Write each distinct highlighted value once, as for
+            ``process_excel``
+
+    Returns:
+        Number of cells highlighted
+
+    Raises:
+        WorkbookLoadError: The input could not be read
+        WorkbookSaveError: The output could not be written
+    """
+    loop = asyncio.get_running_loop()
+    if stats is None:
+        stats = RunStats()
+
+    wb = await loop.run_in_executor(None, _load_workbook, input_path, stats)
+
+    if highlighter is None:
+        highlighter = await loop.run_in_executor(
+            None, functools.partial(CellHighlighter, budget=budget, stats=stats)
+        )
+    else:
+        highlighter.stats = stats
+    config = worker_config(highlighter)
+
+    highlighted_count = 0
+    for ws in wb.worksheets:
+        cells, items = await loop.run_in_executor(
+            None, _detect_sheet, ws, stats, False, batch_detect, languages
+        )
+        results = []
+        for start in range(0, len(items), batch_size):
+            batch = items[start : start + batch_size]
+            results += await _highlight_batch(executor, config, batch, stats)
+        # Setting the values and sizing the rows of a large sheet takes a
+        # while, so it runs off the loop as well
+        highlighted_count += await loop.run_in_executor(
+            None, _apply_results, ws, cells, results, highlighter, stats
+        )
+
+    strings = SharedStrings() if shared_strings else None
+    await loop.run_in_executor(
+        None, _save_output, wb, output_path, compression, None, stats, strings
+    )
+    stats.files_processed += 1
+    return highlighted_count
@@ -2,63 +2,602 @@
 """Command-line interface for ExcelCppSyntaxHighlight."""
 
 import argparse
+import contextlib
 import sys
+import time
+from io import BytesIO
 from pathlib import Path
+from typing import List, Optional, Sequence
 
-from cpp_highlight.processor import process_excel
+from cpp_highlight.config import BudgetSettings
+from cpp_highlight.core import CellHighlighter, LexCache
+from cpp_highlight.core.languages import LANGUAGES
+from cpp_highlight.errors import ProcessingError
+from cpp_highlight.ingest import SOURCE_SUFFIXES, ingest_sources
+from cpp_highlight.journal import DEFAULT_JOURNAL, Journal
+from cpp_highlight.memory import MemoryReport, parse_size
+from cpp_highlight.metrics import METRICS_FORMATS, write_metrics
+from cpp_highlight.models import RunStats
+from cpp_highlight.processor import _process_workbook
+from cpp_highlight.watch import DirectoryWatcher, file_hash, output_path_for
+from cpp_highlight.writer import COMPRESSION_MODES
 
+# Input or output name for stdin or stdout
+STDIO = "-"
 
-def main():
-    """Main entry point for CLI."""
+# Commands of the command line; the first runs when none is given
+COMMANDS = ("highlight", "ingest")
+
+
+def _optional_limit(value: str):
+    """Parse a positive limit, where 0 means no limit."""
+    number = float(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must not be negative: {value}")
+    return number or None
+
+
+def _size(value: str) -> int:
+    """Parse a memory size such as 512M."""
+    try:
+        return parse_size(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _languages(value: str) -> tuple:
+    """Parse a comma-separated list of languages, or ``all``."""
+    if value == "all":
+        return tuple(LANGUAGES)
+    names = tuple(name.strip() for name in value.split(",") if name.strip())
+    unknown = [name for name in names if name not in LANGUAGES]
+    if unknown or not names:
+        raise argparse.ArgumentTypeError(
+            f"unknown language {', '.join(unknown) or repr(value)} "
+            f"(choose from {', '.join(LANGUAGES)}, or all)"
+        )
+    return names
+
+
+def _add_verbose(parser, help: str, default=False) -> None:
+    """Add ``-v/--verbose``, which may come before or after the command."""
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", default=default, help=help
+    )
+
+
+def _with_default_command(argv: Sequence[str]) -> List[str]:
+    """Insert the default command into ``argv`` when none is given."""
+    argv = list(argv)
+    k = 0
+    while k < len(argv) and argv[k] in ("-v", "--verbose"):
+        k += 1
+    if k < len(argv) and argv[k] in COMMANDS + ("-h", "--help"):
+        return argv
+    return argv[:k] + [COMMANDS[0]] + argv[k:]
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """Main entry point for CLI.
+
+    Args:
+        argv: Command-line arguments without the program name (default:
+            ``sys.argv[1:]``)
+    """
     parser = argparse.ArgumentParser(
         description="Apply C++ syntax highlighting to Excel cells",
         formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="""
+        epilog=_EXAMPLES,
+    )
+    _add_verbose(parser, "Enable verbose output")
+    commands = parser.add_subparsers(
+        dest="command",
+        title="commands",
+        metavar="COMMAND",
+        description="highlight runs when no command is given; "
+        "see COMMAND --help for its options",
+    )
+    highlight = commands.add_parser(
+        "highlight",
+        help="Highlight the code cells of Excel workbooks (default)",
+        description="Apply C++ syntax highlighting to Excel cells",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=_EXAMPLES,
+    )
+    _add_highlight_arguments(highlight)
+    ingest = commands.add_parser(
+        "ingest",
+        help="Write the C/C++ files under a directory to a highlighted workbook",
+        description="Write the C/C++ files under a directory to a highlighted "
+        "workbook, one row per file or function",
+    )
+    _add_ingest_arguments(ingest)
+
+    args = parser.parse_args(
+        _with_default_command(sys.argv[1:] if argv is None else argv)
+    )
+    if args.command == "ingest":
+        _ingest(ingest, args)
+        return
+    _highlight(highlight, args)
+
+
+_EXAMPLES = """
 Examples:
   cpp_highlight.exe input.xlsx                    # Output: input_output.xlsx
   cpp_highlight.exe input.xlsx -o custom.xlsx     # Output: custom.xlsx
   cpp_highlight.exe code.xlsx -v                  # Verbose mode
+  cpp_highlight.exe specs/*.xlsx --resume         # Skip finished files
+  cpp_highlight.exe - < in.xlsx > out.xlsx        # Read stdin, write stdout
+  cpp_highlight.exe --watch specs/                # Process new/changed files
+  cpp_highlight.exe ingest src/ -o review.xlsx    # Workbook of source files
 
 Drag & Drop:
   Simply drag an Excel file onto cpp_highlight.exe to process it.
   Output will be saved as <filename>_output.xlsx in the same directory.
-        """,
-    )
+"""
+
 
-    parser.add_argument("input", help="Input Excel file path (or drag & drop)")
+def _add_highlight_arguments(parser) -> None:
+    """Add the options of the highlight command."""
     parser.add_argument(
-        "-o", "--output", help="Output Excel file path (default: <input>_output.xlsx)"
+        "input",
+        nargs="*",
+        help="Input Excel file paths (or drag & drop), - for stdin",
     )
     parser.add_argument(
-        "-v", "--verbose", action="store_true", help="Enable verbose output"
+        "-o",
+        "--output",
+        help="Output Excel file path, - for stdout (default: <input>_output.xlsx, "
+        "stdout for stdin)",
+    )
+    _add_verbose(parser, "Enable verbose output", argparse.SUPPRESS)
+    parser.add_argument(
+        "--batch-detect",
+        action="store_true",
+        help="Detect code a whole column at a time (faster on large sheets, "
+        "requires numpy)",
+    )
+    parser.add_argument(
+        "--languages",
+        type=_languages,
+        metavar="LIST",
+        help="Detect these languages instead of C++ only, scanning each cell once "
+        "and lexing it with its language's lexer: a comma-separated list of "
+        f"{', '.join(LANGUAGES)}, or all (cannot be combined with --batch-detect)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Highlight in this many worker processes (default: 1)",
+    )
+    parser.add_argument(
+        "--per-sheet",
+        action="store_true",
+        help="With --jobs, give each worksheet to its own worker process "
+        "(scales better on workbooks with many sheets)",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="Highlight in this many threads instead of processes; faster "
+        "than --jobs on free-threaded Python builds (default: 1)",
+    )
+    parser.add_argument(
+        "--max-cell-chars",
+        type=_optional_limit,
+        default=BudgetSettings.max_chars,
+        help="Cells longer than this are oversized, e.g. 20000 "
+        "(default: no limit)",
+    )
+    parser.add_argument(
+        "--oversize",
+        choices=BudgetSettings.OVERSIZE_POLICIES,
+        default=BudgetSettings.oversize,
+        help="How to handle oversized cells: lex in line chunks, color plain, "
+        f"or skip (default: {BudgetSettings.oversize})",
+    )
+    parser.add_argument(
+        "--cell-time-limit",
+        type=_optional_limit,
+        default=BudgetSettings.time_limit,
+        help="Seconds of lexing per cell before the rest is colored plain, "
+        "e.g. 2 (default: no limit)",
+    )
+    parser.add_argument(
+        "--watchdog",
+        type=_optional_limit,
+        default=60.0,
+        help="Seconds without progress before stuck workers are restarted, "
+        "0 to wait forever (default: 60, only with --jobs)",
+    )
+    parser.add_argument(
+        "--compression",
+        choices=list(COMPRESSION_MODES),
+        default="default",
+        help="Zip compression of the output: fast compresses worksheets "
+        "lightly, store not at all, max as small as possible (default: default)",
+    )
+    parser.add_argument(
+        "--shared-strings",
+        action="store_true",
+        help="Write each distinct highlighted value once and have its cells "
+        "reference it, shrinking workbooks with many repeated cells",
+    )
+    parser.add_argument(
+        "--max-memory",
+        type=_size,
+        metavar="SIZE",
+        help="Stay within about SIZE of memory (e.g. 512M, 2G): batches get "
+        "smaller and finished sheets move to disk as the limit nears",
+    )
+    parser.add_argument(
+        "--memory-report",
+        action="store_true",
+        help="Trace memory with tracemalloc and print the peak and top "
+        "allocation sites of the load, detect, highlight and save phases "
+        "(slows the run down)",
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="PATH",
+        help="Keep lexed cells in PATH between runs, so only the changed lines "
+        "of edited cells are lexed again (not used with --jobs or --threads)",
+    )
+    parser.add_argument(
+        "--journal",
+        metavar="PATH",
+        help="Record each finished workbook with its content hash in PATH",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip workbooks the journal lists as finished with the same "
+        f"content and output (default journal: {DEFAULT_JOURNAL})",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="PATH",
+        help="Write run metrics to PATH (a Prometheus textfile, or a JSON-lines "
+        "file that gets one event per run)",
+    )
+    parser.add_argument(
+        "--metrics-format",
+        choices=METRICS_FORMATS,
+        default="prometheus",
+        help="Format of --metrics (default: prometheus)",
+    )
+    parser.add_argument(
+        "--watch",
+        metavar="DIR",
+        help="Keep running and process workbooks that are added to or changed "
+        "in DIR; outputs are written next to them as <name>_output.xlsx",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=2.0,
+        help="Seconds between polls of --watch (default: 2)",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=1.0,
+        help="Seconds a file must stay unchanged before --watch processes it "
+        "(default: 1)",
     )
 
-    args = parser.parse_args()
-
-    input_path = Path(args.input)
-    if not input_path.exists():
-        print(f"Error: Input file not found: {args.input}", file=sys.stderr)
-        sys.exit(1)
 
-    if not input_path.suffix.lower() in [".xlsx", ".xlsm", ".xltx", ".xltm"]:
+def _highlight(parser, args) -> None:
+    """Run the highlight command."""
+    if args.jobs > 1 and args.threads > 1:
+        parser.error("--jobs and --threads cannot be combined")
+    if args.languages and args.batch_detect:
+        parser.error("--languages and --batch-detect cannot be combined")
+    if args.per_sheet and (args.jobs <= 1 or args.max_memory):
         print(
-            f"Warning: Input file may not be a valid Excel file: {args.input}",
+            "Note: --per-sheet is ignored without --jobs or with --max-memory",
             file=sys.stderr,
         )
 
+    if args.watch:
+        if args.input or args.output:
+            parser.error("--watch cannot be combined with an input or --output")
+        if args.journal or args.resume:
+            parser.error("--journal and --resume do not apply to --watch")
+        _watch(args)
+        return
+    if not args.input:
+        parser.error("the following arguments are required: input")
+    if args.output and len(args.input) > 1:
+        parser.error("--output needs a single input")
+    if args.input.count(STDIO) > 1:
+        parser.error("stdin can only be read once")
+    if args.resume and not args.journal:
+        args.journal = DEFAULT_JOURNAL
+    if args.journal and STDIO in args.input + [args.output]:
+        parser.error("--journal and --resume need file inputs and outputs")
+
+    cache = LexCache(args.cache) if args.cache else None
+    journal = Journal(args.journal) if args.journal else None
+    session = RunStats()
+    failed = 0
+    try:
+        for name in args.input:
+            if not _process_input(args, Path(name), session, cache, journal):
+                failed += 1
+    finally:
+        if cache is not None:
+            cache.close()
+        if journal is not None:
+            journal.close()
+    if failed:
+        sys.exit(1)
+
+
+def _process_input(args, input_path, session, cache, journal) -> bool:
+    """Process one input of the command line.
+
+    ``session`` collects the statistics of all inputs.
+
+    Returns:
+        False if the workbook could not be processed
+    """
+    from_stdin = str(input_path) == STDIO
+    if from_stdin:
+        source = sys.stdin.buffer.read()
+    elif not input_path.exists():
+        print(f"Error: Input file not found: {input_path}", file=sys.stderr)
+        return False
+    else:
+        source = input_path
+        if not input_path.suffix.lower() in [".xlsx", ".xlsm", ".xltx", ".xltm"]:
+            print(
+                f"Warning: Input file may not be a valid Excel file: {input_path}",
+                file=sys.stderr,
+            )
+
     # Generate default output path if not specified
     if args.output:
         output_path = args.output
+    elif from_stdin:
+        output_path = STDIO
     else:
-        output_path = str(
-            input_path.parent / f"{input_path.stem}_output{input_path.suffix}"
+        output_path = str(output_path_for(input_path))
+    to_stdout = output_path == STDIO
+
+    digest = None
+    if journal is not None:
+        digest = file_hash(input_path)
+        if args.resume and journal.is_finished(str(input_path), digest, output_path):
+            print(f"Skipped {input_path}: already processed to {output_path}")
+            return True
+
+    stats = RunStats()
+    target = BytesIO() if to_stdout else output_path
+    # Messages go to stderr while stdout carries the workbook
+    messages = contextlib.nullcontext()
+    if to_stdout:
+        messages = contextlib.redirect_stdout(sys.stderr)
+    with messages:
+        try:
+            count = _process(args, source, target, stats, session, cache=cache)
+        except ProcessingError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return False
+        if journal is not None:
+            journal.record(str(input_path), digest, output_path, count)
+        _report(
+            args,
+            count,
+            "<stdin>" if from_stdin else input_path,
+            "<stdout>" if to_stdout else output_path,
+            stats,
+        )
+    if to_stdout:
+        sys.stdout.buffer.write(target.getvalue())
+        sys.stdout.buffer.flush()
+    return True
+
+
+def _budget(args) -> BudgetSettings:
+    """Build the cell budget from the command-line options."""
+    max_chars = args.max_cell_chars
+    return BudgetSettings(
+        max_chars=int(max_chars) if max_chars is not None else None,
+        oversize=args.oversize,
+        time_limit=args.cell_time_limit,
+    )
+
+
+def _process(
+    args, input_path, output_path, stats, session, highlighter=None, cache=None
+) -> int:
+    """Process one workbook with the command-line options.
+
+    ``input_path`` may also be the workbook's bytes and ``output_path`` a
+    file object to write it to. ``stats`` collects the statistics of this
+    workbook and is then added to ``session``, those of the whole run.
+    Prometheus metrics are cumulative over the session, JSON-lines events
+    per workbook.
+
+    Raises:
+        ProcessingError: The workbook could not be loaded or saved
+    """
+    start = time.perf_counter()
+    report = MemoryReport() if args.memory_report else None
+    with report if report is not None else contextlib.nullcontext():
+        count = _process_workbook(
+            input_path,
+            output_path,
+            args.verbose,
+            batch_detect=args.batch_detect,
+            jobs=max(args.jobs, 1),
+            budget=_budget(args),
+            watchdog=args.watchdog,
+            stats=stats,
+            compression=args.compression,
+            per_sheet=args.per_sheet,
+            highlighter=highlighter,
+            cache=cache,
+            threads=max(args.threads, 1),
+            max_memory=args.max_memory,
+            languages=args.languages,
+            shared_strings=args.shared_strings,
+            memory_report=report,
+        )
+    if report is not None:
+        print("\n".join(report.format()))
+
+    session.merge(stats)
+    if args.metrics:
+        write_metrics(
+            stats if args.metrics_format == "jsonl" else session,
+            args.metrics,
+            args.metrics_format,
+            input=_name(input_path),
+            output=_name(output_path),
+            seconds=time.perf_counter() - start,
         )
+    return count
 
-    count = process_excel(str(input_path), output_path, args.verbose)
 
-    print(f"Processed {count} cells with C++ code")
+def _name(workbook) -> str:
+    """Name an input or output of _process in metrics."""
+    if isinstance(workbook, bytes):
+        return "<stdin>"
+    if isinstance(workbook, BytesIO):
+        return "<stdout>"
+    return str(workbook)
+
+
+def _report(args, count, input_path, output_path, stats) -> None:
+    """Print the summary of one processed workbook."""
+    print(f"Processed {count} cells with {'' if args.languages else 'C++ '}code")
     print(f"  Input:  {input_path}")
     print(f"  Output: {output_path}")
+    if stats.fallbacks:
+        print(
+            f"  Budget: {stats.cells_chunked} chunked, {stats.cells_plain} plain, "
+            f"{stats.cells_timed_out} timed out, {stats.cells_skipped} skipped"
+        )
+        if args.verbose:
+            for location, action in stats.fallbacks:
+                print(f"    {location}: {action}")
+    utilization = stats.worker_utilization()
+    if utilization is not None:
+        print(f"  Workers: {utilization:.0%} busy")
+    if stats.memory_relieved:
+        print(
+            f"  Memory: near the limit {stats.memory_relieved} times, "
+            f"{stats.sheets_spooled} sheets moved to disk"
+        )
+    if stats.strings_shared:
+        print(
+            f"  Shared strings: {stats.strings_shared} cells, "
+            f"{stats.strings_unique} distinct values"
+        )
+    if stats.cells_by_language:
+        counts = sorted(stats.cells_by_language.items(), key=lambda item: -item[1])
+        print(
+            "  Languages: "
+            + ", ".join(f"{language} {count}" for language, count in counts)
+        )
+
+
+def _add_ingest_arguments(parser) -> None:
+    """Add the options of the ingest command."""
+    parser.add_argument("directory", help="Source directory to walk")
+    parser.add_argument("-o", "--output", required=True, help="Output Excel path")
+    parser.add_argument(
+        "--per-function",
+        action="store_true",
+        help="One cell per function instead of per file",
+    )
+    parser.add_argument(
+        "--suffixes",
+        default=",".join(SOURCE_SUFFIXES),
+        help=f"Comma-separated file suffixes (default: {','.join(SOURCE_SUFFIXES)})",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Highlight in this many worker processes (default: 1)",
+    )
+    parser.add_argument(
+        "--compression",
+        choices=list(COMPRESSION_MODES),
+        default="default",
+        help="Zip compression of the output (default: default)",
+    )
+    parser.add_argument(
+        "--shared-strings",
+        action="store_true",
+        help="Write each distinct highlighted value once",
+    )
+    _add_verbose(parser, "Print each file", argparse.SUPPRESS)
+
+
+def _ingest(parser, args) -> None:
+    """Run the ingest command."""
+    if not Path(args.directory).is_dir():
+        parser.error(f"not a directory: {args.directory}")
+
+    stats = RunStats()
+    try:
+        count = ingest_sources(
+            args.directory,
+            args.output,
+            per_function=args.per_function,
+            suffixes=[s.strip() for s in args.suffixes.split(",") if s.strip()],
+            jobs=max(args.jobs, 1),
+            stats=stats,
+            compression=args.compression,
+            verbose=args.verbose,
+            shared_strings=args.shared_strings,
+        )
+    except ProcessingError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Highlighted {count} cells from {args.directory}")
+    print(f"  Output: {args.output}")
+
+
+def _watch(args) -> None:
+    """Run --watch until interrupted."""
+    directory = Path(args.watch)
+    if not directory.is_dir():
+        print(f"Error: Not a directory: {args.watch}", file=sys.stderr)
+        sys.exit(1)
+
+    # One highlighter for all events keeps its caches warm
+    cache = LexCache(args.cache) if args.cache else None
+    highlighter = CellHighlighter(budget=_budget(args), cache=cache)
+    session = RunStats()
+
+    def process(input_path: Path, output_path: Path) -> None:
+        stats = RunStats()
+        count = _process(
+            args, input_path, output_path, stats, session, highlighter
+        )
+        _report(args, count, input_path, output_path, stats)
+
+    watcher = DirectoryWatcher(
+        str(directory), process, interval=args.interval, debounce=args.debounce
+    )
+    print(f"Watching {directory} (Ctrl+C to stop)")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        print(f"Stopped after {session.files_processed} files")
+    finally:
+        if cache is not None:
+            cache.close()
 
 
 if __name__ == "__main__":
@@ -1,10 +1,11 @@
 """Configuration module for ExcelCppSyntaxHighlight."""
 
-from .settings import FontSettings
+from .settings import BudgetSettings, FontSettings
 from .theme import ThemeConfig, TOKEN_TYPE_NAMES, DEFAULT_THEME_COLORS
 
 __all__ = [
     "FontSettings",
+    "BudgetSettings",
     "ThemeConfig",
     "TOKEN_TYPE_NAMES",
     "DEFAULT_THEME_COLORS",
@@ -1,6 +1,7 @@
 """Font and layout settings for syntax highlighting."""
 
 from dataclasses import dataclass
+from typing import Optional
 
 
 @dataclass
@@ -23,3 +24,43 @@ class FontSettings:
     def default(cls) -> "FontSettings":
         """Create default font settings."""
         return cls()
+
+
+@dataclass
+class BudgetSettings:
+    """Per-cell limits that keep oversized cells from stalling a run.
+
+    No limit is set by default, so cells are highlighted as a whole however
+    long they take; set ``max_chars`` or ``time_limit`` to opt in.
+
+    Attributes:
+        max_chars: Cells longer than this are handled by the ``oversize``
+            policy instead of being lexed in one piece (None disables)
+        oversize: ``"chunked"`` to lex line-wise in chunks of ``chunk_lines``,
+            ``"plain"`` to color the whole cell with the default color, or
+            ``"skip"`` to leave the cell unhighlighted
+        chunk_lines: Number of lines lexed together in chunked mode
+        time_limit: Seconds a cell may spend lexing (None disables)
+        on_timeout: ``"plain"`` to color the rest of the cell with the
+            default color, or ``"skip"`` to leave the cell unhighlighted
+    """
+
+    max_chars: Optional[int] = None
+    oversize: str = "chunked"
+    chunk_lines: int = 200
+    time_limit: Optional[float] = None
+    on_timeout: str = "plain"
+
+    OVERSIZE_POLICIES = ("chunked", "plain", "skip")
+    TIMEOUT_POLICIES = ("plain", "skip")
+
+    def __post_init__(self):
+        if self.oversize not in self.OVERSIZE_POLICIES:
+            raise ValueError(f"Unknown oversize policy: {self.oversize}")
+        if self.on_timeout not in self.TIMEOUT_POLICIES:
+            raise ValueError(f"Unknown timeout policy: {self.on_timeout}")
+
+    @classmethod
+    def unlimited(cls) -> "BudgetSettings":
+        """Create settings that never limit a cell."""
+        return cls(max_chars=None, time_limit=None)
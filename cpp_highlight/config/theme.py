@@ -2,8 +2,9 @@
 
 import json
 import sys
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from pathlib import Path
+from types import MappingProxyType
 from typing import Dict, Optional
 
 from pygments.token import Token
@@ -150,6 +151,14 @@ class ThemeConfig:
         except IOError as e:
             print(f"Warning: Failed to create default config: {e}", file=sys.stderr)
 
+    def frozen(self) -> "ThemeConfig":
+        """Return a copy with read-only tables, safe to share between threads."""
+        return replace(
+            self,
+            colors=MappingProxyType(dict(self.colors)),
+            token_names=MappingProxyType(dict(self.token_names)),
+        )
+
     def get_color(self, token_type: Token) -> str:
         """Get color for a token type."""
         type_name = self.token_names.get(token_type)
@@ -1,12 +1,19 @@
 """Core module for ExcelCppSyntaxHighlight."""
 
 from .detection import is_cpp_code, C_DETECTORS_HIGH, C_DETECTORS_MEDIUM
+from .scanner import ScanDetector
+from .languages import LANGUAGES, LanguageClassifier
 from .highlighter import CellHighlighter, calculate_required_height
+from .lex_cache import LexCache
 
 __all__ = [
     "is_cpp_code",
     "C_DETECTORS_HIGH",
     "C_DETECTORS_MEDIUM",
+    "ScanDetector",
+    "LANGUAGES",
+    "LanguageClassifier",
     "CellHighlighter",
     "calculate_required_height",
+    "LexCache",
 ]
@@ -0,0 +1,279 @@
+"""Column-wide C++ detection vectorized with NumPy.
+
+Requires numpy, which is an optional dependency.
+"""
+
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .detection import C_DETECTORS_HIGH, C_DETECTORS_MEDIUM, is_cpp_code
+from .scanner import iter_block_comments
+
+# Placed between cells in the joined buffer.  NUL cannot occur in worksheet
+# text, so no anchor, \s or \w run crosses it, and the newline stops ``.`` and
+# makes ``^`` match at the start of every cell.
+CELL_SEPARATOR = "\x00\n"
+
+BLOCK_COMMENT_PATTERN = r"/\*.*?\*/"
+
+# Optional line anchor, \b and an alternation of plain words, then a tail
+_KEYWORD_LED = re.compile(
+    r"(?P<line>\^\[\^\\S\\n\]\*)?(?P<bound>\\b)?"
+    r"\((?:\?:)?(?P<words>\w+(?:\|\w+)*)\)(?P<tail>.*)$"
+)
+
+# Words of up to 9 ASCII characters pack losslessly into 63 bits
+_MAX_KEY_LENGTH = 9
+
+_IS_WORD = np.zeros(256, dtype=bool)
+for _ch in "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz":
+    _IS_WORD[ord(_ch)] = True
+
+
+def _word_key(word: str) -> int:
+    """Pack an ASCII word of up to 9 characters into one integer."""
+    key = 0
+    for k, ch in enumerate(word):
+        key |= ord(ch) << (7 * k)
+    return key
+
+
+class _KeywordRule:
+    """A pattern that starts with one of a set of whole words.
+
+    ``exact`` rules (``\\b(a|b)\\b``) are counted from the word table alone;
+    the others are confirmed with the original pattern at each keyword hit.
+    """
+
+    def __init__(self, is_high: bool, pattern: str, m):
+        self.is_high = is_high
+        self.words = m.group("words").split("|")
+        self.line_start = m.group("line") is not None
+        self.exact = (
+            not self.line_start
+            and m.group("bound") is not None
+            and m.group("tail") == r"\b"
+        )
+        self.regex = re.compile(pattern, re.MULTILINE)
+
+
+class BatchDetector:
+    """Detects C++ code in many cells at once.
+
+    ASCII cells are joined into one buffer with separators, and each pattern
+    is applied to the whole buffer once:
+
+    - patterns that start with a whole keyword (``\\b(int|char)\\b``,
+      ``\\b(class|struct)\\s+\\w+``, ``^\\s*(public|private):``) are found on
+      a NumPy word table: word boundaries come from a byte lookup, each word
+      is packed into an integer key, and keywords are looked up with
+      ``np.searchsorted``.  Only keyword hits that need a structural check
+      are confirmed with the original pattern;
+    - block comments use the linear scanner and the rest use ``finditer``.
+
+    Match offsets are mapped back to cells with ``np.searchsorted`` on the
+    cell start offsets, and per-cell counts and decisions are array
+    operations.  Non-ASCII cells go through ``is_cpp_code`` one by one.  The
+    decisions match ``is_cpp_code`` for every cell.
+    """
+
+    def __init__(
+        self,
+        high_patterns: List[str] = None,
+        medium_patterns: List[str] = None,
+    ):
+        """Compile the detection patterns once for all batches."""
+        self.high_patterns = high_patterns
+        self.medium_patterns = medium_patterns
+        high = list(high_patterns or C_DETECTORS_HIGH)
+        medium = list(medium_patterns or C_DETECTORS_MEDIUM)
+
+        self._plain: List[Tuple[bool, Optional[re.Pattern]]] = []
+        self._rules: List[_KeywordRule] = []
+        for is_high, pattern in [(True, p) for p in high] + [
+            (False, p) for p in medium
+        ]:
+            m = _KEYWORD_LED.match(pattern)
+            if pattern == BLOCK_COMMENT_PATTERN:
+                self._plain.append((is_high, None))
+            elif m is None or any(
+                len(word) > _MAX_KEY_LENGTH for word in m.group("words").split("|")
+            ):
+                self._plain.append((is_high, re.compile(pattern, re.MULTILINE)))
+            else:
+                self._rules.append(_KeywordRule(is_high, pattern, m))
+
+        # Sorted keyword keys; each maps to the rules that start with it
+        owners: Dict[int, List[int]] = {}
+        for index, rule in enumerate(self._rules):
+            for word in rule.words:
+                owners.setdefault(_word_key(word), []).append(index)
+        self._keys = np.array(sorted(owners), dtype=np.uint64)
+        self._key_owners = [owners[int(key)] for key in self._keys]
+        self._needs_check = np.array(
+            [
+                any(not self._rules[index].exact for index in key_owners)
+                for key_owners in self._key_owners
+            ],
+            dtype=bool,
+        )
+
+        # (first character, length) pairs that some keyword has
+        self._shapes = np.zeros((256, _MAX_KEY_LENGTH + 2), dtype=bool)
+        for rule in self._rules:
+            for word in rule.words:
+                self._shapes[ord(word[0]), len(word)] = True
+
+    def _keyword_hits(self, codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Find whole words that are keywords.
+
+        Words are first filtered on (first character, length) so that only
+        plausible keywords are packed into keys.
+
+        Returns:
+            Tuple of (word start offsets, index into the sorted keyword keys)
+        """
+        if not len(self._keys):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        is_word = _IS_WORD[codes].view(np.int8)
+        edges = np.diff(is_word, prepend=0, append=0)
+        starts = np.flatnonzero(edges == 1)
+        lengths = np.flatnonzero(edges == -1) - starts
+
+        lengths = np.minimum(lengths, _MAX_KEY_LENGTH + 1)
+        plausible = self._shapes[codes[starts], lengths]
+        starts = starts[plausible]
+        lengths = lengths[plausible]
+
+        keys = np.zeros(len(starts), dtype=np.uint64)
+        for length in np.unique(lengths).tolist():
+            group = lengths == length
+            group_starts = starts[group]
+            group_keys = np.zeros(len(group_starts), dtype=np.uint64)
+            for k in range(length):
+                group_keys |= codes[group_starts + k].astype(np.uint64) << np.uint64(
+                    7 * k
+                )
+            keys[group] = group_keys
+
+        slots = np.searchsorted(self._keys, keys)
+        slots[slots == len(self._keys)] = 0
+        found = self._keys[slots] == keys
+        return starts[found], slots[found]
+
+    @staticmethod
+    def _line_start(buffer: str, pos: int) -> int:
+        """Return the line start before ``pos`` or -1 if text precedes it."""
+        while pos > 0:
+            ch = buffer[pos - 1]
+            if ch == "\n":
+                break
+            if not ch.isspace():
+                return -1
+            pos -= 1
+        return pos
+
+    def _keyword_offsets(
+        self, buffer: str, codes: np.ndarray
+    ) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """Return match offsets of keyword-led rules as (high, medium) arrays."""
+        high: List[np.ndarray] = []
+        medium: List[np.ndarray] = []
+        starts, slots = self._keyword_hits(codes)
+
+        checked: List[List[int]] = [[] for _ in self._rules]
+        last_end = [0] * len(self._rules)
+        for index, rule in enumerate(self._rules):
+            if not rule.exact:
+                continue
+            mine = np.fromiter(
+                (index in owners for owners in self._key_owners), dtype=bool
+            )
+            (high if rule.is_high else medium).append(starts[mine[slots]])
+
+        pending = self._needs_check[slots]
+        for start, slot in zip(starts[pending].tolist(), slots[pending].tolist()):
+            for index in self._key_owners[slot]:
+                rule = self._rules[index]
+                if rule.exact:
+                    continue
+                match_start = start
+                if rule.line_start:
+                    match_start = self._line_start(buffer, start)
+                    if match_start < 0:
+                        continue
+                if match_start < last_end[index]:
+                    continue
+                m = rule.regex.match(buffer, match_start)
+                if m is not None:
+                    last_end[index] = m.end()
+                    checked[index].append(match_start)
+
+        for index, rule in enumerate(self._rules):
+            if checked[index]:
+                (high if rule.is_high else medium).append(np.array(checked[index]))
+        return high, medium
+
+    def _plain_offsets(self, buffer: str) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """Return match offsets of all other patterns as (high, medium) arrays."""
+        high: List[np.ndarray] = []
+        medium: List[np.ndarray] = []
+        for is_high, pattern in self._plain:
+            if pattern is None:
+                offsets = list(iter_block_comments(buffer))
+            else:
+                offsets = [m.start() for m in pattern.finditer(buffer)]
+            (high if is_high else medium).append(np.array(offsets, dtype=np.int64))
+        return high, medium
+
+    @staticmethod
+    def _counts(offsets: List[np.ndarray], cell_starts: np.ndarray) -> np.ndarray:
+        """Count match offsets per cell."""
+        if not offsets:
+            return np.zeros(len(cell_starts), dtype=np.int64)
+        offsets = np.concatenate(offsets)
+        cells = np.searchsorted(cell_starts, offsets, side="right") - 1
+        return np.bincount(cells, minlength=len(cell_starts))
+
+    def detect(self, texts: Sequence[object]) -> np.ndarray:
+        """Detect C++ code in each of ``texts``.
+
+        Args:
+            texts: Cell values; anything but a non-empty string is not code
+
+        Returns:
+            Boolean array with one decision per input value
+        """
+        result = np.zeros(len(texts), dtype=bool)
+        index = []
+        for i, text in enumerate(texts):
+            if not isinstance(text, str) or not text:
+                continue
+            if text.isascii() and "\x00" not in text:
+                index.append(i)
+            else:
+                result[i] = is_cpp_code(text, self.high_patterns, self.medium_patterns)
+        if not index:
+            return result
+
+        cells = [texts[i] for i in index]
+        lengths = np.fromiter(
+            (len(t) for t in cells), dtype=np.int64, count=len(cells)
+        )
+        cell_starts = np.zeros(len(cells), dtype=np.int64)
+        np.cumsum(lengths[:-1] + len(CELL_SEPARATOR), out=cell_starts[1:])
+        buffer = CELL_SEPARATOR.join(cells)
+        codes = np.frombuffer(buffer.encode("ascii"), dtype=np.uint8)
+
+        keyword_high, keyword_medium = self._keyword_offsets(buffer, codes)
+        plain_high, plain_medium = self._plain_offsets(buffer)
+        high = self._counts(keyword_high + plain_high, cell_starts)
+        medium = self._counts(keyword_medium + plain_medium, cell_starts)
+
+        result[index] = (
+            (high >= 1) | (medium >= 3) | ((medium >= 2) & (lengths > 100))
+        )
+        return result
@@ -3,6 +3,8 @@
 import re
 from typing import List
 
+from .scanner import get_scan_detector
+
 # C++ detection patterns - high confidence (single match = detected)
 C_DETECTORS_HIGH: List[str] = [
     r'#include\s*[<"]',
@@ -14,11 +16,12 @@ C_DETECTORS_HIGH: List[str] = [
 ]
 
 # C++ detection patterns - medium confidence (multiple matches needed)
+# Line anchors use [^\S\n]* rather than \s* so they cannot span newlines
 C_DETECTORS_MEDIUM: List[str] = [
     r"\b(class|struct|enum)\s+\w+",
     r"\b(int|char|float|double|void|bool|auto|const|constexpr|mutable)\b",
-    r"^\s*(public|private|protected):",
-    r"^\s*#\s*(define|ifdef|ifndef|endif|pragma)",
+    r"^[^\S\n]*(public|private|protected):",
+    r"^[^\S\n]*#\s*(define|ifdef|ifndef|endif|pragma)",
     r"\b(for|while|if|else|switch|case|break|continue|return)\b",
     r"\b(cout|cin|endl|printf|scanf)\b",
     r"<<|>>",
@@ -33,10 +36,17 @@ def is_cpp_code(
     high_patterns: List[str] = None,
     medium_patterns: List[str] = None,
 ) -> bool:
-    """Detect if text contains C++ code."""
+    """Detect if text contains C++ code.
+
+    With the default patterns the linear-time scan backend is used; custom
+    pattern lists fall back to one regex pass per pattern.
+    """
     if not text or not isinstance(text, str):
         return False
 
+    if not high_patterns and not medium_patterns:
+        return get_scan_detector().is_cpp_code(text)
+
     high = high_patterns or C_DETECTORS_HIGH
     medium = medium_patterns or C_DETECTORS_MEDIUM
 
@@ -1,17 +1,27 @@
 """Cell highlighting logic."""
 
 import sys
-from typing import List, Tuple, Optional
+import time
+from array import array
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional
 
 from openpyxl.cell.rich_text import CellRichText
 from openpyxl.cell.text import InlineFont
 from openpyxl.styles import Alignment, Color
-from pygments import lex
 from pygments.lexers import CppLexer
 from pygments.token import Token
 
-from cpp_highlight.config import FontSettings, ThemeConfig
-from cpp_highlight.models import TextBlock
+from cpp_highlight.config import BudgetSettings, FontSettings, ThemeConfig
+from cpp_highlight.models import ColorRuns, RunStats, TextBlock
+from cpp_highlight.models.runs import MAX_PALETTE_SIZE, LazyRichText
+from cpp_highlight.models.text_block import _rpr_xml
+
+from .incremental import IncrementalLexer, supports
+from .languages import lexer_class
+from .lex_cache import MIN_CACHED_LINES, LexCache
+
+# Tokens lexed between two checks of the per-cell time budget
+_TIME_CHECK_INTERVAL = 64
 
 
 def calculate_required_height(
@@ -30,6 +40,24 @@ def calculate_required_height(
     return font_settings.base_height + (line_count - 1) * font_settings.line_height
 
 
+class _CellSkipped(Exception):
+    """Raised from a token stream when the time budget skips the cell."""
+
+
+def _lexer_input(text: str) -> str:
+    """Normalize text the way ``pygments.lex`` does with default options.
+
+    The concatenated token values of ``lex(text, lexer)`` equal this string,
+    which lets the budget code hand the unlexed rest of a cell to a fallback.
+    """
+    if text.startswith("\ufeff"):
+        text = text[1:]
+    text = text.replace("\r\n", "\n").replace("\r", "\n").strip("\n")
+    if not text.endswith("\n"):
+        text += "\n"
+    return text
+
+
 class CellHighlighter:
     """Highlights Excel cells with syntax-highlighted C++ code."""
 
@@ -38,45 +66,351 @@ class CellHighlighter:
         theme: ThemeConfig = None,
         font: FontSettings = None,
         lexer: type = None,
+        budget: BudgetSettings = None,
+        stats: RunStats = None,
+        cache: LexCache = None,
     ):
-        """Initialize the highlighter."""
+        """Initialize the highlighter.
+
+        With a ``cache``, cells that are highlighted with a location are
+        lexed incrementally against their cached previous version.
+        """
         self.theme = theme or ThemeConfig.from_json()
         self.font = font or FontSettings.default()
         self.lexer = (lexer or CppLexer)()
+        self.budget = budget or BudgetSettings.unlimited()
+        self.stats = stats if stats is not None else RunStats()
+        self.cache = cache
+        # Prefix of the cache keys of cells, e.g. the workbook's path
+        self.cache_scope = ""
+        self._incremental = (
+            IncrementalLexer(self.lexer) if supports(self.lexer) else None
+        )
+        # (lexer, incremental lexer) per language, each built once on first
+        # use; None stands for ``self.lexer``.  The theme's token colors and
+        # fonts are shared, since all lexers use Pygments' token types.
+        self._lexers: Dict[Optional[str], tuple] = {
+            None: (self.lexer, self._incremental)
+        }
+        self.last_fallback: Optional[str] = None
+        # One InlineFont per color, shared by all runs of that color
+        self._fonts = {}
+        # Token type -> its color's font, so each color is looked up once
+        self._token_fonts = {}
+        self._font_misses = 0
+        # Colors in order of first use; ColorRuns index into this tuple
+        self.palette: Tuple[str, ...] = ()
+        self._token_colors: Dict[Token, int] = {}
+        # Font per entry of a palette, for materializing ColorRuns
+        self._palette_fonts: Dict[Tuple[str, ...], List[InlineFont]] = {}
 
-    def highlight(self, text: str) -> Tuple[Optional[CellRichText], Optional[float]]:
-        """Apply syntax highlighting to C++ code text."""
-        try:
-            tokens = list(lex(text, self.lexer))
+    def _fallback(self, action: str, location: Optional[str]) -> None:
+        """Record a budget fallback for the current cell."""
+        self.last_fallback = action
+        self.stats.record_fallback(action, location)
+
+    def _lexers_for(self, language: Optional[str]) -> tuple:
+        """Return the (lexer, incremental lexer or None) of a language."""
+        lexers = self._lexers.get(language)
+        if lexers is None:
+            lexer = lexer_class(language)()
+            lexers = (lexer, IncrementalLexer(lexer) if supports(lexer) else None)
+            self._lexers[language] = lexers
+        return lexers
+
+    def _lex_chunks(self, source: str, lexer) -> Iterable[Tuple[Token, str]]:
+        """Lex normalized text line-wise, ``chunk_lines`` lines at a time.
+
+        Lexer state does not carry across chunks, so a construct spanning a
+        chunk boundary (such as a long block comment) may be colored wrongly.
+        """
+        # Normalized text ends with a newline, so the last split is empty
+        lines = source.split("\n")[:-1]
+        step = self.budget.chunk_lines
+        for start in range(0, len(lines), step):
+            chunk = "\n".join(lines[start : start + step]) + "\n"
+            for _, token_type, value in lexer.get_tokens_unprocessed(chunk):
+                yield token_type, value
+
+    def _color_font(self, color_hex: str) -> InlineFont:
+        """Return the shared font of a color, creating it on first use."""
+        font = self._fonts.get(color_hex)
+        if font is None:
+            self._font_misses += 1
+            font = InlineFont(
+                color=Color(rgb=color_hex),
+                rFont=self.font.name,
+                sz=self.font.size,
+            )
+            self._fonts[color_hex] = font
+        return font
+
+    def _font_for(self, token_type: Token) -> InlineFont:
+        """Return the shared font for a token type, creating it on first use."""
+        font = self._color_font(self.theme.get_color(token_type))
+        self._token_fonts[token_type] = font
+        return font
 
+    def _color_index(self, token_type: Token) -> int:
+        """Return the palette index of a token type's color."""
+        color_hex = self.theme.get_color(token_type)
+        if color_hex in self.palette:
+            index = self.palette.index(color_hex)
+        elif len(self.palette) >= MAX_PALETTE_SIZE:
+            raise ValueError(f"More than {MAX_PALETTE_SIZE} colors in use")
+        else:
+            index = len(self.palette)
+            self.palette += (color_hex,)
+        self._token_colors[token_type] = index
+        return index
+
+    def _token_stream(
+        self, text: str, location: Optional[str], language: Optional[str] = None
+    ) -> Optional[Iterator[Tuple[Token, str]]]:
+        """Return the cell's tokens within the budget, or None to skip the cell.
+
+        Oversized cells are decided up front; the time limit is checked while
+        the returned iterator is consumed (see ``_within_time_limit``).
+        """
+        budget = self.budget
+        source = _lexer_input(text)
+        lexer, incremental = self._lexers_for(language)
+
+        if budget.max_chars is not None and len(text) > budget.max_chars:
+            self._fallback(budget.oversize, location)
+            if budget.oversize == "skip":
+                return None
+            if budget.oversize == "plain":
+                return iter([(Token.Text, source)])
+            stream = self._lex_chunks(source, lexer)
+        elif (
+            self.cache is not None
+            and location is not None
+            and incremental is not None
+            and source.count("\n") >= MIN_CACHED_LINES
+        ):
+            if language is not None:
+                # A cell may change language between runs
+                location = f"{location}|{language}"
+            stream = self._cached_tokens(source, location, incremental)
+        else:
+            stream = (
+                (token_type, value)
+                for _, token_type, value in lexer.get_tokens_unprocessed(source)
+            )
+
+        if budget.time_limit is None:
+            return stream
+        return self._within_time_limit(stream, source, location)
+
+    def _cached_tokens(
+        self, source: str, location: str, incremental: IncrementalLexer
+    ) -> Iterator[Tuple[Token, str]]:
+        """Lex a cell through the cache, re-lexing only its changed lines.
+
+        The lexing is done before any token is passed on, so the time limit
+        does not cut it short; cached cells are within ``max_chars``.
+        """
+        key = f"{self.cache_scope}|{location}"
+        old = self.cache.get(key)
+        if old is None:
+            entry = incremental.lex(source)
+            self.stats.record_cache("lex", 0, 1)
+        else:
+            entry, relexed = incremental.relex(old, source)
+            self.stats.record_cache("lex", 1, 0)
+            self.stats.lines_relexed += relexed
+        if entry is not old:
+            self.cache.put(key, entry)
+        return entry.tokens()
+
+    def _within_time_limit(
+        self,
+        stream: Iterator[Tuple[Token, str]],
+        source: str,
+        location: Optional[str],
+    ) -> Iterator[Tuple[Token, str]]:
+        """Pass tokens through until the per-cell time limit runs out.
+
+        On timeout the unlexed rest of ``source`` follows as one plain token,
+        or ``_CellSkipped`` is raised when the budget skips such cells.
+        """
+        budget = self.budget
+        deadline = time.perf_counter() + budget.time_limit
+        consumed = 0
+        for count, (token_type, value) in enumerate(stream, 1):
+            yield token_type, value
+            consumed += len(value)
+            if count % _TIME_CHECK_INTERVAL == 0 and time.perf_counter() > deadline:
+                if budget.on_timeout == "skip":
+                    self._fallback("timeout-skip", location)
+                    raise _CellSkipped()
+                self._fallback("timeout", location)
+                rest = source[consumed:]
+                if rest:
+                    yield Token.Text, rest
+                return
+
+    def _trimmed(
+        self, stream: Iterator[Tuple[Token, str]]
+    ) -> Iterator[Tuple[Token, str]]:
+        """Pass tokens on one step late, so the last one can still lose the
+        lexer's trailing newline."""
+        last_type = last_value = None
+        for token_type, value in stream:
+            if last_value is not None:
+                yield last_type, last_value
+            last_type, last_value = token_type, value
+
+        if last_value is None:
+            return
+        if last_type == Token.Text.Whitespace and last_value == "\n":
             # Remove trailing newline token
-            if (
-                tokens
-                and tokens[-1][0] == Token.Text.Whitespace
-                and tokens[-1][1] == "\n"
-            ):
-                tokens = tokens[:-1]
-
-            blocks = []
-            for token_type, value in tokens:
-                color_hex = self.theme.get_color(token_type)
-                color_obj = Color(rgb=color_hex)
-                font = InlineFont(
-                    color=color_obj,
-                    rFont=self.font.name,
-                    sz=self.font.size,
-                )
-                block = TextBlock(text=value, font=font)
-                blocks.append(block)
-
-            rich_text = CellRichText(*blocks)
-            required_height = calculate_required_height(tokens, self.font)
-
-            return rich_text, required_height
+            return
+        if self.last_fallback and last_value.endswith("\n"):
+            # A plain fallback block still carries the lexer's newline
+            last_value = last_value[:-1]
+        yield last_type, last_value
 
+    def _timed(
+        self, body, text: str, location: Optional[str], language: Optional[str]
+    ):
+        """Run ``body`` on one cell and record its time."""
+        self.last_fallback = None
+        start = time.perf_counter()
+        try:
+            return body(text, location, language)
+        except _CellSkipped:
+            return None, None
         except Exception as e:
             print(f"Warning: Failed to highlight text: {e}", file=sys.stderr)
             return None, None
+        finally:
+            self.stats.lex_seconds.observe(time.perf_counter() - start)
+
+    def highlight(
+        self,
+        text: str,
+        location: Optional[str] = None,
+        language: Optional[str] = None,
+    ) -> Tuple[Optional[CellRichText], Optional[float]]:
+        """Apply syntax highlighting to C++ code text.
+
+        Args:
+            text: Source code to highlight
+            location: Cell reference used when logging budget fallbacks
+            language: Name of a language in
+                ``cpp_highlight.core.languages.LANGUAGES`` to lex the text
+                as (default: this highlighter's lexer)
+
+        Returns:
+            Tuple of (rich text, required row height), or (None, None) if the
+            text could not be highlighted or was skipped by the budget
+        """
+        return self._timed(self._highlight, text, location, language)
+
+    def _highlight(
+        self, text: str, location: Optional[str], language: Optional[str]
+    ) -> Tuple[Optional[CellRichText], Optional[float]]:
+        """Body of ``highlight``.
+
+        Runs, fonts and the line count are built in one pass over the token
+        stream.
+        """
+        stream = self._token_stream(text, location, language)
+        if stream is None:
+            return None, None
+
+        token_fonts = self._token_fonts
+        self._font_misses = 0
+        blocks = []
+        newlines = 0
+        for token_type, value in self._trimmed(stream):
+            font = token_fonts.get(token_type)
+            if font is None:
+                font = self._font_for(token_type)
+            blocks.append(TextBlock(font, value))
+            newlines += value.count("\n")
+
+        misses = self._font_misses
+        self.stats.record_cache("font", len(blocks) - misses, misses)
+
+        rich_text = CellRichText(blocks)
+        required_height = self.font.base_height + newlines * self.font.line_height
+
+        return rich_text, required_height
+
+    def highlight_runs(
+        self,
+        text: str,
+        location: Optional[str] = None,
+        language: Optional[str] = None,
+    ) -> Tuple[Optional[ColorRuns], Optional[float]]:
+        """Highlight like ``highlight``, returning compact color runs.
+
+        ``materialize`` turns the runs into the rich text ``highlight``
+        returns; they are cheap to pickle and to keep until then.
+        """
+        return self._timed(self._highlight_runs, text, location, language)
+
+    def _highlight_runs(
+        self, text: str, location: Optional[str], language: Optional[str]
+    ) -> Tuple[Optional[ColorRuns], Optional[float]]:
+        """Body of ``highlight_runs``."""
+        stream = self._token_stream(text, location, language)
+        if stream is None:
+            return None, None
+
+        token_colors = self._token_colors
+        colors = array("B")
+        lengths = array("I")
+        values = []
+        newlines = 0
+        for token_type, value in self._trimmed(stream):
+            index = token_colors.get(token_type)
+            if index is None:
+                index = self._color_index(token_type)
+            colors.append(index)
+            lengths.append(len(value))
+            values.append(value)
+            newlines += value.count("\n")
+
+        runs = ColorRuns("".join(values), self.palette, colors, lengths)
+        required_height = self.font.base_height + newlines * self.font.line_height
+
+        return runs, required_height
+
+    def palette_fonts(self, palette: Tuple[str, ...]) -> List[InlineFont]:
+        """Return this highlighter's font for each color of a palette."""
+        fonts = self._palette_fonts.get(palette)
+        if fonts is None:
+            fonts = [self._color_font(color_hex) for color_hex in palette]
+            self._palette_fonts[palette] = fonts
+        return fonts
+
+    def _runs_fonts(self, runs: ColorRuns) -> List[InlineFont]:
+        """Return the fonts of a cell's palette, counting font cache use."""
+        self._font_misses = 0
+        fonts = self.palette_fonts(runs.palette)
+        misses = self._font_misses
+        self.stats.record_cache("font", len(runs) - misses, misses)
+        return fonts
+
+    def materialize(self, runs: ColorRuns) -> CellRichText:
+        """Build the rich text of color runs with this highlighter's fonts.
+
+        The runs may come from another highlighter, e.g. in a worker process.
+        """
+        return runs.to_rich_text(self._runs_fonts(runs))
+
+    def defer(self, runs: ColorRuns) -> LazyRichText:
+        """Wrap color runs in a cell value that is built only when saved."""
+        return LazyRichText(runs, self._runs_fonts(runs))
+
+    def runs_xml(self, runs: ColorRuns) -> str:
+        """Serialize color runs to the ``<r>`` markup their rich text has."""
+        rprs = [_rpr_xml(font) for font in self.palette_fonts(runs.palette)]
+        return runs.to_xml(rprs)
 
     def apply_to_cell(self, cell) -> bool:
         """Apply syntax highlighting to an Excel cell."""
@@ -84,7 +418,7 @@ class CellHighlighter:
         if not isinstance(text, str):
             return False
 
-        rich_text, required_height = self.highlight(text)
+        rich_text, required_height = self.highlight(text, cell.coordinate)
 
         if rich_text is None:
             return False
@@ -0,0 +1,315 @@
+"""Line-level incremental lexing of edited cells."""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from pygments.lexers.c_cpp import CFamilyLexer
+from pygments.token import Error, Name, Keyword, Whitespace, _TokenType
+from pygments.token import string_to_tokentype
+
+# (line number, index of the first token of the line, lexer state stack)
+Checkpoint = Tuple[int, int, Tuple[str, ...]]
+
+
+@dataclass
+class LexEntry:
+    """A lexed cell with the lexer state at every line start.
+
+    Token types are stored by name so entries survive pickling (Pygments
+    token types are only singletons within a process).
+
+    Attributes:
+        source: Normalized text that was lexed (see ``_lexer_input``)
+        type_names: Token type names used by the cell
+        kinds: Index into ``type_names`` per token
+        lengths: Length of each token
+        checkpoints: Lines at which a lexer match started, with the state
+            stack at that point
+        unsettled: Lines on which the lexer recovered from text it could
+            not match, such as an unterminated raw string; a later edit
+            that completes the construct changes how they lex
+    """
+
+    source: str
+    type_names: Tuple[str, ...]
+    kinds: array
+    lengths: array
+    checkpoints: List[Checkpoint]
+    unsettled: List[int]
+
+    def tokens(self, start: int = 0) -> Iterator[Tuple[_TokenType, str]]:
+        """Yield (token type, value) from the ``start``-th token on."""
+        types = [string_to_tokentype(name) for name in self.type_names]
+        source = self.source
+        pos = sum(self.lengths[:start])
+        for kind, length in zip(self.kinds[start:], self.lengths[start:]):
+            yield types[kind], source[pos : pos + length]
+            pos += length
+
+
+def supports(lexer) -> bool:
+    """Whether ``lexer`` can be lexed incrementally.
+
+    The C family lexers qualify: their state is the state stack alone, and
+    where to restart is judged by C statement ends (see ``relex``).
+    """
+    return (
+        isinstance(lexer, CFamilyLexer)
+        and type(lexer).get_tokens_unprocessed is CFamilyLexer.get_tokens_unprocessed
+    )
+
+
+def _c_family_type(lexer, token_type, value):
+    """Apply CFamilyLexer's renaming of standard type names."""
+    if token_type is Name and (
+        (lexer.stdlibhighlighting and value in lexer.stdlib_types)
+        or (lexer.c99highlighting and value in lexer.c99_types)
+        or (lexer.c11highlighting and value in lexer.c11_atomic_types)
+        or (lexer.platformhighlighting and value in lexer.linux_types)
+    ):
+        return Keyword.Type
+    return token_type
+
+
+def _ends_statement(line: str) -> bool:
+    """Whether a non-blank line ends a C statement or opens a block.
+
+    Rules such as the one for function definitions try to match across
+    lines and only fail at a later line, so a restart must not fall inside
+    a statement that an edit further down could complete.  Those rules
+    stop at ``;`` and ``{`` but not at ``}``, so a closing brace does not
+    end one: in ``int main()\n}\n...\n{`` the definition spans it.
+    """
+    return line[-1] in ";{"
+
+
+class IncrementalLexer:
+    """Lexes text and re-lexes edited text from the first changed line.
+
+    ``lex`` runs the same loop as ``RegexLexer.get_tokens_unprocessed`` and
+    additionally records the state stack at every line start where a match
+    begins.  ``relex`` restarts from such a checkpoint before the first
+    changed line and stops as soon as the state at a line start matches the
+    old entry's state at the same line of the unchanged tail; the old tokens
+    are reused from there.
+    """
+
+    def __init__(self, lexer):
+        """Wrap a Pygments lexer for which ``supports`` is true."""
+        if not supports(lexer):
+            raise ValueError(f"{type(lexer).__name__} cannot be lexed incrementally")
+        self.lexer = lexer
+
+    def _run(
+        self,
+        text: str,
+        pos: int,
+        stack: Tuple[str, ...],
+        starts: List[int],
+        unsettled: List[int],
+    ) -> Iterator[Tuple[Optional[Checkpoint], int, _TokenType, str]]:
+        """Lex ``text`` from ``pos`` with a given state stack.
+
+        Yields (checkpoint, pos, token type, value).  The checkpoint is set,
+        with a token index of -1, on the first token of a line that starts
+        a match; all other items carry None.  Lines where the lexer
+        recovers are appended to ``unsettled``.
+        """
+        lexer = self.lexer
+        tokendefs = lexer._tokens
+        statestack = list(stack)
+        statetokens = tokendefs[statestack[-1]]
+        line_of = {start: line for line, start in enumerate(starts)}
+        checkpoint = None
+        marked = -1
+
+        def settle(at):
+            line = bisect_right(starts, at) - 1
+            if not unsettled or unsettled[-1] != line:
+                unsettled.append(line)
+
+        while 1:
+            # The state on arriving at a line start; zero-width matches
+            # there depend on the text that follows
+            if pos != marked:
+                line = line_of.get(pos)
+                if line is not None:
+                    checkpoint = (line, -1, tuple(statestack))
+                    marked = pos
+            for rexmatch, action, new_state in statetokens:
+                m = rexmatch(text, pos)
+                if m:
+                    if action is not None:
+                        if type(action) is _TokenType:
+                            items = ((pos, action, m.group()),)
+                        else:
+                            items = action(lexer, m)
+                        for index, token_type, value in items:
+                            if token_type is Name:
+                                token_type = _c_family_type(lexer, token_type, value)
+                                # A raw string prefix that lexed as a name
+                                # lacks its closing delimiter
+                                if text.startswith('"', index + len(value)):
+                                    settle(index)
+                            yield checkpoint, index, token_type, value
+                            checkpoint = None
+                    pos = m.end()
+                    if new_state is not None:
+                        if isinstance(new_state, tuple):
+                            for state in new_state:
+                                if state == "#pop":
+                                    if len(statestack) > 1:
+                                        statestack.pop()
+                                elif state == "#push":
+                                    statestack.append(statestack[-1])
+                                else:
+                                    statestack.append(state)
+                        elif isinstance(new_state, int):
+                            if abs(new_state) >= len(statestack):
+                                del statestack[1:]
+                            else:
+                                del statestack[new_state:]
+                        elif new_state == "#push":
+                            statestack.append(statestack[-1])
+                        else:
+                            raise ValueError(f"wrong state def: {new_state!r}")
+                        statetokens = tokendefs[statestack[-1]]
+                    break
+            else:
+                if pos >= len(text):
+                    break
+                settle(pos)
+                if text[pos] == "\n":
+                    # At EOL, reset state to "root"
+                    statestack = ["root"]
+                    statetokens = tokendefs["root"]
+                    yield checkpoint, pos, Whitespace, "\n"
+                else:
+                    yield checkpoint, pos, Error, text[pos]
+                checkpoint = None
+                pos += 1
+
+    @staticmethod
+    def _line_starts(text: str) -> List[int]:
+        """Return the offset of every line start."""
+        starts = [0]
+        pos = text.find("\n")
+        while pos != -1 and pos + 1 < len(text):
+            starts.append(pos + 1)
+            pos = text.find("\n", pos + 1)
+        return starts
+
+    @staticmethod
+    def _collect(items, type_index, type_names, kinds, lengths, checkpoints):
+        """Append lexed items to the arrays of an entry being built."""
+        for checkpoint, _, token_type, value in items:
+            if checkpoint is not None:
+                checkpoints.append((checkpoint[0], len(kinds), checkpoint[2]))
+            kind = type_index.get(token_type)
+            if kind is None:
+                kind = type_index[token_type] = len(type_names)
+                type_names.append(str(token_type))
+            kinds.append(kind)
+            lengths.append(len(value))
+
+    def lex(self, source: str) -> LexEntry:
+        """Lex normalized text, recording checkpoints."""
+        type_index: Dict[_TokenType, int] = {}
+        type_names: List[str] = []
+        kinds, lengths, checkpoints, unsettled = array("H"), array("I"), [], []
+        items = self._run(
+            source, 0, ("root",), self._line_starts(source), unsettled
+        )
+        self._collect(items, type_index, type_names, kinds, lengths, checkpoints)
+        return LexEntry(
+            source, tuple(type_names), kinds, lengths, checkpoints, unsettled
+        )
+
+    def relex(self, old: LexEntry, source: str) -> Tuple[LexEntry, int]:
+        """Lex ``source`` reusing what is unchanged from ``old``.
+
+        Lexing restarts before the statement holding the line above the
+        first change, and before the first unsettled line, since matches
+        there may have looked ahead into the changed lines.
+
+        Returns:
+            Tuple of (entry for ``source``, number of lines lexed again)
+        """
+        if source == old.source:
+            return old, 0
+
+        old_lines = old.source.split("\n")
+        new_lines = source.split("\n")
+        limit = min(len(old_lines), len(new_lines))
+        prefix = 0
+        while prefix < limit and old_lines[prefix] == new_lines[prefix]:
+            prefix += 1
+        suffix = 0
+        while (
+            suffix < limit - prefix
+            and old_lines[-1 - suffix] == new_lines[-1 - suffix]
+        ):
+            suffix += 1
+
+        # Normalized text ends with a newline, so the last split is empty
+        target = max(min(prefix, len(new_lines) - 1) - 1, 0)
+        if old.unsettled and old.unsettled[0] < target:
+            target = old.unsettled[0]
+        while target > 0:
+            line = new_lines[target - 1].rstrip()
+            if line and _ends_statement(line):
+                break
+            target -= 1
+        old_marks = [checkpoint[0] for checkpoint in old.checkpoints]
+        restart = old.checkpoints[bisect_right(old_marks, target) - 1]
+        start_line, start_token, stack = restart
+        starts = self._line_starts(source)
+
+        type_names = list(old.type_names)
+        type_index = {
+            string_to_tokentype(name): k for k, name in enumerate(type_names)
+        }
+        kinds = old.kinds[:start_token]
+        lengths = old.lengths[:start_token]
+        checkpoints = old.checkpoints[: bisect_left(old_marks, start_line)]
+        unsettled = old.unsettled[: bisect_left(old.unsettled, start_line)]
+
+        # A new line i lines up with old line i - shift once line i - 1 is
+        # in the unchanged tail, so lookbehinds see the same text
+        shift = len(new_lines) - len(old_lines)
+        first_synced = len(new_lines) - suffix + 1
+        old_by_line = {c[0]: c for c in old.checkpoints}
+
+        lexed_to = len(new_lines)
+        items = self._run(source, starts[start_line], stack, starts, unsettled)
+        for item in items:
+            checkpoint = item[0]
+            if checkpoint is not None and checkpoint[0] >= first_synced:
+                line = checkpoint[0]
+                match = old_by_line.get(line - shift)
+                if match is not None and match[2] == checkpoint[2]:
+                    # type_names extends the old names, so old kinds hold
+                    offset = len(kinds) - match[1]
+                    kinds.extend(old.kinds[match[1] :])
+                    lengths.extend(old.lengths[match[1] :])
+                    checkpoints.extend(
+                        (c[0] + shift, c[1] + offset, c[2])
+                        for c in old.checkpoints
+                        if c[0] >= line - shift
+                    )
+                    del unsettled[bisect_left(unsettled, line) :]
+                    unsettled.extend(
+                        u + shift for u in old.unsettled if u >= line - shift
+                    )
+                    lexed_to = line
+                    break
+            self._collect(
+                (item,), type_index, type_names, kinds, lengths, checkpoints
+            )
+
+        entry = LexEntry(
+            source, tuple(type_names), kinds, lengths, checkpoints, unsettled
+        )
+        return entry, lexed_to - start_line
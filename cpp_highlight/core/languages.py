@@ -0,0 +1,279 @@
+"""Languages that cells can be classified into, and a one-pass classifier.
+
+Each language has scan rules like C++'s ``SCAN_RULES_HIGH`` and
+``SCAN_RULES_MEDIUM``.  ``LanguageClassifier`` compiles the rules of all
+its languages into a single automaton, so scoring every language costs
+one linear scan of the text, however many languages there are.
+
+A cell is classified as the language with the most high-confidence
+matches, ties going to the one with more medium-confidence matches and
+then to the first in ``LANGUAGES``.  Medium-confidence matches alone only detect
+C++, with the thresholds of ``is_cpp_code``; the other languages' medium
+rules include words common in prose and need a high-confidence match.
+With C++ among the languages, every cell ``is_cpp_code`` detects is
+classified as some language.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pygments.lexers import find_lexer_class_by_name
+
+from .scanner import (
+    SCAN_RULES_HIGH,
+    SCAN_RULES_MEDIUM,
+    ScanDetector,
+    ScanRule,
+    _count_block_comments,
+)
+
+
+@dataclass(frozen=True)
+class Language:
+    """A language cells can be classified as.
+
+    Attributes:
+        name: Name used on the command line and in statistics
+        lexer: Pygments alias of the language's lexer
+        high: Rules of which a single match identifies the language
+        medium: Rules that only count towards a decision
+        block_comments: Count ``/* ... */`` comments as medium matches
+        medium_only: Detect the language from medium matches alone
+    """
+
+    name: str
+    lexer: str
+    high: Tuple[ScanRule, ...]
+    medium: Tuple[ScanRule, ...]
+    block_comments: bool = False
+    medium_only: bool = False
+
+
+# Control flow keywords shared by the C family
+_CONTROL = ScanRule(
+    ("for", "while", "if", "else", "switch", "case", "break", "continue", "return"),
+    word_start=True,
+    word_end=True,
+)
+
+CPP = Language(
+    "cpp",
+    "cpp",
+    tuple(SCAN_RULES_HIGH),
+    tuple(SCAN_RULES_MEDIUM),
+    block_comments=True,
+    medium_only=True,
+)
+
+C = Language(
+    "c",
+    "c",
+    (
+        ScanRule(("#include",), tail=r"\s*<\w+\.h>"),
+        ScanRule(("int",), tail=r"\s+main\s*\("),
+        ScanRule(
+            ("malloc", "calloc", "realloc", "free", "printf"),
+            tail=r"\(",
+            word_start=True,
+        ),
+        # Kept apart from printf, which they contain (see ScanDetector)
+        ScanRule(("fprintf", "sprintf"), tail=r"\(", word_start=True),
+        ScanRule(("typedef",), tail=r"\s+struct\b"),
+    ),
+    (
+        ScanRule(("struct", "enum", "union"), tail=r"\s+\w+", word_start=True),
+        ScanRule(
+            ("int", "char", "float", "double", "void", "long", "unsigned", "const"),
+            word_start=True,
+            word_end=True,
+        ),
+        ScanRule(
+            ("#",), tail=r"\s*(?:define|ifdef|ifndef|endif|pragma)", line_start=True
+        ),
+        _CONTROL,
+        ScanRule(("->",)),
+        ScanRule(("//",)),
+    ),
+    block_comments=True,
+)
+
+JAVA = Language(
+    "java",
+    "java",
+    (
+        ScanRule(("System.",), tail=r"(?:out|err)\.print"),
+        ScanRule(("public",), tail=r"\s+static\s+void\s+main\s*\(", word_start=True),
+        ScanRule(("import",), tail=r"\s+(?:static\s+)?java\w*\.", line_start=True),
+        ScanRule(("package",), tail=r"\s+[\w.]+\s*;", line_start=True),
+        ScanRule(("@Override",), word_end=True),
+        ScanRule(
+            ("class",),
+            tail=r"\s+\w+(?:<[^>\n]*>)?\s+(?:extends|implements)\b",
+            word_start=True,
+        ),
+    ),
+    (
+        ScanRule(("class", "interface", "enum"), tail=r"\s+\w+", word_start=True),
+        ScanRule(
+            ("public", "private", "protected", "static", "final", "void", "boolean"),
+            word_start=True,
+            word_end=True,
+        ),
+        ScanRule(("String", "Integer", "List", "Map"), word_start=True, word_end=True),
+        _CONTROL,
+        ScanRule(("//",)),
+    ),
+    block_comments=True,
+)
+
+CSHARP = Language(
+    "csharp",
+    "csharp",
+    (
+        ScanRule(("using",), tail=r"\s+System\b", line_start=True),
+        ScanRule(("Console.",), tail=r"(?:Write|Read)"),
+        ScanRule(("namespace",), tail=r"\s+\w+(?:\.\w+)+", word_start=True),
+        ScanRule(("get;", "set;"), word_start=True),
+        ScanRule(
+            ("static",), tail=r"\s+(?:async\s+)?\w+\s+Main\s*\(", word_start=True
+        ),
+        ScanRule(("async",), tail=r"\s+Task\b", word_start=True),
+    ),
+    (
+        ScanRule(
+            ("class", "interface", "struct", "enum"), tail=r"\s+\w+", word_start=True
+        ),
+        ScanRule(
+            ("public", "private", "protected", "internal", "static", "override"),
+            word_start=True,
+            word_end=True,
+        ),
+        ScanRule(("var", "void", "bool", "foreach"), word_start=True, word_end=True),
+        _CONTROL,
+        ScanRule(("//",)),
+    ),
+    block_comments=True,
+)
+
+SHELL = Language(
+    "shell",
+    "bash",
+    (
+        ScanRule(
+            ("#!",),
+            tail=r"[^\S\n]*/(?:usr/)?bin/(?:env[^\S\n]+)?(?:ba|z|k|da)?sh\b",
+            line_start=True,
+        ),
+        ScanRule((";",), tail=r"[^\S\n]*(?:then|do)[^\S\n]*(?:\n|$)"),
+        ScanRule(("$(", "${", "2>&1")),
+    ),
+    (
+        ScanRule(
+            ("fi", "done", "esac"),
+            tail=r"[^\S\n]*(?:[\n;|&<>#)]|$)",
+            word_end=True,
+            line_start=True,
+        ),
+        ScanRule(("$",), tail=r"[A-Za-z_]"),
+        ScanRule(
+            ("|",),
+            tail=r"[^\S\n]*(?:grep|sed|awk|xargs|sort|uniq|head|tail|wc|cut|tr)\b",
+        ),
+        ScanRule(
+            ("echo", "export", "local", "elif"), word_end=True, line_start=True
+        ),
+        ScanRule(("/dev/null",)),
+    ),
+)
+
+# Registered languages, in the order that breaks ties
+LANGUAGES: Dict[str, Language] = {
+    language.name: language for language in (CPP, C, JAVA, CSHARP, SHELL)
+}
+
+
+@lru_cache(maxsize=None)
+def lexer_class(language: str) -> type:
+    """Return the Pygments lexer class of a registered language.
+
+    Lexer modules are imported on first use, and only for languages that
+    occur.
+    """
+    return find_lexer_class_by_name(LANGUAGES[language].lexer)
+
+
+class LanguageClassifier:
+    """Scores several languages in one linear-time scan of a cell."""
+
+    def __init__(self, languages: Sequence[str] = None):
+        """Compile the rules of ``languages`` (default: all registered).
+
+        Raises:
+            ValueError: A language is not registered
+        """
+        names = list(LANGUAGES) if languages is None else list(languages)
+        unknown = [name for name in names if name not in LANGUAGES]
+        if unknown:
+            raise ValueError(f"Unknown language: {', '.join(unknown)}")
+        # In registry order, so ties break the same way for any selection
+        self.languages = [LANGUAGES[name] for name in LANGUAGES if name in names]
+        self.names = tuple(language.name for language in self.languages)
+
+        rules: List[ScanRule] = []
+        # (language index, high confidence) per rule of the scanner
+        self._rule_owners: List[Tuple[int, bool]] = []
+        for index, language in enumerate(self.languages):
+            for high, group in ((True, language.high), (False, language.medium)):
+                rules += group
+                self._rule_owners += [(index, high)] * len(group)
+        self._scanner = ScanDetector(rules, [])
+        self._block_comments = any(lang.block_comments for lang in self.languages)
+
+    def scores(self, text: str) -> Dict[str, Tuple[int, int]]:
+        """Count high- and medium-confidence matches per language.
+
+        Returns:
+            ``(high, medium)`` counts by language name
+        """
+        counts = [[0, 0] for _ in self.languages]
+        owners = self._rule_owners
+        for rule_index in self._scanner.iter_rule_matches(text):
+            index, high = owners[rule_index]
+            counts[index][0 if high else 1] += 1
+        if self._block_comments:
+            comments = _count_block_comments(text)
+            for language, count in zip(self.languages, counts):
+                if language.block_comments:
+                    count[1] += comments
+        return {
+            language.name: (high, medium)
+            for language, (high, medium) in zip(self.languages, counts)
+        }
+
+    def classify(self, text: str) -> Optional[str]:
+        """Return the name of the language of ``text``, or None if not code."""
+        if not text or not isinstance(text, str):
+            return None
+
+        stop_medium = 2 if len(text) > 100 else 3
+        scores = self.scores(text)
+        best = None
+        best_key = None
+        for language in self.languages:
+            high, medium = scores[language.name]
+            if high:
+                key = (1, high, medium)
+            elif language.medium_only and medium >= stop_medium:
+                key = (0, 0, medium)
+            else:
+                continue
+            if best_key is None or key > best_key:
+                best, best_key = language.name, key
+        return best
+
+
+@lru_cache(maxsize=None)
+def get_classifier(languages: Tuple[str, ...] = None) -> LanguageClassifier:
+    """Return the shared classifier of a selection of languages."""
+    return LanguageClassifier(languages)
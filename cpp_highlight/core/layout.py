@@ -0,0 +1,219 @@
+"""Row heights of code cells, including lines that wrap in their column.
+
+Cells are written with ``wrap_text``, so Excel breaks lines wider than the
+column, and a row sized for the newlines alone clips them.  Code fonts are
+monospace: every character advances by the same width, which the font's
+metrics fix as a fraction of the font size (``FONT_ADVANCES``), except
+that wide East Asian characters take two such cells and combining marks
+none (``char_widths``).  The width of a line is then its number of cells,
+and a column of known width holds a fixed number of them per line.
+
+``wrapped_line_counts`` measures all lines of a batch of cells in one
+vectorized pass with NumPy when it is installed (one pass in plain Python
+otherwise), and word-wraps only the lines that overflow their column.
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Sequence
+
+from openpyxl.utils import column_index_from_string
+
+from cpp_highlight.config import FontSettings
+
+# Advance width of one character in ems, from the fonts' horizontal metrics
+# (advance width / units per em)
+FONT_ADVANCES: Dict[str, float] = {
+    "consolas": 1126 / 2048,
+    "courier new": 1229 / 2048,
+    "cascadia code": 1200 / 2048,
+    "cascadia mono": 1200 / 2048,
+    "lucida console": 1234 / 2048,
+    "menlo": 1233 / 2048,
+    "dejavu sans mono": 1233 / 2048,
+    "source code pro": 600 / 1000,
+    "jetbrains mono": 600 / 1000,
+    "fira code": 600 / 1000,
+}
+# Assumed for fonts without metrics; most monospace fonts are close to it
+DEFAULT_ADVANCE = 0.6
+
+# Column widths are in widths of the default font's digits, which are 7
+# pixels in Excel's default Calibri 11 at 96 DPI
+MAX_DIGIT_WIDTH = 7
+# Excel's width of columns without a width of their own
+DEFAULT_COLUMN_WIDTH = 8.43
+POINTS_PER_PIXEL = 0.75
+
+# Excel rejects taller rows
+MAX_ROW_HEIGHT = 409.0
+
+# A run of non-blanks with the blanks after it; Excel wraps after blanks
+_WORD = re.compile(r"[^ ]* *")
+
+
+@lru_cache(maxsize=None)
+def char_widths() -> bytes:
+    """Return the width in character cells of every code point of the BMP.
+
+    Wide and fullwidth East Asian characters take two cells, combining
+    marks and format characters none, and other characters one.  Code
+    points above the BMP, mostly emoji and rare ideographs, take two.
+    """
+    table = bytearray(b"\x01" * 0x10000)
+    table[ord("\n")] = 0
+    for code in range(0x80, 0x10000):
+        ch = chr(code)
+        if unicodedata.east_asian_width(ch) in "WF":
+            table[code] = 2
+        elif unicodedata.category(ch) in ("Mn", "Me", "Cf"):
+            table[code] = 0
+    return bytes(table)
+
+
+def text_width(text: str) -> int:
+    """Return the width of a line of text in character cells."""
+    if text.isascii():
+        return len(text)
+    table = char_widths()
+    return sum(table[code] if code < 0x10000 else 2 for code in map(ord, text))
+
+
+def column_widths(ws) -> Dict[int, float]:
+    """Return the widths of the columns of a worksheet that have one.
+
+    Keyed by column index; other columns are ``default_column_width`` wide.
+    """
+    widths = {}
+    for dimension in ws.column_dimensions.values():
+        if not dimension.width:
+            continue
+        # Dimensions added since loading cover their own column only
+        first = dimension.min or column_index_from_string(dimension.index)
+        for index in range(first, (dimension.max or first) + 1):
+            widths[index] = dimension.width
+    return widths
+
+
+def default_column_width(ws) -> float:
+    """Return the width of the columns of a worksheet without their own."""
+    return ws.sheet_format.defaultColWidth or DEFAULT_COLUMN_WIDTH
+
+
+def chars_per_line(column_width: float, font: FontSettings = None) -> int:
+    """Return how many characters of ``font`` fit on a line of a column.
+
+    Args:
+        column_width: Width of the column as Excel stores it
+        font: Font of the code (default: FontSettings.default())
+    """
+    if font is None:
+        font = FontSettings.default()
+    text_points = int(column_width * MAX_DIGIT_WIDTH + 0.5) * POINTS_PER_PIXEL
+    advance = FONT_ADVANCES.get(font.name.lower(), DEFAULT_ADVANCE) * font.size
+    return max(1, int(text_points / advance))
+
+
+def _wrap_count(line: str, limit: int) -> int:
+    """Count the lines Excel wraps a line into, ``limit`` cells each.
+
+    Lines break after blanks; a word wider than a line is broken between
+    characters, and blanks at the end of a line hang past its edge.
+    """
+    lines = 1
+    used = 0
+    for word in _WORD.findall(line):
+        if not word:
+            continue
+        stripped = word.rstrip(" ")
+        width = text_width(stripped)
+        if used and used + width > limit:
+            lines += 1
+            used = 0
+        if width > limit:
+            extra = (width - 1) // limit
+            lines += extra
+            used = width - extra * limit
+        else:
+            used += width
+        used += len(word) - len(stripped)
+    return lines
+
+
+def wrapped_line_counts(texts: Sequence[str], limits: Sequence[int]) -> List[int]:
+    """Count the lines each text takes in a column ``limit`` characters wide.
+
+    Args:
+        texts: Cell texts, lines separated by ``\\n``
+        limits: Characters per line of each text's column (see
+            ``chars_per_line``)
+
+    Returns:
+        Number of displayed lines per text
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        counts = []
+        for text, limit in zip(texts, limits):
+            count = 0
+            for line in text.split("\n"):
+                if text_width(line) <= limit:
+                    count += 1
+                else:
+                    count += _wrap_count(line, limit)
+            counts.append(count)
+        return counts
+
+    if not texts:
+        return []
+    joined = "\n".join(texts)
+    if joined.isascii():
+        codes = np.frombuffer(joined.encode("ascii"), dtype=np.uint8)
+    else:
+        codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32)
+    breaks = np.flatnonzero(codes == ord("\n"))
+    starts = np.concatenate(([0], breaks + 1))
+    ends = np.concatenate((breaks, [len(codes)]))
+    if codes.dtype == np.uint8:
+        widths = ends - starts
+    else:
+        table = np.frombuffer(char_widths(), dtype=np.uint8)
+        cells = np.where(
+            codes < len(table), table[np.minimum(codes, len(table) - 1)], 2
+        )
+        # Newlines are zero wide, so the sums at line ends measure lines
+        offsets = np.concatenate(([0], np.cumsum(cells)))
+        widths = offsets[ends] - offsets[starts]
+
+    line_counts = np.fromiter(
+        (text.count("\n") + 1 for text in texts), dtype=np.intp, count=len(texts)
+    )
+    owners = np.repeat(np.arange(len(texts)), line_counts)
+    line_limits = np.asarray(limits)[owners]
+    counts = line_counts.tolist()
+    wide = np.flatnonzero(widths > line_limits)
+    for owner, start, end, limit in zip(
+        owners[wide].tolist(),
+        starts[wide].tolist(),
+        ends[wide].tolist(),
+        line_limits[wide].tolist(),
+    ):
+        counts[owner] += _wrap_count(joined[start:end], limit) - 1
+    return counts
+
+
+def estimate_heights(
+    texts: Sequence[str], limits: Sequence[int], font: FontSettings = None
+) -> List[float]:
+    """Return the row height each text needs, lines wrapped at ``limits``.
+
+    Heights are capped at Excel's maximum row height.
+    """
+    if font is None:
+        font = FontSettings.default()
+    return [
+        min(font.base_height + (count - 1) * font.line_height, MAX_ROW_HEIGHT)
+        for count in wrapped_line_counts(texts, limits)
+    ]
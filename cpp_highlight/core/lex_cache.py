@@ -0,0 +1,92 @@
+"""Persistent cache of lexed cells for incremental re-highlighting."""
+
+import pickle
+import sqlite3
+from typing import Optional
+
+import pygments
+
+from .incremental import LexEntry
+
+# Cells with fewer lines lex in well under a millisecond; caching them
+# would only grow the database
+MIN_CACHED_LINES = 20
+
+# Bumped when LexEntry changes shape
+_FORMAT = "1"
+
+
+class LexCache:
+    """Lexed cells kept in an SQLite file between runs.
+
+    Entries are stored by a key naming the cell (workbook, sheet and
+    coordinate) and hold the cell's last lexed text with its checkpoints,
+    so an edited cell is re-lexed from its first changed line only.  The
+    cache is emptied when it was written with another Pygments version or
+    lexer, whose tokens could differ.  Writes are committed on ``close``.
+    """
+
+    def __init__(self, path: str, lexer_name: str = "CppLexer"):
+        """Open or create the cache file.
+
+        Args:
+            path: SQLite database file
+            lexer_name: Name of the lexer class the entries are lexed with
+        """
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cells (key TEXT PRIMARY KEY, entry BLOB)"
+        )
+        version = f"{_FORMAT}/{pygments.__version__}/{lexer_name}"
+        row = self._db.execute(
+            "SELECT value FROM meta WHERE name = 'version'"
+        ).fetchone()
+        if row is None or row[0] != version:
+            self._db.execute("DELETE FROM cells")
+            self._db.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('version', ?)", (version,)
+            )
+            self._db.commit()
+
+    def __enter__(self) -> "LexCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def get(self, key: str) -> Optional[LexEntry]:
+        """Return the entry stored under ``key``, or None."""
+        row = self._db.execute(
+            "SELECT entry FROM cells WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            return pickle.loads(row[0])
+        except Exception:
+            return None
+
+    def put(self, key: str, entry: LexEntry) -> None:
+        """Store ``entry`` under ``key``, replacing what was there."""
+        data = pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)
+        self._db.execute("INSERT OR REPLACE INTO cells VALUES (?, ?)", (key, data))
+
+    def shrink(self) -> None:
+        """Commit pending writes and keep fewer database pages in memory."""
+        self._db.commit()
+        self._db.execute("PRAGMA cache_size = -256")
+        self._db.execute("PRAGMA shrink_memory")
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM cells").fetchone()[0]
+
+    def close(self) -> None:
+        """Commit pending writes and close the file."""
+        if self._db is not None:
+            self._db.commit()
+            self._db.close()
+            self._db = None
@@ -0,0 +1,347 @@
+"""Linear-time C++ detection backend built on an Aho-Corasick keyword scan.
+
+Every detection pattern starts with a literal anchor (a keyword or token such
+as ``std::`` or ``<<``).  A single Aho-Corasick pass finds all anchors, and
+only the short structural tail of a pattern (``\\s+\\w+`` after ``class``,
+``\\s*[<"]`` after ``#include``, ...) is checked with an anchored regex.  Block
+comments are counted with ``str.find``.  No step can rescan text it has
+already passed, so adversarial cells cannot trigger regex backtracking.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+class AhoCorasick:
+    """Aho-Corasick automaton reporting every (overlapping) keyword match.
+
+    Transitions are resolved through the failure links once and then cached,
+    so scanning costs one dict lookup per character.
+    """
+
+    def __init__(self, words: Sequence[str]):
+        """Build the trie, failure links and output sets for ``words``."""
+        self.words = list(words)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._out: List[Tuple[int, ...]] = [()]
+
+        for index, word in enumerate(self.words):
+            if not word:
+                raise ValueError("Aho-Corasick keywords must be non-empty")
+            state = 0
+            for ch in word:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._out.append(())
+                state = nxt
+            self._out[state] += (index,)
+
+        self._fail = [0] * len(self._goto)
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+        self._delta: List[Dict[str, int]] = [dict(edges) for edges in self._goto]
+
+    def _step(self, state: int, ch: str) -> int:
+        """Resolve and cache the transition for ``ch`` out of ``state``."""
+        origin = state
+        while state and ch not in self._goto[state]:
+            state = self._fail[state]
+        target = self._goto[state].get(ch, 0)
+        self._delta[origin][ch] = target
+        return target
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yield ``(start, word_index)`` for every match, ordered by end."""
+        delta = self._delta
+        out = self._out
+        lengths = [len(word) for word in self.words]
+        state = 0
+        for pos, ch in enumerate(text):
+            nxt = delta[state].get(ch)
+            state = self._step(state, ch) if nxt is None else nxt
+            if out[state]:
+                end = pos + 1
+                for index in out[state]:
+                    yield end - lengths[index], index
+
+
+def _is_word(ch: str) -> bool:
+    """Match the semantics of ``\\w`` for a single character."""
+    return ch.isalnum() or ch == "_"
+
+
+@dataclass(frozen=True)
+class ScanRule:
+    """One detection pattern split into a literal anchor and a checked tail.
+
+    Attributes:
+        keywords: Literal anchors; a match must start with one of them
+        tail: Regex that must match right after the anchor, if any
+        word_start: Require a word boundary before the anchor
+        word_end: Require a word boundary after the anchor
+        line_start: Require only non-newline whitespace before the anchor
+            on its line (the ReDoS-safe form of ``^\\s*``)
+    """
+
+    keywords: Tuple[str, ...]
+    tail: Optional[str] = None
+    word_start: bool = False
+    word_end: bool = False
+    line_start: bool = False
+
+
+# Scan rules mirroring C_DETECTORS_HIGH, one per pattern and in the same order
+SCAN_RULES_HIGH: List[ScanRule] = [
+    ScanRule(("#include",), tail=r'\s*[<"]'),
+    ScanRule(("using",), tail=r"\s+namespace\s+\w+"),
+    ScanRule(("int",), tail=r"\s+main\s*\("),
+    ScanRule(("std::",)),
+    ScanRule(("::",), tail=r"\s*\w+\s*\("),
+    ScanRule(("template",), tail=r"\s*<"),
+]
+
+# Scan rules mirroring C_DETECTORS_MEDIUM except the block comment pattern,
+# which is counted separately by _count_block_comments
+SCAN_RULES_MEDIUM: List[ScanRule] = [
+    ScanRule(("class", "struct", "enum"), tail=r"\s+\w+", word_start=True),
+    ScanRule(
+        (
+            "int",
+            "char",
+            "float",
+            "double",
+            "void",
+            "bool",
+            "auto",
+            "const",
+            "constexpr",
+            "mutable",
+        ),
+        word_start=True,
+        word_end=True,
+    ),
+    ScanRule(("public", "private", "protected"), tail=":", line_start=True),
+    ScanRule(
+        ("#",), tail=r"\s*(?:define|ifdef|ifndef|endif|pragma)", line_start=True
+    ),
+    ScanRule(
+        (
+            "for",
+            "while",
+            "if",
+            "else",
+            "switch",
+            "case",
+            "break",
+            "continue",
+            "return",
+        ),
+        word_start=True,
+        word_end=True,
+    ),
+    ScanRule(
+        ("cout", "cin", "endl", "printf", "scanf"), word_start=True, word_end=True
+    ),
+    ScanRule(("<<", ">>")),
+    ScanRule(
+        ("string", "vector", "map", "set", "array"), word_start=True, word_end=True
+    ),
+    ScanRule(("//",)),
+]
+
+
+def iter_block_comments(text: str) -> Iterator[int]:
+    """Yield start offsets of ``/* ... */`` blocks like ``re.finditer``.
+
+    Matches ``re.finditer(r"/\\*.*?\\*/", text)``.  ``is_cpp_code`` never
+    applies DOTALL to this pattern (its raw string does not contain ``/*``), so
+    a block only counts when it closes on the line it opens.  When the closing
+    ``*/`` lies beyond the next newline, every opener before that newline fails
+    too, so scanning resumes after it.  The closing position is reused until
+    the scan passes it, so no text is searched twice.
+    """
+    end = -1
+    pos = text.find("/*")
+    while pos != -1:
+        if end < pos + 2:
+            end = text.find("*/", pos + 2)
+            if end == -1:
+                return
+        newline = text.find("\n", pos + 2, end)
+        if newline != -1:
+            pos = text.find("/*", newline + 1)
+            continue
+        yield pos
+        pos = text.find("/*", end + 2)
+
+
+def _count_block_comments(text: str, limit: Optional[int] = None) -> int:
+    """Count block comments, stopping once ``limit`` is reached."""
+    count = 0
+    for _ in iter_block_comments(text):
+        count += 1
+        if limit is not None and count >= limit:
+            break
+    return count
+
+
+class ScanDetector:
+    """C++ detector whose running time is linear in the length of the text.
+
+    Counts the same matches as ``is_cpp_code`` with the default patterns, so
+    both make identical decisions.
+    """
+
+    def __init__(
+        self,
+        high_rules: Sequence[ScanRule] = None,
+        medium_rules: Sequence[ScanRule] = None,
+    ):
+        """Compile the rules into one automaton plus per-rule tail regexes."""
+        high_rules = list(SCAN_RULES_HIGH if high_rules is None else high_rules)
+        medium_rules = list(
+            SCAN_RULES_MEDIUM if medium_rules is None else medium_rules
+        )
+        self._rules = high_rules + medium_rules
+        self._num_high = len(high_rules)
+        self._tails = [
+            re.compile(rule.tail) if rule.tail else None for rule in self._rules
+        ]
+
+        words: List[str] = []
+        self._owners: List[Tuple[int, ...]] = []
+        for rule_index, rule in enumerate(self._rules):
+            self._check_rule(rule)
+            for keyword in rule.keywords:
+                if keyword in words:
+                    index = words.index(keyword)
+                    self._owners[index] += (rule_index,)
+                else:
+                    words.append(keyword)
+                    self._owners.append((rule_index,))
+        self._automaton = AhoCorasick(words)
+
+    @staticmethod
+    def _check_rule(rule: ScanRule) -> None:
+        """Reject rules whose matches could be reported out of start order.
+
+        Matches are accepted in the order the automaton reports them (by end
+        position).  That equals start order, which non-overlapping findall
+        semantics need, as long as no keyword of a rule contains another.
+        """
+        for keyword in rule.keywords:
+            for other in rule.keywords:
+                if other != keyword and other in keyword[1:]:
+                    raise ValueError(
+                        f"Scan rule keyword {keyword!r} contains {other!r}"
+                    )
+
+    def _match_end(self, text: str, rule_index: int, start: int, keyword: str):
+        """Return ``(match_start, match_end)`` for an anchor hit, or None."""
+        rule = self._rules[rule_index]
+        end = start + len(keyword)
+
+        if rule.word_start and start > 0 and _is_word(text[start - 1]):
+            return None
+        if rule.word_end and end < len(text) and _is_word(text[end]):
+            return None
+
+        match_start = start
+        if rule.line_start:
+            while match_start > 0:
+                ch = text[match_start - 1]
+                if ch == "\n":
+                    break
+                if not ch.isspace():
+                    return None
+                match_start -= 1
+
+        tail = self._tails[rule_index]
+        if tail is not None:
+            m = tail.match(text, end)
+            if m is None:
+                return None
+            end = m.end()
+
+        return match_start, end
+
+    def count(self, text: str, stop_at: Tuple[int, int] = None) -> Tuple[int, int]:
+        """Count high- and medium-confidence matches in ``text``.
+
+        Args:
+            text: Text to scan
+            stop_at: Optional ``(high, medium)`` thresholds; scanning stops
+                early once either count reaches its threshold
+
+        Returns:
+            Tuple of (high_confidence, medium_confidence) match counts
+        """
+        stop_high, stop_medium = stop_at or (None, None)
+
+        medium = _count_block_comments(text, stop_medium)
+        high = 0
+        if stop_medium is not None and medium >= stop_medium:
+            return high, medium
+
+        for rule_index in self.iter_rule_matches(text):
+            if rule_index < self._num_high:
+                high += 1
+                if stop_high is not None and high >= stop_high:
+                    return high, medium
+            else:
+                medium += 1
+                if stop_medium is not None and medium >= stop_medium:
+                    return high, medium
+
+        return high, medium
+
+    def iter_rule_matches(self, text: str) -> Iterator[int]:
+        """Yield the index of the rule of every match, in scan order.
+
+        Rules are numbered high-confidence ones first.  Matches of one rule
+        do not overlap, like those of ``re.findall``; block comments are
+        not included.
+        """
+        words = self._automaton.words
+        last_end = [0] * len(self._rules)
+        for start, word_index in self._automaton.iter_matches(text):
+            keyword = words[word_index]
+            for rule_index in self._owners[word_index]:
+                span = self._match_end(text, rule_index, start, keyword)
+                if span is None or span[0] < last_end[rule_index]:
+                    continue
+                last_end[rule_index] = span[1]
+                yield rule_index
+
+    def is_cpp_code(self, text: str) -> bool:
+        """Detect if text contains C++ code."""
+        if not text or not isinstance(text, str):
+            return False
+
+        stop_medium = 2 if len(text) > 100 else 3
+        high, medium = self.count(text, stop_at=(1, stop_medium))
+        return high >= 1 or medium >= stop_medium
+
+
+_default_detector: Optional[ScanDetector] = None
+
+
+def get_scan_detector() -> ScanDetector:
+    """Return the shared detector built from the default rules."""
+    global _default_detector
+    if _default_detector is None:
+        _default_detector = ScanDetector()
+    return _default_detector
@@ -0,0 +1,21 @@
+"""Exceptions raised when a workbook cannot be processed."""
+
+
+class ProcessingError(Exception):
+    """A workbook could not be processed.
+
+    Attributes:
+        path: Path of the workbook concerned
+    """
+
+    def __init__(self, message: str, path: str):
+        super().__init__(message)
+        self.path = path
+
+
+class WorkbookLoadError(ProcessingError):
+    """The input workbook could not be read."""
+
+
+class WorkbookSaveError(ProcessingError):
+    """The output workbook could not be written."""
@@ -0,0 +1,338 @@
+"""Build a highlighted workbook from a tree of C/C++ source files.
+
+Files are known to be code, so detection is skipped: each file, or each
+function of it, becomes one highlighted cell.  The workbook is written in
+openpyxl's write-only mode a batch of files at a time, so memory stays
+bounded however large the tree is.
+"""
+
+import os
+import re
+from pathlib import Path
+from typing import Iterator, List, Sequence, Tuple
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.styles import Alignment, Font
+
+from cpp_highlight.config import BudgetSettings
+from cpp_highlight.core import CellHighlighter
+from cpp_highlight.core.layout import chars_per_line, estimate_heights
+from cpp_highlight.models import RunStats
+from cpp_highlight.parallel import HighlightPool
+from cpp_highlight.processor import _save_output
+from cpp_highlight.writer import SharedStrings, use_fast_writer
+
+SOURCE_SUFFIXES = (".c", ".cc", ".cpp", ".cxx", ".h", ".hh", ".hpp", ".hxx", ".inl")
+
+# Most characters an Excel cell can hold
+EXCEL_CELL_LIMIT = 32767
+
+HEADER = ("File", "Line", "Code")
+# Width of the code column, in characters
+CODE_COLUMN_WIDTH = 100
+
+# Opening braces that do not start a function or class body
+_TRANSPARENT_BLOCK = re.compile(r'\b(?:namespace|extern\s*"C(?:\+\+)?")[^;{}()]*$')
+# Opening of a raw string literal after its R prefix
+_RAW_STRING = re.compile(r'"([^ ()\\\t\n]{0,16})\(')
+
+
+def iter_sources(
+    root: str, suffixes: Sequence[str] = SOURCE_SUFFIXES
+) -> Iterator[Path]:
+    """Yield the source files under ``root``, in a stable order.
+
+    Hidden directories (``.git`` and the like) are not entered.
+    """
+    suffixes = tuple(suffix.lower() for suffix in suffixes)
+    for directory, subdirs, files in os.walk(root):
+        subdirs[:] = sorted(d for d in subdirs if not d.startswith("."))
+        for name in sorted(files):
+            if name.lower().endswith(suffixes):
+                yield Path(directory) / name
+
+
+def split_functions(text: str) -> List[Tuple[int, str]]:
+    """Split source code into functions and the code between them.
+
+    A function ends with the line of the ``}`` closing its body at the top
+    level (namespace and ``extern "C"`` blocks do not count as levels) and
+    starts after the statement, block or preprocessor line before it, so
+    its leading comments stay with it.  Everything else, such as includes
+    and declarations, is kept in the pieces between functions.  Braces in
+    comments, strings and character literals are ignored.
+
+    Returns:
+        List of (1-based first line, code) per non-blank piece
+    """
+    cuts = [0]
+    stack = []  # True for a transparent block, False for a body
+    stmt_start = 0
+    function = False
+    n = len(text)
+    i = 0
+    at_line_start = True
+    while i < n:
+        ch = text[i]
+        if at_line_start and ch not in " \t":
+            at_line_start = False
+            if ch == "#":
+                i = stmt_start = _line_end(text, i, continued=True)
+                at_line_start = True
+                continue
+        if ch == "\n":
+            at_line_start = True
+        elif ch == "/" and text.startswith("//", i):
+            i = _line_end(text, i, continued=True)
+            at_line_start = True
+            continue
+        elif ch == "/" and text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            continue
+        elif ch == '"':
+            i = _string_end(text, i)
+            continue
+        elif ch == "'" and not (i and text[i - 1].isdigit()):
+            i = _quoted_end(text, i, "'")
+            continue
+        elif ch == ";":
+            stmt_start = i + 1
+        elif ch == "{":
+            at_top = all(stack)
+            transparent = at_top and bool(
+                _TRANSPARENT_BLOCK.search(text, stmt_start, i)
+            )
+            if at_top and not transparent:
+                head = text[stmt_start:i]
+                function = "(" in head
+                if function:
+                    start = _piece_start(text, stmt_start)
+                    if start > cuts[-1]:
+                        cuts.append(start)
+            stack.append(transparent)
+            stmt_start = i + 1
+        elif ch == "}":
+            transparent = stack.pop() if stack else True
+            if not transparent and all(stack) and function:
+                function = False
+                cuts.append(_line_end(text, i))
+            stmt_start = i + 1
+        i += 1
+    cuts.append(n)
+
+    pieces = []
+    for start, end in zip(cuts, cuts[1:]):
+        piece = text[start:end]
+        if not piece.strip():
+            continue
+        leading = len(piece) - len(piece.lstrip("\n"))
+        line = text.count("\n", 0, start) + leading + 1
+        pieces.append((line, piece.strip("\n")))
+    return pieces
+
+
+def _line_end(text: str, i: int, continued: bool = False) -> int:
+    """Return the index after the end of the line at ``i``.
+
+    With ``continued``, lines ending in a backslash continue the line.
+    """
+    while True:
+        end = text.find("\n", i)
+        if end < 0:
+            return len(text)
+        if not (continued and text[end - 1] == "\\"):
+            return end + 1
+        i = end + 1
+
+
+def _string_end(text: str, i: int) -> int:
+    """Return the index after the string literal opening at ``i``."""
+    raw = _RAW_STRING.match(text, i) if i and text[i - 1] == "R" else None
+    if raw:
+        end = text.find(f"){raw.group(1)}\"", i)
+        return len(text) if end < 0 else end + len(raw.group(1)) + 2
+    return _quoted_end(text, i, '"')
+
+
+def _quoted_end(text: str, i: int, quote: str) -> int:
+    """Return the index after a quoted literal, or its line end if unclosed."""
+    i += 1
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if ch == quote:
+            return i + 1
+        if ch == "\n":
+            return i
+        i += 1
+    return n
+
+
+def _piece_start(text: str, stmt_start: int) -> int:
+    """Return where a function whose head starts at ``stmt_start`` begins.
+
+    That is the start of its first non-blank line, unless the line of
+    ``stmt_start`` has code before it; a comment trailing the previous
+    statement stays with that statement.
+    """
+    line_end = _line_end(text, stmt_start)
+    rest = text[stmt_start:line_end].lstrip()
+    if rest and not rest.startswith("//"):
+        return stmt_start
+    first = len(text) - len(text[line_end:].lstrip())
+    return max(text.rfind("\n", 0, first) + 1, line_end)
+
+
+def _limit_cell(line: int, code: str) -> List[Tuple[int, str]]:
+    """Split code that does not fit in one Excel cell at line boundaries."""
+    if len(code) <= EXCEL_CELL_LIMIT:
+        return [(line, code)]
+    pieces = []
+    lines = []
+    size = 0
+    for text in code.split("\n"):
+        text = text[:EXCEL_CELL_LIMIT]
+        if lines and size + len(text) > EXCEL_CELL_LIMIT:
+            pieces.append((line, "\n".join(lines)))
+            line += len(lines)
+            lines, size = [], 0
+        lines.append(text)
+        size += len(text) + 1
+    pieces.append((line, "\n".join(lines)))
+    return pieces
+
+
+def _read_cells(root: str, path: Path, per_function: bool):
+    """Return the (file, first line, code) cells of one source file."""
+    with open(path, encoding="utf-8", errors="replace", newline="") as f:
+        text = f.read()
+    text = ILLEGAL_CHARACTERS_RE.sub("", text.replace("\r\n", "\n"))
+    name = path.relative_to(root).as_posix()
+    pieces = split_functions(text) if per_function else [(1, text.strip("\n"))]
+    return [
+        (name, line, piece)
+        for start, code in pieces
+        if code.strip()
+        for line, piece in _limit_cell(start, code)
+    ]
+
+
+def ingest_sources(
+    root: str,
+    output_path: str,
+    per_function: bool = False,
+    suffixes: Sequence[str] = SOURCE_SUFFIXES,
+    jobs: int = 1,
+    budget: BudgetSettings = None,
+    stats: RunStats = None,
+    compression: str = "default",
+    batch_files: int = 256,
+    verbose: bool = False,
+    shared_strings: bool = False,
+) -> int:
+    """Write the source files under ``root`` to a highlighted workbook.
+
+    Each row holds a file's path relative to ``root``, the line its code
+    starts on and the highlighted code.  Code longer than an Excel cell
+    holds continues in the next row.
+
+    Args:
+        root: Directory to walk
+        output_path: Path of the workbook to write
+        per_function: One cell per function instead of per file
+        suffixes: File name suffixes of the files to include
+        jobs: Number of worker processes used for highlighting
+        budget: Per-cell size and time budget (default: no limit)
+        stats: Run statistics to fill in
+        compression: Zip compression of the output, one of
+            cpp_highlight.writer.COMPRESSION_MODES
+        batch_files: Files read and lexed at a time
+        verbose: Print each file as it is written
+        shared_strings: Write each distinct highlighted value once, as for
+            ``process_excel``
+
+    Returns:
+        Number of cells highlighted
+
+    Raises:
+        WorkbookSaveError: The output could not be written
+    """
+    if stats is None:
+        stats = RunStats()
+    highlighter = CellHighlighter(budget=budget, stats=stats)
+    pool = HighlightPool(highlighter, jobs, stats=stats) if jobs > 1 else None
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Sources")
+    ws.column_dimensions["A"].width = 40
+    ws.column_dimensions["C"].width = CODE_COLUMN_WIDTH
+    alignment = Alignment(wrap_text=True, vertical="top")
+    limit = chars_per_line(CODE_COLUMN_WIDTH, highlighter.font)
+    bold = Font(bold=True)
+
+    highlighted_count = 0
+    row = 1
+    paths = list(iter_sources(root, suffixes))
+    strings = SharedStrings() if shared_strings else None
+    try:
+        # Rows are serialized as they are appended, not when saving
+        use_fast_writer(ws, strings)
+        ws.append([_styled(ws, title, font=bold) for title in HEADER])
+        for start in range(0, len(paths), batch_files):
+            cells = []
+            for path in paths[start : start + batch_files]:
+                if verbose:
+                    print(f"  {path}")
+                cells += _read_cells(root, path, per_function)
+            stats.cells_scanned += len(cells)
+            items = [(f"{name}:{line}", code) for name, line, code in cells]
+            if pool is not None:
+                results = pool.highlight_runs(items)
+            else:
+                results = [highlighter.highlight_runs(c, loc) for loc, c in items]
+            # Lines wider than the code column wrap
+            heights = iter(
+                estimate_heights(
+                    [runs.text for runs, _ in results if runs is not None],
+                    [limit] * len(results),
+                    highlighter.font,
+                )
+            )
+            for (name, line, code), (runs, height) in zip(cells, results):
+                row += 1
+                value = code
+                if runs is not None:
+                    value = _styled(ws, highlighter.defer(runs), alignment)
+                    highlighted_count += 1
+                if height is None:
+                    ws.append([name, line, value])
+                    continue
+                ws.row_dimensions[row].height = next(heights)
+                ws.append([name, line, value])
+                # Written with the row, so no need to keep it
+                del ws.row_dimensions[row]
+    finally:
+        if pool is not None:
+            pool.close()
+
+    _save_output(wb, output_path, compression, None, stats, strings)
+    stats.cells_detected += highlighted_count
+    stats.cells_highlighted += highlighted_count
+    stats.files_processed += 1
+    return highlighted_count
+
+
+def _styled(ws, value, alignment: Alignment = None, font: Font = None):
+    """Return a write-only cell holding ``value``."""
+    cell = WriteOnlyCell(ws, value=value)
+    if alignment is not None:
+        cell.alignment = alignment
+    if font is not None:
+        cell.font = font
+    return cell
@@ -0,0 +1,73 @@
+"""Journal of finished workbooks, so interrupted batch runs can resume."""
+
+import os
+import sqlite3
+import time
+
+# Used by --resume when no --journal is given
+DEFAULT_JOURNAL = ".cpp_highlight_journal.db"
+
+
+class Journal:
+    """Records finished workbooks in an SQLite file.
+
+    A row holds the input's absolute path, the SHA-256 of the content that
+    was processed and the output it was written to.  Each row is committed
+    as soon as its output is saved, so a killed run loses at most the
+    workbook it was working on.
+    """
+
+    def __init__(self, path: str):
+        """Open or create the journal file."""
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS finished ("
+            "input TEXT PRIMARY KEY, sha256 TEXT, output TEXT, cells INTEGER, "
+            "finished_at REAL)"
+        )
+        self._db.commit()
+
+    def __enter__(self) -> "Journal":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def is_finished(self, input_path: str, digest: str, output_path: str) -> bool:
+        """Whether this content of ``input_path`` was already written to
+        ``output_path``, and the output is still there."""
+        row = self._db.execute(
+            "SELECT sha256, output FROM finished WHERE input = ?",
+            (os.path.abspath(input_path),),
+        ).fetchone()
+        return (
+            row is not None
+            and row[0] == digest
+            and row[1] == os.path.abspath(output_path)
+            and os.path.exists(output_path)
+        )
+
+    def record(
+        self, input_path: str, digest: str, output_path: str, cells: int
+    ) -> None:
+        """Record a finished workbook and commit."""
+        self._db.execute(
+            "INSERT OR REPLACE INTO finished VALUES (?, ?, ?, ?, ?)",
+            (
+                os.path.abspath(input_path),
+                digest,
+                os.path.abspath(output_path),
+                cells,
+                time.time(),
+            ),
+        )
+        self._db.commit()
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM finished").fetchone()[0]
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
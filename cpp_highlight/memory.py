@@ -0,0 +1,247 @@
+"""Memory budget of a processing run, and per-phase memory reports."""
+
+import os
+import re
+import sys
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from cpp_highlight.models import RunStats
+
+_SIZE = re.compile(r"(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?", re.IGNORECASE)
+_UNITS = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+
+
+def parse_size(value: str) -> int:
+    """Parse a size such as ``512M``, ``1.5GB`` or ``1048576`` into bytes.
+
+    Raises:
+        ValueError: The value is not a size
+    """
+    match = _SIZE.fullmatch(value.strip())
+    if match is None:
+        raise ValueError(f"Not a size: {value}")
+    number, unit = match.groups()
+    return int(float(number) * _UNITS[unit.lower()])
+
+
+def current_rss() -> Optional[int]:
+    """Return the resident set size of this process in bytes, if known.
+
+    Read from ``/proc`` on Linux; elsewhere psutil is used when installed.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+class MemoryBudget:
+    """Tracks a run's memory against a limit.
+
+    The run's memory is its resident set size or, where that cannot be
+    read, the estimated size of the highlighted cell values not yet saved.
+    From ``PRESSURE`` of the limit on, the processor trades speed for
+    memory: smaller batches, a smaller lex cache and worksheets moved to
+    disk as soon as they are finished.
+
+    Attributes:
+        limit: Limit in bytes
+        pending: Estimated bytes held by highlighted cells not yet saved
+        peak: Most memory seen
+        relieved: Times memory was relieved
+    """
+
+    # Fraction of the limit from which memory is saved
+    PRESSURE = 0.8
+    # Growth, as a fraction of the limit, before memory is relieved again
+    STEP = 0.02
+
+    def __init__(self, limit: int, stats: RunStats = None):
+        if limit <= 0:
+            raise ValueError(f"Memory limit must be positive: {limit}")
+        self.limit = limit
+        self.stats = stats if stats is not None else RunStats()
+        self.pending = 0
+        self.peak = 0
+        self.relieved = 0
+        # Memory when it was last relieved; relieving again only helps
+        # once memory has grown well past it
+        self._relieved_at = 0
+
+    def used(self) -> int:
+        """Return the memory in use now, recording the peak."""
+        rss = current_rss()
+        used = self.pending if rss is None else rss
+        self.peak = max(self.peak, used)
+        return used
+
+    def needs_relief(self) -> bool:
+        """Whether memory is near the limit and has grown since last relieved."""
+        used = self.used()
+        if used < self.PRESSURE * self.limit:
+            return False
+        if used <= self._relieved_at + self.limit * self.STEP:
+            return False
+        self._relieved_at = used
+        self.relieved += 1
+        self.stats.memory_relieved += 1
+        return True
+
+
+def format_size(size: float) -> str:
+    """Format a number of bytes as B, KiB, MiB or GiB."""
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+class MemoryReport:
+    """Python memory allocated by each phase of a run, traced with tracemalloc.
+
+    A snapshot is taken at the end of every phase and compared with the one
+    before, so each phase is charged with the memory it allocated and still
+    held at its end, by allocation site.  Detection and highlighting
+    alternate per worksheet; every sheet adds to the same two phases.  The
+    save phase's snapshot is taken once the worksheets are written, before
+    the rest of the archive (see ``checkpoint``).
+
+    Only allocations of this process are traced, not those of ``--jobs``
+    workers, and tracing slows the run down noticeably.  The first phase
+    starts tracing if needed; use the report as a context manager to stop
+    it again afterwards.
+
+    Attributes:
+        top: Allocation sites listed per phase
+        peak: Most traced memory during each phase, in bytes
+        growth: Traced memory at the end of each phase less that at its
+            start, in bytes
+        sites: Bytes still held at the end of each phase by allocation
+            site (``file:line``)
+        cells: Cells highlighted
+    """
+
+    PHASES = ("load", "detect", "highlight", "save")
+
+    # Memory of the tracing and this report, and of imports
+    _FILTERS = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+    def __init__(self, top: int = 10):
+        self.top = top
+        self.peak: Dict[str, int] = {}
+        self.growth: Dict[str, int] = {}
+        self.sites: Dict[str, Dict[str, int]] = {}
+        self.cells = 0
+        self._started = False
+        self._last: Optional[tracemalloc.Snapshot] = None
+        self._checkpoint: Optional[tracemalloc.Snapshot] = None
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(self._FILTERS)
+
+    def start(self) -> None:
+        """Start tracing allocations, unless tracemalloc already does."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+        if self._last is None:
+            self._last = self._snapshot()
+
+    def stop(self) -> None:
+        """Stop tracing if ``start`` started it."""
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+        self._last = None
+
+    def __enter__(self) -> "MemoryReport":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Charge the memory allocated inside this block to phase ``name``."""
+        self.start()
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        self._checkpoint = None
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            self.peak[name] = max(self.peak.get(name, 0), peak)
+            self.growth[name] = self.growth.get(name, 0) + current - before
+            snapshot = self._checkpoint or self._snapshot()
+            self._checkpoint = None
+            sites = self.sites.setdefault(name, {})
+            for diff in snapshot.compare_to(self._last, "lineno"):
+                if diff.size_diff:
+                    frame = diff.traceback[0]
+                    site = f"{frame.filename}:{frame.lineno}"
+                    sites[site] = sites.get(site, 0) + diff.size_diff
+            self._last = snapshot
+
+    def checkpoint(self) -> None:
+        """Take the current phase's snapshot now instead of at its end."""
+        if tracemalloc.is_tracing():
+            self._checkpoint = self._snapshot()
+
+    def bytes_per_cell(self) -> Optional[float]:
+        """Return the memory highlighting held per highlighted cell."""
+        if not self.cells:
+            return None
+        return self.growth.get("highlight", 0) / self.cells
+
+    def format(self) -> List[str]:
+        """Return the report as lines of text."""
+        lines = ["Memory report (tracemalloc, this process only):"]
+        lines.append(f"  {'Phase':<10} {'Peak':>11} {'Held':>11}")
+        for name in self.PHASES:
+            if name in self.peak:
+                lines.append(
+                    f"  {name:<10} {format_size(self.peak[name]):>11} "
+                    f"{format_size(self.growth[name]):>11}"
+                )
+        per_cell = self.bytes_per_cell()
+        if per_cell is not None:
+            lines.append(
+                f"  Per highlighted cell: {format_size(per_cell)} "
+                f"({self.cells} cells)"
+            )
+        for name in self.PHASES:
+            sites = sorted(
+                self.sites.get(name, {}).items(), key=lambda item: -item[1]
+            )
+            sites = [(site, size) for site, size in sites[: self.top] if size > 0]
+            if not sites:
+                continue
+            lines.append(f"  Top allocations held after {name}:")
+            for site, size in sites:
+                lines.append(f"    {format_size(size):>11}  {_short_path(site)}")
+        return lines
+
+
+def _short_path(site: str) -> str:
+    """Shorten a ``file:line`` site to its path below an import directory."""
+    for directory in sorted(filter(None, sys.path), key=len, reverse=True):
+        directory = os.path.join(os.path.abspath(directory), "")
+        if site.startswith(directory):
+            return site[len(directory) :]
+    return site
@@ -0,0 +1,198 @@
+"""Run metrics as Prometheus textfiles or JSON-lines events."""
+
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+from cpp_highlight.models import RunStats
+from cpp_highlight.models.stats import Histogram
+
+METRICS_FORMATS = ("prometheus", "jsonl")
+
+PREFIX = "cpp_highlight"
+
+# RunStats counters exported as <PREFIX>_<name>_total
+_COUNTERS = {
+    "files_processed": "Workbooks processed and saved",
+    "cells_scanned": "String cells checked for C++ code",
+    "cells_detected": "Cells detected as C++ code",
+    "cells_highlighted": "Cells that received rich text",
+    "cells_chunked": "Oversized cells lexed in line chunks",
+    "cells_plain": "Oversized cells colored plain",
+    "cells_timed_out": "Cells whose rest was colored plain after a timeout",
+    "cells_skipped": "Cells left unhighlighted by a budget or the watchdog",
+    "workers_restarted": "Worker pool restarts after a stuck worker",
+    "lines_relexed": "Lines lexed again in cells found in the lex cache",
+    "memory_relieved": "Times memory neared the memory limit",
+    "sheets_spooled": "Worksheets moved to disk before the save",
+    "strings_shared": "Highlighted cells written as shared string references",
+    "strings_unique": "Distinct highlighted values in the shared strings",
+    "worker_busy_seconds": "Time pool workers spent highlighting",
+    "worker_capacity_seconds": "Wall time of pooled highlighting times workers",
+}
+
+_HISTOGRAMS = {
+    "load_seconds": "Loading time per workbook",
+    "detect_seconds": "Detection time per worksheet",
+    "lex_seconds": "Highlighting time per cell",
+    "save_seconds": "Saving time per workbook",
+}
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Return the peak resident set size of this process or its workers.
+
+    Returns None where the ``resource`` module is unavailable (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _histogram_lines(name: str, help_text: str, histogram: Histogram) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    cumulative = 0
+    bounds = list(histogram.buckets) + [float("inf")]
+    for bound, count in zip(bounds, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{le="{_format_value(bound)}"}} {cumulative}')
+    lines.append(f"{name}_sum {_format_value(histogram.total)}")
+    lines.append(f"{name}_count {cumulative}")
+    return lines
+
+
+def format_prometheus(stats: RunStats) -> str:
+    """Render run statistics in the Prometheus text exposition format."""
+    lines = []
+    for field, help_text in _COUNTERS.items():
+        name = f"{PREFIX}_{field}_total"
+        lines += [
+            f"# HELP {name} {help_text}",
+            f"# TYPE {name} counter",
+            f"{name} {getattr(stats, field)}",
+        ]
+
+    for field, help_text in _HISTOGRAMS.items():
+        lines += _histogram_lines(
+            f"{PREFIX}_{field}", help_text, getattr(stats, field)
+        )
+
+    for kind, counts in (("hits", stats.cache_hits), ("misses", stats.cache_misses)):
+        name = f"{PREFIX}_cache_{kind}_total"
+        lines += [f"# HELP {name} Cache {kind} by cache", f"# TYPE {name} counter"]
+        lines += [
+            f'{name}{{cache="{cache}"}} {count}'
+            for cache, count in sorted(counts.items())
+        ]
+
+    if stats.cells_by_language:
+        name = f"{PREFIX}_cells_by_language_total"
+        lines += [f"# HELP {name} Code cells by language", f"# TYPE {name} counter"]
+        lines += [
+            f'{name}{{language="{language}"}} {count}'
+            for language, count in sorted(stats.cells_by_language.items())
+        ]
+
+    rss = peak_rss_bytes()
+    if rss is not None:
+        name = f"{PREFIX}_peak_rss_bytes"
+        lines += [
+            f"# HELP {name} Peak resident set size of the process or its workers",
+            f"# TYPE {name} gauge",
+            f"{name} {rss}",
+        ]
+
+    name = f"{PREFIX}_last_run_timestamp_seconds"
+    lines += [
+        f"# HELP {name} When the metrics were written",
+        f"# TYPE {name} gauge",
+        f"{name} {_format_value(time.time())}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(stats: RunStats, path: str) -> None:
+    """Write a textfile-collector file.
+
+    The file is written next to ``path`` and renamed into place, so the
+    collector never reads a partial file.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(format_prometheus(stats))
+    os.replace(tmp_path, path)
+
+
+def _histogram_dict(histogram: Histogram) -> Dict[str, object]:
+    return {
+        "count": histogram.count,
+        "sum": histogram.total,
+        "buckets": list(histogram.buckets),
+        "counts": list(histogram.counts),
+    }
+
+
+def metrics_event(stats: RunStats, event: str = "run", **extra) -> Dict[str, object]:
+    """Build one JSON-lines event from run statistics.
+
+    Args:
+        stats: Statistics of the run
+        event: Event name, e.g. "run" or "file"
+        **extra: Additional fields such as input and output paths
+    """
+    record = {"event": event, "time": time.time()}
+    record.update(extra)
+    for field in _COUNTERS:
+        record[field] = getattr(stats, field)
+    for field in _HISTOGRAMS:
+        record[field] = _histogram_dict(getattr(stats, field))
+    record["cache_hit_rate"] = {
+        cache: stats.cache_hit_rate(cache)
+        for cache in sorted(set(stats.cache_hits) | set(stats.cache_misses))
+    }
+    record["cells_by_language"] = dict(sorted(stats.cells_by_language.items()))
+    record["worker_utilization"] = stats.worker_utilization()
+    record["peak_rss_bytes"] = peak_rss_bytes()
+    return record
+
+
+def append_jsonl(stats: RunStats, path: str, event: str = "run", **extra) -> None:
+    """Append one event to a JSON-lines file."""
+    line = json.dumps(metrics_event(stats, event, **extra))
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+def write_metrics(
+    stats: RunStats, path: str, fmt: str = "prometheus", **extra
+) -> None:
+    """Write metrics in one of METRICS_FORMATS.
+
+    Args:
+        stats: Statistics of the run
+        path: Textfile to replace (prometheus) or event file to append to
+        fmt: "prometheus" or "jsonl"
+        **extra: Additional fields for JSON-lines events
+    """
+    if fmt == "prometheus":
+        write_prometheus(stats, path)
+    elif fmt == "jsonl":
+        append_jsonl(stats, path, **extra)
+    else:
+        raise ValueError(f"Unknown metrics format: {fmt}")
@@ -1,5 +1,7 @@
 """Models module for ExcelCppSyntaxHighlight."""
 
+from .runs import ColorRuns, LazyRichText
+from .stats import RunStats
 from .text_block import TextBlock
 
-__all__ = ["TextBlock"]
+__all__ = ["ColorRuns", "LazyRichText", "RunStats", "TextBlock"]
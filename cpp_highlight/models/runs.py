@@ -0,0 +1,222 @@
+"""Compact color runs of a highlighted cell."""
+
+import functools
+import sys
+from array import array
+from dataclasses import dataclass
+from typing import Iterator, List, Sequence, Tuple
+
+from openpyxl.cell.rich_text import CellRichText
+from openpyxl.cell.text import InlineFont
+
+from .text_block import TextBlock, _rpr_xml, run_xml
+
+# Palette indices are stored as unsigned bytes
+MAX_PALETTE_SIZE = 256
+
+
+@dataclass
+class ColorRuns:
+    """Highlighted text as palette indices and run lengths.
+
+    Run ``k`` covers ``lengths[k]`` characters of ``text`` after the runs
+    before it and is colored ``palette[colors[k]]``.  A cell costs its text
+    plus five bytes per run, instead of a TextBlock and font reference per
+    run.  The palette is the highlighter's tuple at the time, shared by all
+    cells it highlighted, so pickling a batch of cells stores it once.
+    """
+
+    __slots__ = ("text", "palette", "colors", "lengths")
+
+    text: str
+    palette: Tuple[str, ...]
+    colors: array
+    lengths: array
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the runs and their text."""
+        return (
+            sys.getsizeof(self.text)
+            + sys.getsizeof(self.colors)
+            + sys.getsizeof(self.lengths)
+        )
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        """Yield (color hex, text) per run."""
+        text, palette = self.text, self.palette
+        start = 0
+        for index, length in zip(self.colors, self.lengths):
+            end = start + length
+            yield palette[index], text[start:end]
+            start = end
+
+    def to_rich_text(self, fonts: Sequence[InlineFont]) -> CellRichText:
+        """Build the cell value.
+
+        Args:
+            fonts: Font per palette entry
+        """
+        text = self.text
+        blocks = []
+        start = 0
+        for index, length in zip(self.colors, self.lengths):
+            end = start + length
+            blocks.append(TextBlock(fonts[index], text[start:end]))
+            start = end
+        return CellRichText(blocks)
+
+    def to_xml(self, rprs: Sequence[str]) -> str:
+        """Serialize the runs as the ``<r>`` elements of an inline string.
+
+        Args:
+            rprs: Serialized ``<rPr>`` element per palette entry
+        """
+        text = self.text
+        parts = []
+        start = 0
+        for index, length in zip(self.colors, self.lengths):
+            end = start + length
+            parts.append(run_xml(rprs[index], text[start:end]))
+            start = end
+        return "".join(parts)
+
+
+class LazyRichText(CellRichText):
+    """Rich text cell value that is built from color runs when needed.
+
+    A cell holds only the runs and the shared fonts of their palette until
+    the workbook is saved; the fast writer serializes the runs straight to
+    markup and ``to_tree`` builds the rich text for openpyxl's own writer.
+    Using the value as a list in any way (iterating, indexing, comparing,
+    editing, copying) fills in the TextBlocks first, so it then behaves
+    like any CellRichText.
+    """
+
+    def __init__(self, runs: ColorRuns, fonts: List[InlineFont]):
+        """Wrap color runs.
+
+        Args:
+            runs: Runs of the cell
+            fonts: Font per entry of ``runs.palette``
+        """
+        super().__init__([])
+        self.runs = runs
+        self.fonts = fonts
+        # Whether the TextBlocks were filled in; from then on the list is
+        # the value and may have been edited
+        self.materialized = False
+
+    def materialize(self) -> "LazyRichText":
+        """Fill in the TextBlocks of the runs, once; returns self."""
+        if not self.materialized:
+            self.materialized = True
+            list.extend(self, self.runs.to_rich_text(self.fonts))
+        return self
+
+    def to_xml(self) -> str:
+        """Serialize the runs as the ``<r>`` elements of an inline string.
+
+        Only valid while the value is not materialized.
+        """
+        return self.runs.to_xml([_rpr_xml(font) for font in self.fonts])
+
+    def to_tree(self):
+        return CellRichText.to_tree(self.materialize())
+
+    def __str__(self) -> str:
+        if self.materialized:
+            return CellRichText.__str__(self)
+        return self.runs.text
+
+    def __repr__(self) -> str:
+        return CellRichText.__repr__(self.materialize())
+
+    def __len__(self) -> int:
+        if self.materialized:
+            return list.__len__(self)
+        return len(self.runs)
+
+    def __iter__(self):
+        return list.__iter__(self.materialize())
+
+    def __getitem__(self, index):
+        return list.__getitem__(self.materialize(), index)
+
+    def __eq__(self, other):
+        return list.__eq__(self.materialize(), other)
+
+    def __ne__(self, other):
+        return list.__ne__(self.materialize(), other)
+
+    __hash__ = None
+
+    def __setitem__(self, index, value):
+        CellRichText.__setitem__(self.materialize(), index, value)
+
+    def __iadd__(self, arg):
+        return CellRichText.__iadd__(self.materialize(), arg)
+
+    def append(self, arg):
+        CellRichText.append(self.materialize(), arg)
+
+    def extend(self, arg):
+        CellRichText.extend(self.materialize(), arg)
+
+    def __radd__(self, other):
+        if not isinstance(other, list):
+            return NotImplemented
+        return list.__add__(other, self.materialize())
+
+    def __reduce__(self):
+        # Copies and pickles carry the TextBlocks, not an empty list
+        return _materialized, (self.runs, self.fonts, list(self.materialize()))
+
+
+def _materialized(runs: ColorRuns, fonts: List[InlineFont], blocks: list):
+    """Rebuild a materialized LazyRichText from ``__reduce__``."""
+    value = LazyRichText(runs, fonts)
+    value.materialized = True
+    list.extend(value, blocks)
+    return value
+
+
+def _materializing(name: str):
+    """Return list method ``name`` of CellRichText, materializing first."""
+    method = getattr(CellRichText, name)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return method(self.materialize(), *args, **kwargs)
+
+    return wrapper
+
+
+# The remaining list methods would otherwise see the empty list
+for _name in (
+    "__add__",
+    "__contains__",
+    "__delitem__",
+    "__ge__",
+    "__gt__",
+    "__imul__",
+    "__le__",
+    "__lt__",
+    "__mul__",
+    "__reversed__",
+    "__rmul__",
+    "clear",
+    "copy",
+    "count",
+    "index",
+    "insert",
+    "pop",
+    "remove",
+    "reverse",
+    "sort",
+):
+    setattr(LazyRichText, _name, _materializing(_name))
+del _name
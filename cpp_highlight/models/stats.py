@@ -0,0 +1,157 @@
+"""Counters collected while processing a workbook."""
+
+from bisect import bisect_left
+from dataclasses import dataclass, field, fields
+from typing import Dict, List, Optional, Tuple
+
+# Upper bounds in seconds, from sub-millisecond cells to stuck ones
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+    2.5, 5.0, 10.0,
+)
+
+
+@dataclass
+class Histogram:
+    """Distribution of durations in fixed buckets.
+
+    Attributes:
+        buckets: Upper bounds of the buckets, ascending
+        counts: Observations per bucket, plus one for values above the last
+        total: Sum of all observed values
+    """
+
+    buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    counts: List[int] = None
+    total: float = 0.0
+
+    def __post_init__(self):
+        if self.counts is None:
+            self.counts = [0] * (len(self.buckets) + 1)
+
+    @property
+    def count(self) -> int:
+        """Number of observations."""
+        return sum(self.counts)
+
+    def observe(self, value: float) -> None:
+        """Record one duration."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+    def merge(self, other: "Histogram") -> None:
+        """Add the observations of a histogram with the same buckets."""
+        if other.buckets != self.buckets:
+            raise ValueError("Cannot merge histograms with different buckets")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+
+
+@dataclass
+class RunStats:
+    """Statistics for one processing run.
+
+    Attributes:
+        files_processed: Workbooks processed and saved
+        cells_scanned: String cells checked for C++ code
+        cells_detected: Cells detected as C++ code
+        cells_highlighted: Cells that received rich text
+        cells_chunked: Oversized cells lexed line-wise in chunks
+        cells_plain: Oversized cells colored plain without lexing
+        cells_timed_out: Cells whose rest was colored plain after a timeout
+        cells_skipped: Cells left unhighlighted by a budget or the watchdog
+        workers_restarted: Pool restarts after a stuck worker
+        lines_relexed: Lines lexed again in cells found in the lex cache
+        memory_relieved: Times memory neared the --max-memory limit
+        sheets_spooled: Worksheets moved to disk before the save to save memory
+        strings_shared: Highlighted cells written as shared string references
+        strings_unique: Distinct highlighted values in the shared strings
+        worker_busy_seconds: Time pool workers spent highlighting batches
+        worker_capacity_seconds: Wall time of pooled highlighting times the
+            number of workers, the busy time if no worker had ever idled
+        fallbacks: (location, action) for every budget or watchdog event
+        load_seconds: Loading time per workbook
+        detect_seconds: Detection time per worksheet
+        lex_seconds: Highlighting time per cell
+        save_seconds: Saving time per workbook
+        cache_hits: Lookups answered from a cache, by cache name
+        cache_misses: Lookups that had to compute the value, by cache name
+        cells_by_language: Code cells by language, when classifying cells
+            into several languages
+    """
+
+    files_processed: int = 0
+    cells_scanned: int = 0
+    cells_detected: int = 0
+    cells_highlighted: int = 0
+    cells_chunked: int = 0
+    cells_plain: int = 0
+    cells_timed_out: int = 0
+    cells_skipped: int = 0
+    workers_restarted: int = 0
+    lines_relexed: int = 0
+    memory_relieved: int = 0
+    sheets_spooled: int = 0
+    strings_shared: int = 0
+    strings_unique: int = 0
+    worker_busy_seconds: float = 0.0
+    worker_capacity_seconds: float = 0.0
+    fallbacks: List[Tuple[str, str]] = field(default_factory=list)
+    load_seconds: Histogram = field(default_factory=Histogram)
+    detect_seconds: Histogram = field(default_factory=Histogram)
+    lex_seconds: Histogram = field(default_factory=Histogram)
+    save_seconds: Histogram = field(default_factory=Histogram)
+    cache_hits: Dict[str, int] = field(default_factory=dict)
+    cache_misses: Dict[str, int] = field(default_factory=dict)
+    cells_by_language: Dict[str, int] = field(default_factory=dict)
+
+    # Counter incremented for each fallback action
+    ACTION_COUNTERS = {
+        "chunked": "cells_chunked",
+        "plain": "cells_plain",
+        "timeout": "cells_timed_out",
+        "skip": "cells_skipped",
+        "timeout-skip": "cells_skipped",
+        "watchdog-skip": "cells_skipped",
+    }
+
+    def record_fallback(self, action: str, location: Optional[str] = None) -> None:
+        """Count a budget or watchdog fallback and remember where it happened."""
+        counter = self.ACTION_COUNTERS[action]
+        setattr(self, counter, getattr(self, counter) + 1)
+        self.fallbacks.append((location or "?", action))
+
+    def record_cache(self, name: str, hits: int, misses: int) -> None:
+        """Count lookups of a named cache."""
+        self.cache_hits[name] = self.cache_hits.get(name, 0) + hits
+        self.cache_misses[name] = self.cache_misses.get(name, 0) + misses
+
+    def cache_hit_rate(self, name: str) -> Optional[float]:
+        """Return the hit rate of a cache, or None if it was never used."""
+        hits = self.cache_hits.get(name, 0)
+        lookups = hits + self.cache_misses.get(name, 0)
+        return hits / lookups if lookups else None
+
+    def worker_utilization(self) -> Optional[float]:
+        """Return the fraction of the workers' time spent highlighting.
+
+        None if no pool was used.
+        """
+        if not self.worker_capacity_seconds:
+            return None
+        return min(self.worker_busy_seconds / self.worker_capacity_seconds, 1.0)
+
+    def merge(self, other: "RunStats") -> None:
+        """Add the counters and fallbacks of another run, e.g. a worker's."""
+        for f in fields(self):
+            mine = getattr(self, f.name)
+            theirs = getattr(other, f.name)
+            if isinstance(mine, list):
+                mine.extend(theirs)
+            elif isinstance(mine, Histogram):
+                mine.merge(theirs)
+            elif isinstance(mine, dict):
+                for key, value in theirs.items():
+                    mine[key] = mine.get(key, 0) + value
+            else:
+                setattr(self, f.name, mine + theirs)
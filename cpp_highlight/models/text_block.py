@@ -1,8 +1,44 @@
 """Custom TextBlock for whitespace preservation."""
 
-from xml.etree.ElementTree import Element
+from typing import Tuple
+from xml.etree.ElementTree import _escape_cdata, tostring
 
 from openpyxl.cell.rich_text import TextBlock as _OrigTextBlock
+# lxml's Element when openpyxl uses lxml, so fonts' elements can be added
+from openpyxl.xml.functions import Element
+
+# Serialized <rPr> element per font; highlighted cells share a few fonts.
+# Hashing an InlineFont compares every attribute, so fonts are looked up by
+# identity first (the entry keeps the font alive, so its id stays unique).
+_RPR_CACHE = {}
+_RPR_BY_ID = {}
+_RPR_CACHE_SIZE = 4096
+# [hits, misses] of the identity lookup
+_RPR_CACHE_INFO = [0, 0]
+
+
+def rpr_cache_info() -> Tuple[int, int]:
+    """Return (hits, misses) of the ``<rPr>`` cache since the process started."""
+    return tuple(_RPR_CACHE_INFO)
+
+
+def _rpr_xml(font) -> str:
+    """Return the serialized ``<rPr>`` element of an InlineFont."""
+    entry = _RPR_BY_ID.get(id(font))
+    if entry is not None:
+        _RPR_CACHE_INFO[0] += 1
+        return entry[1]
+
+    _RPR_CACHE_INFO[1] += 1
+    xml = _RPR_CACHE.get(font)
+    if xml is None:
+        xml = tostring(font.to_tree(tagname="rPr"), encoding="unicode")
+    if len(_RPR_BY_ID) >= _RPR_CACHE_SIZE:
+        _RPR_BY_ID.clear()
+        _RPR_CACHE.clear()
+    _RPR_CACHE[font] = xml
+    _RPR_BY_ID[id(font)] = (font, xml)
+    return xml
 
 
 class TextBlock(_OrigTextBlock):
@@ -23,3 +59,26 @@ class TextBlock(_OrigTextBlock):
 
         el.append(t)
         return el
+
+    def to_xml(self) -> str:
+        """Serialize to the same markup as ``to_tree`` without building it.
+
+        The font markup comes from a per-font cache, so a run costs one
+        escape and one string format.
+        """
+        return run_xml(_rpr_xml(self.font) if self.font else "", self.text)
+
+
+def run_xml(rpr: str, text: str) -> str:
+    """Return the ``<r>`` markup of one run, as ``TextBlock.to_tree`` writes it.
+
+    Args:
+        rpr: Serialized ``<rPr>`` element, or "" for no font
+        text: Text of the run
+    """
+    if not text:
+        return f"<r>{rpr}<t /></r>"
+    stripped = text.strip()
+    if text != stripped or not stripped:
+        return f'<r>{rpr}<t xml:space="preserve">{_escape_cdata(text)}</t></r>'
+    return f"<r>{rpr}<t>{_escape_cdata(text)}</t></r>"
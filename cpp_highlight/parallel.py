@@ -0,0 +1,489 @@
+"""Process pools for highlighting cells or whole worksheets."""
+
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import openpyxl
+from openpyxl.cell.rich_text import CellRichText
+
+from cpp_highlight.config import ThemeConfig
+from cpp_highlight.core import CellHighlighter
+from cpp_highlight.models import ColorRuns, RunStats
+from cpp_highlight.scheduler import plan_batches
+from cpp_highlight.writer import (
+    SharedStrings,
+    merge_styles,
+    remap_string_ids,
+    remap_style_ids,
+    render_rows,
+    style_contributions,
+    style_snapshot,
+)
+
+# Highlighter owned by each worker process
+_worker_highlighter: Optional[CellHighlighter] = None
+
+# Workbook handed to forked sheet workers without pickling
+_shared_workbook = None
+# (workbook, style snapshot, batch_detect, languages, shared_strings) of
+# each sheet worker
+_sheet_state = None
+
+
+def _init_worker(colors, default_color, font, lexer, budget) -> None:
+    """Build the worker's highlighter.
+
+    The theme is rebuilt from its colors because Pygments token types do not
+    survive pickling as the singletons the theme lookup relies on.
+    """
+    global _worker_highlighter
+    theme = ThemeConfig(colors=colors, default_color=default_color)
+    _worker_highlighter = CellHighlighter(
+        theme=theme, font=font, lexer=lexer, budget=budget
+    )
+
+
+def worker_config(highlighter: CellHighlighter) -> tuple:
+    """Return what a worker needs to build a highlighter like this one.
+
+    The tuple pickles and compares by value; see ``_init_worker``.
+    """
+    return (
+        dict(highlighter.theme.colors),
+        highlighter.theme.default_color,
+        highlighter.font,
+        type(highlighter.lexer),
+        highlighter.budget,
+    )
+
+
+# (configuration, highlighter) of each thread that ran highlight_items
+_executor_state = threading.local()
+
+
+def highlight_items(config: tuple, items: List[Tuple[str, str]]):
+    """Highlight ``(location, text)`` items in any executor thread or process.
+
+    Each thread keeps a highlighter built from the last ``worker_config``
+    it was given, so the function can be submitted to thread and process
+    pools alike.
+
+    Returns:
+        Tuple of ([(color_runs, required_height), ...], stats of this call)
+    """
+    state = getattr(_executor_state, "value", None)
+    if state is None or state[0] != config:
+        colors, default_color, font, lexer, budget = config
+        theme = ThemeConfig(colors=colors, default_color=default_color)
+        highlighter = CellHighlighter(
+            theme=theme, font=font, lexer=lexer, budget=budget
+        )
+        state = _executor_state.value = (config, highlighter)
+    return _run_batch(state[1], items)
+
+
+def _run_batch(highlighter: CellHighlighter, batch: List[Tuple[str, str]]):
+    """Highlight a batch with fresh stats, timing it as worker busy time.
+
+    Items classified by language carry the language's name as a third
+    element, ``(location, text, language)``.
+
+    Returns:
+        Tuple of ([(color_runs, required_height), ...], stats of this batch)
+    """
+    highlighter.stats = stats = RunStats()
+    start = time.perf_counter()
+    results = [
+        highlighter.highlight_runs(text, location, *language)
+        for location, text, *language in batch
+    ]
+    stats.worker_busy_seconds += time.perf_counter() - start
+    return results, stats
+
+
+def _highlight_batch(batch: List[Tuple[str, str]]):
+    """Highlight ``(location, text)`` items in a worker process.
+
+    Results are sent back as ColorRuns, which pickle to a fraction of the
+    size of rich text.
+
+    Returns:
+        Tuple of ([(color_runs, required_height), ...], stats of this batch)
+    """
+    return _run_batch(_worker_highlighter, batch)
+
+
+class HighlightPool:
+    """Highlights many cells in worker processes.
+
+    Results are collected in submission order.  If a batch produces no
+    result within ``watchdog`` seconds, the workers are terminated and
+    restarted; the batch is retried one cell at a time, and a cell that
+    stalls a worker on its own is skipped and logged to the run stats.
+    """
+
+    def __init__(
+        self,
+        highlighter: CellHighlighter,
+        jobs: int,
+        batch_size: int = 64,
+        watchdog: Optional[float] = 60.0,
+        stats: RunStats = None,
+    ):
+        """Create a pool of ``jobs`` workers configured like ``highlighter``."""
+        self.jobs = jobs
+        self.batch_size = batch_size
+        self.watchdog = watchdog
+        self.stats = stats if stats is not None else highlighter.stats
+        # Materializes the workers' color runs in ``highlight``
+        self.highlighter = highlighter
+        self._initargs = worker_config(highlighter)
+        self._pool = None
+
+    def __enter__(self) -> "HighlightPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _get_pool(self):
+        """Return the live worker pool, starting it if needed."""
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(
+                self.jobs, initializer=_init_worker, initargs=self._initargs
+            )
+        return self._pool
+
+    def _restart(self) -> None:
+        """Kill all workers; the next submission starts fresh ones."""
+        self._pool.terminate()
+        self._pool.join()
+        self._pool = None
+        self.stats.workers_restarted += 1
+
+    def close(self) -> None:
+        """Shut the workers down."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def highlight(
+        self, items: Sequence[Tuple[str, str]]
+    ) -> List[Tuple[Optional[CellRichText], Optional[float]]]:
+        """Highlight ``(location, text)`` items.
+
+        Returns:
+            One (rich_text, required_height) tuple per item, in order
+        """
+        materialize = self.highlighter.materialize
+        return [
+            (materialize(runs) if runs is not None else None, required_height)
+            for runs, required_height in self.highlight_runs(items)
+        ]
+
+    def highlight_runs(
+        self, items: Sequence[Tuple[str, str]]
+    ) -> List[Tuple[Optional[ColorRuns], Optional[float]]]:
+        """Highlight ``(location, text)`` items into color runs.
+
+        Returns:
+            One (color_runs, required_height) tuple per item, in order
+        """
+        results: List[Tuple[Optional[ColorRuns], Optional[float]]] = [
+            (None, None)
+        ] * len(items)
+        pending = plan_batches(items, self.jobs, self.batch_size)
+        start = time.perf_counter()
+
+        while pending:
+            pool = self._get_pool()
+            inflight = [
+                (
+                    indices,
+                    pool.apply_async(_highlight_batch, ([items[i] for i in indices],)),
+                )
+                for indices in pending
+            ]
+            pending = []
+
+            for position, (indices, result) in enumerate(inflight):
+                try:
+                    batch_results, batch_stats = result.get(timeout=self.watchdog)
+                except multiprocessing.TimeoutError:
+                    pending = self._recover(
+                        items, indices, inflight[position + 1 :], results
+                    )
+                    break
+                self._store(indices, batch_results, batch_stats, results)
+
+        self.stats.worker_capacity_seconds += self.jobs * (
+            time.perf_counter() - start
+        )
+        return results
+
+    def _store(self, indices, batch_results, batch_stats, results) -> None:
+        """Place a finished batch into ``results`` and add up its stats."""
+        for index, result in zip(indices, batch_results):
+            results[index] = result
+        self.stats.merge(batch_stats)
+
+    def _recover(self, items, stuck, remaining, results) -> List[List[int]]:
+        """Restart the workers after ``stuck`` timed out.
+
+        Returns:
+            Batches that still need to run
+        """
+        pending = []
+        for indices, result in remaining:
+            if result.ready():
+                self._store(indices, *result.get(), results)
+            else:
+                pending.append(indices)
+        self._restart()
+
+        if len(stuck) > 1:
+            return [[index] for index in stuck] + pending
+        self.stats.record_fallback("watchdog-skip", items[stuck[0]][0])
+        return pending
+
+
+class HighlightThreads:
+    """Highlights many cells in a thread pool.
+
+    Highlighters cache fonts and palette entries as they go and lexers are
+    driven one cell at a time, so every thread lexes with a highlighter and
+    lexer of its own; they share one frozen theme and the font settings,
+    which are only read.  Results come back as color runs like those of
+    HighlightPool, without pickling.  With the GIL only one thread lexes at
+    a time; free-threaded builds run them in parallel.  Threads cannot be
+    killed, so there is no watchdog: the cell time budget bounds each cell.
+    """
+
+    def __init__(
+        self,
+        highlighter: CellHighlighter,
+        threads: int,
+        batch_size: int = 64,
+        stats: RunStats = None,
+    ):
+        """Create a pool of ``threads`` threads configured like ``highlighter``."""
+        self.threads = threads
+        self.batch_size = batch_size
+        self.stats = stats if stats is not None else highlighter.stats
+        self.highlighter = highlighter
+        self._theme = highlighter.theme.frozen()
+        self._local = threading.local()
+        self._executor = None
+
+    def __enter__(self) -> "HighlightThreads":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Shut the threads down."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _thread_highlighter(self) -> CellHighlighter:
+        """Return the calling thread's highlighter, creating it on first use."""
+        highlighter = getattr(self._local, "highlighter", None)
+        if highlighter is None:
+            parent = self.highlighter
+            highlighter = CellHighlighter(
+                theme=self._theme,
+                font=parent.font,
+                lexer=type(parent.lexer),
+                budget=parent.budget,
+            )
+            self._local.highlighter = highlighter
+        return highlighter
+
+    def _highlight_batch(self, batch: List[Tuple[str, str]]):
+        """Highlight ``(location, text)`` items in a pool thread.
+
+        Returns:
+            Tuple of ([(color_runs, required_height), ...], stats of this batch)
+        """
+        return _run_batch(self._thread_highlighter(), batch)
+
+    def highlight(
+        self, items: Sequence[Tuple[str, str]]
+    ) -> List[Tuple[Optional[CellRichText], Optional[float]]]:
+        """Highlight ``(location, text)`` items.
+
+        Returns:
+            One (rich_text, required_height) tuple per item, in order
+        """
+        materialize = self.highlighter.materialize
+        return [
+            (materialize(runs) if runs is not None else None, required_height)
+            for runs, required_height in self.highlight_runs(items)
+        ]
+
+    def highlight_runs(
+        self, items: Sequence[Tuple[str, str]]
+    ) -> List[Tuple[Optional[ColorRuns], Optional[float]]]:
+        """Highlight ``(location, text)`` items into color runs.
+
+        Returns:
+            One (color_runs, required_height) tuple per item, in order
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                self.threads, thread_name_prefix="highlight"
+            )
+        plan = plan_batches(items, self.threads, self.batch_size)
+        batches = [[items[i] for i in indices] for indices in plan]
+        results: List[Tuple[Optional[ColorRuns], Optional[float]]] = [
+            (None, None)
+        ] * len(items)
+        start = time.perf_counter()
+        for indices, (batch_results, batch_stats) in zip(
+            plan, self._executor.map(self._highlight_batch, batches)
+        ):
+            for index, result in zip(indices, batch_results):
+                results[index] = result
+            self.stats.merge(batch_stats)
+        self.stats.worker_capacity_seconds += self.threads * (
+            time.perf_counter() - start
+        )
+        return results
+
+
+def _init_sheet_worker(
+    input_path,
+    colors,
+    default_color,
+    font,
+    lexer,
+    budget,
+    batch_detect,
+    languages,
+    shared_strings,
+) -> None:
+    """Set up a sheet worker.
+
+    Forked workers use the parent's already loaded workbook; spawned ones
+    load it again from ``input_path``, a path or the workbook's bytes.
+    """
+    global _sheet_state
+    _init_worker(colors, default_color, font, lexer, budget)
+    wb = _shared_workbook
+    if wb is None:
+        if isinstance(input_path, bytes):
+            input_path = BytesIO(input_path)
+        wb = openpyxl.load_workbook(input_path)
+    _sheet_state = (wb, style_snapshot(wb), batch_detect, languages, shared_strings)
+
+
+def _render_sheet(index: int):
+    """Highlight one worksheet in a sheet worker.
+
+    Returns:
+        Tuple of (number of cells highlighted, ``<sheetData>`` markup,
+        styles added since the worker started, run stats, and the items and
+        count of the sheet's shared strings or None)
+    """
+    from cpp_highlight.processor import _process_sheet
+
+    wb, base, batch_detect, languages, shared_strings = _sheet_state
+    highlighter = _worker_highlighter
+    stats = RunStats()
+    highlighter.stats = stats
+
+    count = _process_sheet(
+        wb.worksheets[index],
+        highlighter,
+        None,
+        stats,
+        False,
+        batch_detect,
+        languages=languages,
+    )
+    strings = SharedStrings() if shared_strings else None
+    rows = render_rows(wb.worksheets[index], stats, strings)
+    if strings is not None:
+        strings = (strings.items, strings.count)
+    return count, rows, style_contributions(wb, base), stats, strings
+
+
+def highlight_sheets(
+    wb,
+    input_path: Union[str, bytes],
+    highlighter: CellHighlighter,
+    jobs: int,
+    batch_detect: bool = False,
+    stats: RunStats = None,
+    verbose: bool = False,
+    languages: Optional[Tuple[str, ...]] = None,
+    strings: SharedStrings = None,
+) -> Tuple[int, Dict[int, str]]:
+    """Highlight every worksheet of ``wb`` in its own worker process.
+
+    Each worker renders its sheet's rows and reports the styles it added.
+    The styles are merged into ``wb`` in sheet order, which numbers them
+    the same way as processing the sheets one after another would, and the
+    rows are renumbered to match.  ``wb`` itself is left unhighlighted.
+    ``languages`` are the languages to classify cells into, as for
+    ``process_excel``.  With ``strings``, workers write highlighted values
+    to tables of their own, which are merged into it the same way.
+
+    Returns:
+        Tuple of (number of cells highlighted, rows markup by
+        ``id(worksheet)`` for ``save_workbook``)
+    """
+    global _shared_workbook
+    if stats is None:
+        stats = highlighter.stats
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        _shared_workbook = wb
+    else:
+        context = multiprocessing.get_context()
+    initargs = (
+        input_path,
+        highlighter.theme.colors,
+        highlighter.theme.default_color,
+        highlighter.font,
+        type(highlighter.lexer),
+        highlighter.budget,
+        batch_detect,
+        languages,
+        strings is not None,
+    )
+
+    base = style_snapshot(wb)
+    worksheets = wb.worksheets
+    total = 0
+    rows = {}
+    try:
+        with context.Pool(
+            min(jobs, len(worksheets)),
+            initializer=_init_sheet_worker,
+            initargs=initargs,
+        ) as pool:
+            results = pool.imap(_render_sheet, range(len(worksheets)))
+            for ws, result in zip(worksheets, results):
+                count, markup, styles, sheet_stats, sheet_strings = result
+                style_ids = merge_styles(wb, base, styles)
+                markup = remap_style_ids(markup, style_ids)
+                if sheet_strings is not None:
+                    markup = remap_string_ids(markup, strings.merge(*sheet_strings))
+                rows[id(ws)] = markup
+                stats.merge(sheet_stats)
+                total += count
+                if verbose:
+                    print(f"  {ws.title}: {count} cells highlighted")
+    finally:
+        _shared_workbook = None
+
+    return total, rows
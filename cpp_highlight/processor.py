@@ -1,86 +1,631 @@
 # cpp_highlight/processor.py
 """Excel file processing logic."""
 
+import gc
+import os
 import sys
+import time
+from contextlib import nullcontext
+from io import BytesIO
+from typing import BinaryIO, Optional, Sequence, Tuple, Union
 
 import openpyxl
+from openpyxl.styles import Alignment
 
-from cpp_highlight.config import FontSettings, ThemeConfig
+from cpp_highlight.config import BudgetSettings, FontSettings, ThemeConfig
 from cpp_highlight.core import CellHighlighter, is_cpp_code
 from cpp_highlight.core.highlighter import calculate_required_height
+from cpp_highlight.core.languages import get_classifier
+from cpp_highlight.core.layout import (
+    chars_per_line,
+    column_widths,
+    default_column_width,
+    estimate_heights,
+)
+from cpp_highlight.core.lex_cache import LexCache
+from cpp_highlight.errors import (
+    ProcessingError,
+    WorkbookLoadError,
+    WorkbookSaveError,
+)
+from cpp_highlight.memory import MemoryBudget, MemoryReport
+from cpp_highlight.models import RunStats
+from cpp_highlight.models.runs import LazyRichText
+from cpp_highlight.parallel import HighlightPool, HighlightThreads, highlight_sheets
+from cpp_highlight.writer import SharedStrings, SpooledRows, save_workbook
 
+# A workbook path, its contents, or a binary file object to read them from
+WorkbookSource = Union[str, os.PathLike, bytes, BinaryIO]
+# A workbook path, or a binary file object to write to
+WorkbookTarget = Union[str, os.PathLike, BinaryIO]
 
-def process_excel(input_path: str, output_path: str, verbose: bool = False) -> int:
+# Cells highlighted between memory checks without a pool
+_MEMORY_CHUNK = 256
+
+
+def iter_code_cells(ws, batch_detect: bool = False, stats: RunStats = None):
+    """Yield the cells of a worksheet that contain C++ code.
+
+    Args:
+        ws: Worksheet to scan
+        batch_detect: Detect a whole column at a time with BatchDetector
+            (requires numpy) instead of calling is_cpp_code per cell
+        stats: Run statistics to count scanned cells in
+    """
+    if not batch_detect:
+        for row in ws.iter_rows():
+            for cell in row:
+                if isinstance(cell.value, str):
+                    if stats is not None:
+                        stats.cells_scanned += 1
+                    if is_cpp_code(cell.value):
+                        yield cell
+        return
+
+    from cpp_highlight.core.batch import BatchDetector
+
+    detector = BatchDetector()
+    for column in ws.iter_cols():
+        cells = [cell for cell in column if isinstance(cell.value, str)]
+        if not cells:
+            continue
+        if stats is not None:
+            stats.cells_scanned += len(cells)
+        detected = detector.detect([cell.value for cell in cells])
+        for cell, is_code in zip(cells, detected):
+            if is_code:
+                yield cell
+
+
+def iter_language_cells(ws, languages: Sequence[str], stats: RunStats = None):
+    """Yield ``(cell, language)`` for the cells of a worksheet that contain code.
+
+    Each cell is scanned once for all ``languages`` (see
+    ``cpp_highlight.core.languages.LanguageClassifier``).
+
+    Args:
+        ws: Worksheet to scan
+        languages: Names of the languages to detect
+        stats: Run statistics to count scanned and classified cells in
+    """
+    classifier = get_classifier(tuple(languages))
+    for row in ws.iter_rows():
+        for cell in row:
+            if isinstance(cell.value, str):
+                if stats is not None:
+                    stats.cells_scanned += 1
+                language = classifier.classify(cell.value)
+                if language is not None:
+                    if stats is not None:
+                        counts = stats.cells_by_language
+                        counts[language] = counts.get(language, 0) + 1
+                    yield cell, language
+
+
+def process_excel(
+    input_path: WorkbookSource,
+    output_path: WorkbookTarget,
+    verbose: bool = False,
+    batch_detect: bool = False,
+    jobs: int = 1,
+    budget: BudgetSettings = None,
+    watchdog: Optional[float] = 60.0,
+    stats: RunStats = None,
+    compression: str = "default",
+    per_sheet: bool = False,
+    highlighter: CellHighlighter = None,
+    cache: LexCache = None,
+    threads: int = 1,
+    max_memory: Optional[int] = None,
+    languages: Optional[Sequence[str]] = None,
+    shared_strings: bool = False,
+    memory_report: MemoryReport = None,
+) -> int:
     """Process an Excel file and apply C++ syntax highlighting.
 
     Args:
-        input_path: Path to input Excel file
-        output_path: Path to output Excel file
+        input_path: Path to input Excel file, its contents as bytes, or a
+            binary file object to read them from
+        output_path: Path to output Excel file, or a binary file object to
+            write it to
         verbose: Enable verbose output
+        batch_detect: Detect code column by column with NumPy
+        jobs: Number of worker processes used for highlighting
+        budget: Per-cell size and time budget (default: no limit)
+        watchdog: Seconds without progress before stuck workers are
+            restarted (only used when jobs > 1)
+        stats: Run statistics to fill in (fallbacks, counters)
+        compression: Zip compression of the output, one of
+            cpp_highlight.writer.COMPRESSION_MODES
+        per_sheet: With jobs > 1, give each worksheet to its own worker
+            process instead of sharing cells between workers
+        highlighter: Highlighter to reuse across calls, keeping its caches
+            warm; ``budget`` and ``cache`` are ignored when it is given
+        cache: Lexed cells from earlier runs, so edited cells are re-lexed
+            from their first changed line (only used without jobs or threads)
+        threads: Number of threads used for highlighting, as an alternative
+            to ``jobs`` for free-threaded Python builds
+        max_memory: Memory budget in bytes; near it, batches get smaller
+            and finished worksheets are moved to disk until the save.
+            ``per_sheet`` is not used with a budget.
+        languages: Names of languages in
+            ``cpp_highlight.core.languages.LANGUAGES`` to detect; each code
+            cell is highlighted with the lexer of its language.  By default
+            only C++ is detected, and ``batch_detect`` is not used otherwise.
+        shared_strings: Write each distinct highlighted value once to the
+            workbook's shared strings, and make its cells reference it,
+            instead of writing every value inline
+        memory_report: Report to charge the memory allocated while
+            loading, detecting, highlighting and saving to
 
     Returns:
         Number of cells highlighted
     """
-    if verbose:
-        print(f"Loading: {input_path}")
-
     try:
-        wb = openpyxl.load_workbook(input_path)
-    except Exception as e:
-        print(f"Error: Failed to load workbook: {e}", file=sys.stderr)
+        return _process_workbook(
+            input_path,
+            output_path,
+            verbose,
+            batch_detect,
+            jobs,
+            budget,
+            watchdog,
+            stats,
+            compression,
+            per_sheet,
+            highlighter,
+            cache,
+            threads,
+            max_memory,
+            languages,
+            shared_strings,
+            memory_report,
+        )
+    except ProcessingError as e:
+        print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
 
-    highlighter = CellHighlighter()
-    highlighted_count = 0
 
-    for sheet_name in wb.sheetnames:
-        ws = wb[sheet_name]
+def process_excel_bytes(
+    data: Union[bytes, BinaryIO], **options
+) -> Tuple[bytes, int]:
+    """Process a workbook held in memory.
+
+    Unlike ``process_excel``, failures are raised instead of exiting.
+
+    Args:
+        data: Contents of the input workbook, or a binary file object to
+            read them from
+        **options: Keyword arguments of ``process_excel``
+
+    Returns:
+        Tuple of (contents of the output workbook, number of cells
+        highlighted)
+
+    Raises:
+        WorkbookLoadError: ``data`` is not a readable workbook
+        WorkbookSaveError: The output could not be written
+    """
+    output = BytesIO()
+    count = _process_workbook(data, output, **options)
+    return output.getvalue(), count
+
 
+def _process_workbook(
+    input_path: WorkbookSource,
+    output_path: WorkbookTarget,
+    verbose: bool = False,
+    batch_detect: bool = False,
+    jobs: int = 1,
+    budget: BudgetSettings = None,
+    watchdog: Optional[float] = 60.0,
+    stats: RunStats = None,
+    compression: str = "default",
+    per_sheet: bool = False,
+    highlighter: CellHighlighter = None,
+    cache: LexCache = None,
+    threads: int = 1,
+    max_memory: Optional[int] = None,
+    languages: Optional[Sequence[str]] = None,
+    shared_strings: bool = False,
+    memory_report: MemoryReport = None,
+) -> int:
+    """Do the work of ``process_excel``, raising ProcessingError on failure."""
+    if jobs > 1 and threads > 1:
+        raise ValueError("jobs and threads cannot be combined")
+    if languages is not None:
+        # Rejects unknown names before the workbook is loaded
+        languages = tuple(get_classifier(tuple(languages)).names)
+
+    if verbose:
+        print(f"Loading: {_workbook_name(input_path)}")
+
+    if stats is None:
+        stats = RunStats()
+
+    if not _is_path(input_path):
+        # Kept as bytes: streams such as stdin cannot seek, and sheet
+        # workers load the workbook again from them
+        input_path = _read_bytes(input_path)
+    with _phase(memory_report, "load"):
+        wb = _load_workbook(input_path, stats)
+
+    if highlighter is None:
+        highlighter = CellHighlighter(budget=budget, stats=stats, cache=cache)
+    else:
+        highlighter.stats = stats
+    highlighter.cache_scope = (
+        os.path.abspath(input_path) if _is_path(input_path) else ""
+    )
+    rows = None
+    memory = MemoryBudget(max_memory, stats) if max_memory else None
+    strings = SharedStrings() if shared_strings else None
+
+    if per_sheet and jobs > 1 and len(wb.worksheets) > 1 and memory is None:
         if verbose:
-            print(f"\nProcessing sheet: {sheet_name}")
+            print(f"\nProcessing {len(wb.worksheets)} sheets in {jobs} processes")
+        with _phase(memory_report, "highlight"):
+            highlighted_count, rows = highlight_sheets(
+                wb,
+                input_path,
+                highlighter,
+                jobs,
+                batch_detect,
+                stats,
+                verbose,
+                languages,
+                strings,
+            )
+    else:
+        pool = None
+        if jobs > 1:
+            pool = HighlightPool(highlighter, jobs, watchdog=watchdog, stats=stats)
+        elif threads > 1:
+            pool = HighlightThreads(highlighter, threads, stats=stats)
+        highlighted_count = 0
+        relieve = None
+        if memory is not None:
+            rows = {}
+            finished = []
 
-        row_height_requirements = {}
+            def relieve(pending: int = 0) -> None:
+                memory.pending += pending
+                _relieve_memory(
+                    memory, finished, rows, highlighter, pool, verbose, strings
+                )
 
-        for row in ws.iter_rows():
-            for cell in row:
-                if isinstance(cell.value, str) and is_cpp_code(cell.value):
-                    if verbose:
-                        print(f"  {cell.coordinate}: Detected C++ code")
-
-                    rich_text, required_height = highlighter.highlight(cell.value)
-                    if rich_text is not None:
-                        cell.value = rich_text
-                        from openpyxl.styles import Alignment
-
-                        cell.alignment = Alignment(wrap_text=True, vertical="top")
-                        highlighted_count += 1
-                        if verbose:
-                            print(f"    -> Highlighted")
-
-                        if required_height is not None:
-                            row_num = cell.row
-                            current_max = row_height_requirements.get(row_num, 0)
-                            row_height_requirements[row_num] = max(
-                                current_max, required_height
-                            )
-
-        for row_num, required_height in row_height_requirements.items():
-            original_height = ws.row_dimensions[row_num].height
-
-            if original_height is None:
-                ws.row_dimensions[row_num].height = required_height
-            else:
-                ws.row_dimensions[row_num].height = max(
-                    original_height, required_height
+        try:
+            for sheet_name in wb.sheetnames:
+                highlighted_count += _process_sheet(
+                    wb[sheet_name],
+                    highlighter,
+                    pool,
+                    stats,
+                    verbose,
+                    batch_detect,
+                    relieve,
+                    languages,
+                    memory_report,
                 )
+                if memory is not None:
+                    finished.append(wb[sheet_name])
+                    relieve()
+        finally:
+            if pool is not None:
+                pool.close()
 
     if verbose:
-        print(f"\nSaving: {output_path}")
+        print(f"\nSaving: {_workbook_name(output_path)}")
+
+    if memory_report is not None:
+        memory_report.cells += highlighted_count
+    try:
+        with _phase(memory_report, "save"):
+            _save_output(
+                wb,
+                output_path,
+                compression,
+                rows,
+                stats,
+                strings,
+                memory_report.checkpoint if memory_report is not None else None,
+            )
+    finally:
+        for markup in (rows or {}).values():
+            if isinstance(markup, SpooledRows):
+                markup.close()
+    stats.files_processed += 1
+
+    return highlighted_count
+
 
+def _workbook_name(workbook) -> str:
+    """Name a workbook path, stream or bytes in messages."""
+    if _is_path(workbook):
+        return os.fspath(workbook)
+    if isinstance(workbook, (bytes, bytearray)):
+        return "<bytes>"
+    name = getattr(workbook, "name", None)
+    return name if isinstance(name, str) else "<stream>"
+
+
+def _is_path(workbook) -> bool:
+    """Whether a workbook source or target is a filesystem path."""
+    return isinstance(workbook, (str, os.PathLike))
+
+
+def _read_bytes(source) -> bytes:
+    """Return the contents of a bytes-like object or binary file object."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    return source.read()
+
+
+def _load_workbook(input_path: WorkbookSource, stats: RunStats):
+    """Load a workbook, timing it into ``stats.load_seconds``.
+
+    Raises:
+        WorkbookLoadError: The file is missing or not a readable workbook
+    """
+    start = time.perf_counter()
+    source = input_path
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = BytesIO(source)
     try:
-        wb.save(output_path)
+        wb = openpyxl.load_workbook(source)
     except Exception as e:
-        print(f"Error: Failed to save workbook: {e}", file=sys.stderr)
-        sys.exit(1)
+        raise WorkbookLoadError(
+            f"Failed to load workbook: {e}", _workbook_name(input_path)
+        ) from e
+    stats.load_seconds.observe(time.perf_counter() - start)
+    return wb
+
+
+def _save_output(
+    wb,
+    output_path: WorkbookTarget,
+    compression: str,
+    rows,
+    stats: RunStats,
+    strings: SharedStrings = None,
+    checkpoint=None,
+) -> None:
+    """Save the highlighted workbook, timing it into ``stats.save_seconds``.
+
+    Paths are written atomically; file objects are written in place.
+
+    Raises:
+        WorkbookSaveError: The output could not be written; a previous
+            output at ``output_path`` is left as it was
+    """
+    start = time.perf_counter()
+    try:
+        if _is_path(output_path):
+            _save_atomically(
+                wb, output_path, compression, rows, stats, strings, checkpoint
+            )
+        else:
+            save_workbook(
+                wb, output_path, compression, rows, stats, strings, checkpoint
+            )
+    except Exception as e:
+        raise WorkbookSaveError(
+            f"Failed to save workbook: {e}", _workbook_name(output_path)
+        ) from e
+    stats.save_seconds.observe(time.perf_counter() - start)
+
+
+def _save_atomically(
+    wb, output_path, compression, rows, stats, strings, checkpoint=None
+) -> None:
+    """Save to a temporary file next to ``output_path``, then rename it.
+
+    An interrupted save leaves the previous output, if any, untouched
+    rather than a truncated archive.
+    """
+    directory, name = os.path.split(os.path.abspath(output_path))
+    tmp_path = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+    try:
+        save_workbook(wb, tmp_path, compression, rows, stats, strings, checkpoint)
+        with open(tmp_path, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _process_sheet(
+    ws,
+    highlighter,
+    pool,
+    stats,
+    verbose,
+    batch_detect,
+    relieve=None,
+    languages=None,
+    memory_report=None,
+) -> int:
+    """Highlight the code cells of one worksheet.
+
+    Args:
+        relieve: Called with the approximate bytes of each batch of cells
+            highlighted, to keep memory in check; without it, the whole
+            sheet is highlighted in one go
+        languages: Languages to classify cells into, as for ``process_excel``
+        memory_report: Report to charge detection and highlighting to
+
+    Returns:
+        Number of cells highlighted
+    """
+    with _phase(memory_report, "detect"):
+        cells, items = _detect_sheet(ws, stats, verbose, batch_detect, languages)
+    with _phase(memory_report, "highlight"):
+        return _highlight_sheet(
+            ws, cells, items, highlighter, pool, stats, verbose, relieve
+        )
+
+
+def _phase(memory_report: Optional[MemoryReport], name: str):
+    """Charge the block's memory to phase ``name`` of a report, if any."""
+    if memory_report is None:
+        return nullcontext()
+    return memory_report.phase(name)
+
+
+def _highlight_sheet(ws, cells, items, highlighter, pool, stats, verbose, relieve):
+    """Highlight the detected ``cells`` of a worksheet; see ``_process_sheet``."""
+    if relieve is None:
+        results = _highlight_items(highlighter, pool, items)
+        return _apply_results(ws, cells, results, highlighter, stats, verbose)
+
+    highlighted_count = 0
+    start = 0
+    while start < len(items):
+        # The pool's batch size shrinks as memory runs short
+        end = start + (pool.batch_size * 4 if pool is not None else _MEMORY_CHUNK)
+        results = _highlight_items(highlighter, pool, items[start:end])
+        highlighted_count += _apply_results(
+            ws, cells[start:end], results, highlighter, stats, verbose
+        )
+        start = end
+        relieve(sum(runs.nbytes for runs, _ in results if runs is not None))
+    return highlighted_count
+
+
+def _highlight_items(highlighter, pool, items):
+    """Return (color runs, required height) per ``(location, text)`` item.
+
+    Items of classified cells also carry their language.
+    """
+    # Cells keep compact color runs; rich text is built as the sheet is saved
+    if pool is not None:
+        return pool.highlight_runs(items)
+    return [
+        highlighter.highlight_runs(text, location, *language)
+        for location, text, *language in items
+    ]
+
+
+def _relieve_memory(
+    memory, finished, rows, highlighter, pool, verbose, strings=None
+) -> None:
+    """Trade speed for memory when ``memory`` nears its limit.
+
+    Halves the pool's batch size, shrinks the lex cache and moves the
+    worksheets in ``finished`` to disk as ``rows`` for the save, dropping
+    their cell values.  Their highlighted values go to ``strings``, if
+    given.
+    """
+    if not memory.needs_relief():
+        return
+    if verbose:
+        print(f"  Memory near its limit ({memory.used() >> 20} MiB), saving memory")
+    if pool is not None:
+        pool.batch_size = max(1, pool.batch_size // 2)
+    if highlighter.cache is not None:
+        highlighter.cache.shrink()
+    if not finished:
+        return
+    while finished:
+        ws = finished.pop()
+        rows[id(ws)] = SpooledRows(ws, memory.stats, strings)
+        for cell in ws._cells.values():
+            if type(cell._value) is LazyRichText:
+                memory.pending -= cell._value.runs.nbytes
+            # The save still collects hyperlinks from cells with values
+            if cell.hyperlink is None:
+                cell._value = None
+        memory.stats.sheets_spooled += 1
+    gc.collect()
+
+
+def _detect_sheet(ws, stats, verbose=False, batch_detect=False, languages=None):
+    """Find the code cells of one worksheet.
+
+    Returns:
+        Tuple of (cells, ``(location, text)`` item per cell); with
+        ``languages``, the items are ``(location, text, language)``
+    """
+    if verbose:
+        print(f"\nProcessing sheet: {ws.title}")
+
+    start = time.perf_counter()
+    if languages is None:
+        cells = list(iter_code_cells(ws, batch_detect, stats))
+        items = [(f"{ws.title}!{cell.coordinate}", cell.value) for cell in cells]
+        found = ["C++"] * len(cells)
+    else:
+        pairs = list(iter_language_cells(ws, languages, stats))
+        cells = [cell for cell, _ in pairs]
+        items = [
+            (f"{ws.title}!{cell.coordinate}", cell.value, language)
+            for cell, language in pairs
+        ]
+        found = [language for _, language in pairs]
+    stats.detect_seconds.observe(time.perf_counter() - start)
+    stats.cells_detected += len(cells)
+
+    if verbose:
+        for cell, language in zip(cells, found):
+            print(f"  {cell.coordinate}: Detected {language} code")
+    return cells, items
+
+
+def _apply_results(ws, cells, results, highlighter, stats, verbose=False) -> int:
+    """Set the highlighted values of ``cells`` and grow their rows to fit.
+
+    Rows fit the lines that wrap in their column too (see
+    ``cpp_highlight.core.layout``), up to Excel's maximum row height.
+
+    Args:
+        results: (color_runs, required_height) per cell, as returned by
+            ``CellHighlighter.highlight_runs``
+
+    Returns:
+        Number of cells highlighted
+    """
+    highlighted_count = 0
+    row_height_requirements = {}
+    highlighted = []
+
+    for cell, (runs, required_height) in zip(cells, results):
+        if runs is None:
+            continue
+        cell.value = highlighter.defer(runs)
+        cell.alignment = Alignment(wrap_text=True, vertical="top")
+        highlighted_count += 1
+        if verbose:
+            print(f"  {cell.coordinate}: Highlighted")
+
+        if required_height is not None:
+            highlighted.append((cell, runs.text))
+
+    # Lines wider than their column wrap; all cells are measured at once
+    widths = column_widths(ws)
+    default_width = default_column_width(ws)
+    limits = [
+        chars_per_line(widths.get(cell.column, default_width), highlighter.font)
+        for cell, _ in highlighted
+    ]
+    heights = estimate_heights(
+        [text for _, text in highlighted], limits, highlighter.font
+    )
+    for (cell, _), required_height in zip(highlighted, heights):
+        row_num = cell.row
+        current_max = row_height_requirements.get(row_num, 0)
+        row_height_requirements[row_num] = max(current_max, required_height)
+
+    for row_num, required_height in row_height_requirements.items():
+        original_height = ws.row_dimensions[row_num].height
+
+        if original_height is None:
+            ws.row_dimensions[row_num].height = required_height
+        else:
+            ws.row_dimensions[row_num].height = max(original_height, required_height)
 
+    stats.cells_highlighted += highlighted_count
     return highlighted_count
@@ -0,0 +1,169 @@
+"""Watch a directory and highlight workbooks that are added or changed."""
+
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from cpp_highlight.errors import ProcessingError
+
+EXCEL_SUFFIXES = (".xlsx", ".xlsm", ".xltx", ".xltm")
+
+# Suffix of the file stem of written outputs
+OUTPUT_SUFFIX = "_output"
+
+# Processed files, kept in the watched directory between runs
+STATE_FILE = ".cpp_highlight_watch.json"
+
+
+def output_path_for(input_path: Path) -> Path:
+    """Return the default output path ``<stem>_output<suffix>``."""
+    return input_path.parent / f"{input_path.stem}{OUTPUT_SUFFIX}{input_path.suffix}"
+
+
+def file_hash(path: Path) -> str:
+    """Return the SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DirectoryWatcher:
+    """Polls a directory and processes new or changed workbooks.
+
+    A workbook is processed once its size and mtime have stayed the same for
+    ``debounce`` seconds, so files that are still being copied are left
+    alone.  A file whose mtime changed but whose content hash did not is
+    not processed again.  Outputs (``*_output.xlsx``) and Excel lock files
+    (``~$*``) are ignored.  What was processed is remembered in
+    ``STATE_FILE`` so a restarted watcher only picks up changes.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        process: Callable[[Path, Path], None],
+        interval: float = 2.0,
+        debounce: float = 1.0,
+    ):
+        """Create a watcher.
+
+        Args:
+            directory: Directory to watch (not recursive)
+            process: Called with (input_path, output_path) for each workbook;
+                a ProcessingError it raises is reported and watching goes on
+            interval: Seconds between polls
+            debounce: Seconds a file must stay unchanged before processing
+        """
+        self.directory = Path(directory)
+        self.process = process
+        self.interval = interval
+        self.debounce = debounce
+        self.state_path = self.directory / STATE_FILE
+        # name -> {"mtime_ns", "size", "sha256"} of the last processed version
+        self._state: Dict[str, Dict[str, object]] = self._load_state()
+        # name -> (size/mtime signature, when it was first seen)
+        self._pending: Dict[str, Tuple[Tuple[int, int], float]] = {}
+
+    def _load_state(self) -> Dict[str, Dict[str, object]]:
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self) -> None:
+        tmp_path = self.state_path.with_name(self.state_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._state, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    def _candidates(self) -> Dict[str, Tuple[int, int]]:
+        """Return the size/mtime signature of every workbook to consider."""
+        found = {}
+        for entry in os.scandir(self.directory):
+            name = entry.name
+            stem, suffix = os.path.splitext(name)
+            if (
+                suffix.lower() not in EXCEL_SUFFIXES
+                or stem.endswith(OUTPUT_SUFFIX)
+                or name.startswith("~$")
+                or not entry.is_file()
+            ):
+                continue
+            stat = entry.stat()
+            found[name] = (stat.st_mtime_ns, stat.st_size)
+        return found
+
+    def poll(self, now: Optional[float] = None) -> List[Path]:
+        """Return the workbooks that changed and have settled.
+
+        Args:
+            now: Current time (``time.monotonic()`` by default)
+        """
+        if now is None:
+            now = time.monotonic()
+        found = self._candidates()
+        for name in set(self._pending) - set(found):
+            del self._pending[name]
+
+        ready = []
+        for name, signature in sorted(found.items()):
+            known = self._state.get(name)
+            if known and (known["mtime_ns"], known["size"]) == signature:
+                self._pending.pop(name, None)
+                continue
+
+            pending = self._pending.get(name)
+            if pending is None or pending[0] != signature:
+                self._pending[name] = (signature, now)
+            elif now - pending[1] >= self.debounce:
+                del self._pending[name]
+                ready.append(name)
+
+        changed = []
+        state_touched = False
+        for name in ready:
+            path = self.directory / name
+            digest = file_hash(path)
+            mtime_ns, size = found[name]
+            known = self._state.get(name)
+            if known and known["sha256"] == digest:
+                # Touched or rewritten with the same content
+                known.update(mtime_ns=mtime_ns, size=size)
+                state_touched = True
+                continue
+            self._state[name] = {"mtime_ns": mtime_ns, "size": size, "sha256": digest}
+            changed.append(path)
+
+        if state_touched and not changed:
+            self._save_state()
+        return changed
+
+    def run_once(self, now: Optional[float] = None) -> List[Path]:
+        """Poll once and process what is ready.
+
+        Returns:
+            The workbooks that were processed
+        """
+        changed = self.poll(now)
+        for path in changed:
+            try:
+                self.process(path, output_path_for(path))
+            except ProcessingError as e:
+                # Keep watching; the file is retried once it changes again
+                print(f"Error: Failed to process {path}: {e}", file=sys.stderr)
+        if changed:
+            self._save_state()
+        return changed
+
+    def run(self, stop: Callable[[], bool] = lambda: False) -> None:
+        """Poll until ``stop()`` returns True."""
+        while not stop():
+            self.run_once()
+            time.sleep(self.interval)
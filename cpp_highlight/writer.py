@@ -0,0 +1,590 @@
+"""Fast workbook writing for highlighted cells."""
+
+import codecs
+import datetime
+import os
+import re
+from contextlib import contextmanager
+from io import BytesIO
+from typing import Callable, Dict, List, Optional, Sequence, Union
+from xml.etree.ElementTree import _escape_attrib
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile, ZipInfo
+
+from et_xmlfile import xmlfile
+from openpyxl.cell import _writer as cell_writer
+from openpyxl.cell.rich_text import CellRichText
+from openpyxl.comments.comment_sheet import CommentRecord
+from openpyxl.drawing.spreadsheet_drawing import SpreadsheetDrawing
+from openpyxl.packaging.extended import ExtendedProperties
+from openpyxl.packaging.relationship import Relationship
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.stylesheet import write_stylesheet
+from openpyxl.workbook._writer import WorkbookWriter
+from openpyxl.worksheet import _writer as worksheet_writer
+from openpyxl.writer.excel import ExcelWriter
+from openpyxl.writer.theme import theme_xml
+from openpyxl.xml.constants import (
+    ARC_APP,
+    ARC_CORE,
+    ARC_CUSTOM,
+    ARC_ROOT_RELS,
+    ARC_SHARED_STRINGS,
+    ARC_STYLE,
+    ARC_THEME,
+    ARC_WORKBOOK,
+    ARC_WORKBOOK_RELS,
+    CPROPS_TYPE,
+    SHARED_STRINGS,
+    SHEET_MAIN_NS,
+)
+from openpyxl.xml.functions import tostring
+
+from cpp_highlight.models import RunStats, TextBlock
+from cpp_highlight.models.runs import LazyRichText
+from cpp_highlight.models.text_block import _rpr_xml, rpr_cache_info
+
+# (compress_type, compresslevel) for worksheet parts and for all other parts.
+# Worksheets hold nearly all of a highlighted workbook, so "fast" only
+# lowers their level and keeps the rest (shared strings, styles) compressed.
+COMPRESSION_MODES = {
+    "store": ((ZIP_STORED, None), (ZIP_STORED, None)),
+    "fast": ((ZIP_DEFLATED, 1), (ZIP_DEFLATED, None)),
+    "default": ((ZIP_DEFLATED, None), (ZIP_DEFLATED, None)),
+    "max": ((ZIP_DEFLATED, 9), (ZIP_DEFLATED, 9)),
+}
+
+WORKSHEET_PREFIX = "xl/worksheets/sheet"
+
+# Workbook style lists a StyleArray points into, by StyleArray field
+_STYLE_LISTS = {
+    "fontId": "_fonts",
+    "fillId": "_fills",
+    "borderId": "_borders",
+    "protectionId": "_protections",
+    "alignmentId": "_alignments",
+}
+# Custom number formats are numbered from 164 on
+_CUSTOM_FORMAT_BASE = 164
+
+_CELL_STYLE_ID = re.compile(r'(<c r="[A-Z]+[0-9]+" s=")([0-9]+)"')
+# Only cells written by ``_write_shared`` have type "s"; openpyxl writes
+# strings inline
+_SHARED_STRING_ID = re.compile(r'( t="s"><v>)([0-9]+)<')
+
+
+class SharedStrings:
+    """Unique highlighted values of a workbook, for ``sharedStrings.xml``.
+
+    Cells whose values were added are written as indices into the table,
+    so a value that many cells hold is serialized and stored once.
+    Unmaterialized LazyRichText values are keyed by their text and runs,
+    which finds repeats without building their markup again; other rich
+    text is keyed by its markup.
+    """
+
+    def __init__(self):
+        self._indices: Dict[object, int] = {}
+        # ``<r>`` markup of each unique value, by index
+        self.items: List[str] = []
+        # Cells referencing the table
+        self.count = 0
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _index(self, markup: str) -> int:
+        index = self._indices.get(markup)
+        if index is None:
+            index = self._indices[markup] = len(self.items)
+            self.items.append(markup)
+        return index
+
+    def add_runs(self, value: LazyRichText) -> int:
+        """Add an unmaterialized LazyRichText; returns its index."""
+        runs = value.runs
+        rprs = tuple(_rpr_xml(font) for font in value.fonts)
+        key = (runs.text, runs.colors.tobytes(), runs.lengths.tobytes(), rprs)
+        index = self._indices.get(key)
+        if index is None:
+            index = self._indices[key] = self._index(runs.to_xml(rprs))
+        self.count += 1
+        return index
+
+    def add_markup(self, markup: str) -> int:
+        """Add a value by its ``<r>`` markup; returns its index."""
+        self.count += 1
+        return self._index(markup)
+
+    def merge(self, items: Sequence[str], count: int) -> Dict[int, int]:
+        """Add the values of another table, e.g. a sheet worker's.
+
+        Args:
+            items: The other table's ``items``
+            count: The other table's ``count``
+
+        Returns:
+            Mapping of the other table's indices to indices in this one
+        """
+        self.count += count
+        return {k: self._index(markup) for k, markup in enumerate(items)}
+
+    def to_xml(self) -> str:
+        """Serialize the table as the ``sharedStrings.xml`` part."""
+        parts = [
+            f'<sst xmlns="{SHEET_MAIN_NS}" count="{self.count}" '
+            f'uniqueCount="{len(self.items)}">'
+        ]
+        parts += [f"<si>{markup}</si>" for markup in self.items]
+        parts.append("</sst>")
+        return "".join(parts)
+
+
+def write_cell(xf, worksheet, cell, styled=None, strings=None) -> None:
+    """Write a cell, serializing highlighted rich text from strings.
+
+    Cells whose value is a CellRichText made only of our TextBlocks, or a
+    LazyRichText not yet materialized, are written as one string built from
+    ``TextBlock.to_xml`` or the color runs.  Every other cell goes through
+    openpyxl's own writer.  The output is identical either way, except
+    that with a SharedStrings table given, highlighted values are added to
+    it and the cells reference them instead of holding them inline.
+    """
+    value = cell._value
+    if type(value) is LazyRichText and not value.materialized and value:
+        if strings is not None:
+            _write_shared(xf, cell, styled, strings.add_runs(value))
+        else:
+            _write_inline(xf, cell, styled, value.to_xml())
+        return
+
+    if cell.data_type == "s" and isinstance(value, CellRichText) and value:
+        runs = []
+        for block in value:
+            if type(block) is not TextBlock:
+                break
+            runs.append(block.to_xml())
+        else:
+            if strings is not None:
+                _write_shared(xf, cell, styled, strings.add_markup("".join(runs)))
+            else:
+                _write_inline(xf, cell, styled, "".join(runs))
+            return
+
+    cell_writer.etree_write_cell(xf, worksheet, cell, styled)
+
+
+def _cell_attributes(cell, styled, **overrides) -> str:
+    """Return the serialized attributes of a cell's ``<c>`` element."""
+    _, attributes = cell_writer._set_attributes(cell, styled)
+    attributes.update(overrides)
+    return "".join(
+        f' {key}="{_escape_attrib(val)}"' for key, val in attributes.items()
+    )
+
+
+def _write_inline(xf, cell, styled, runs: str) -> None:
+    """Write an inline rich text cell from its ``<r>`` markup."""
+    xf._file(f"<c{_cell_attributes(cell, styled)}><is>{runs}</is></c>")
+
+
+def _write_shared(xf, cell, styled, index: int) -> None:
+    """Write a cell referencing entry ``index`` of the shared strings."""
+    xf._file(f"<c{_cell_attributes(cell, styled, t='s')}><v>{index}</v></c>")
+
+
+class HighlightWorksheetWriter(worksheet_writer.WorksheetWriter):
+    """WorksheetWriter that writes cells with ``write_cell``.
+
+    Everything a writer needs is held by the instance, so workbooks can be
+    saved from several threads at once.  The worksheet is always streamed
+    through et_xmlfile, even where openpyxl would use lxml, since lxml's
+    writer cannot take pre-serialized markup.
+
+    Args:
+        ws: Worksheet to write
+        out: File to write to; a temporary file by default
+        strings: Table to add highlighted values to instead of writing
+            them inline; its part must be saved with the workbook
+        markup: Pre-rendered ``<sheetData>`` of ``ws``, as a string or
+            SpooledRows, written instead of its cells
+    """
+
+    def __init__(
+        self,
+        ws,
+        out=None,
+        strings: SharedStrings = None,
+        markup: Union[str, "SpooledRows"] = None,
+    ):
+        super().__init__(ws, out)
+        self.strings = strings
+        self.markup = markup
+
+    def get_stream(self):
+        # As openpyxl's get_stream, with et_xmlfile's writer
+        with xmlfile(self.out) as xf:
+            with xf.element("worksheet", xmlns=SHEET_MAIN_NS):
+                try:
+                    while True:
+                        el = yield
+                        if el is True:
+                            yield xf
+                        elif el is not None:
+                            xf.write(el)
+                except GeneratorExit:
+                    pass
+
+    def write_rows(self):
+        if self.markup is None:
+            return super().write_rows()
+
+        # The cells are not serialized again, but their comments and
+        # hyperlinks are still collected the way ``write_row`` does, so the
+        # comment and relationship parts come out as usual
+        for _, row in self.rows():
+            for cell in row:
+                if cell._comment is not None:
+                    self.ws._comments.append(CommentRecord.from_cell(cell))
+                elif cell._value is None and not cell.has_style:
+                    continue
+                if cell.hyperlink:
+                    self.ws._hyperlinks.append(cell.hyperlink)
+
+        xf = self.xf.send(True)
+        if isinstance(self.markup, SpooledRows):
+            self.markup.write_to(xf._file)
+        else:
+            xf._file(self.markup)
+        self.xf.send(None)
+
+    def write_row(self, xf, row, row_idx):
+        # As openpyxl's write_row, with our write_cell
+        attrs = {"r": f"{row_idx}"}
+        attrs.update(self.ws.row_dimensions.get(row_idx, {}))
+        with xf.element("row", attrs):
+            for cell in row:
+                if cell._comment is not None:
+                    self.ws._comments.append(CommentRecord.from_cell(cell))
+                if cell._value is None and not cell.has_style and not cell._comment:
+                    continue
+                write_cell(xf, self.ws, cell, cell.has_style, self.strings)
+
+
+def use_fast_writer(ws, strings: SharedStrings = None) -> None:
+    """Write the rows appended to a write-only worksheet with ``write_cell``.
+
+    Must be called before the first row is appended, as the rows are
+    serialized when they are appended.
+
+    Args:
+        ws: Worksheet of a write-only workbook
+        strings: Table to add highlighted values to; its part must be
+            saved with the workbook
+    """
+    ws._writer = HighlightWorksheetWriter(ws, strings=strings)
+    ws._writer.write_top()
+
+
+def style_snapshot(wb) -> Dict[str, int]:
+    """Return the current length of each workbook style list."""
+    names = list(_STYLE_LISTS.values()) + ["_number_formats", "_cell_styles"]
+    return {name: len(getattr(wb, name)) for name in names}
+
+
+def style_contributions(wb, base: Dict[str, int]) -> Dict[str, List]:
+    """Return the style entries added to ``wb`` since ``base`` was taken."""
+    return {name: list(getattr(wb, name))[length:] for name, length in base.items()}
+
+
+def merge_styles(
+    wb, base: Dict[str, int], contributions: Dict[str, List]
+) -> Dict[int, int]:
+    """Add styles created in a copy of ``wb`` to ``wb`` itself.
+
+    The copy held the same style lists as ``wb`` when ``base`` was taken, so
+    only indices at or past ``base`` need new numbers.  Entries that ``wb``
+    already has are reused.
+
+    Returns:
+        Mapping of the copy's new cell style ids to ids in ``wb``
+    """
+    field_maps = {}
+    for field, name in _STYLE_LISTS.items():
+        target = getattr(wb, name)
+        field_maps[field] = {
+            base[name] + k: target.add(entry)
+            for k, entry in enumerate(contributions[name])
+        }
+    formats = {
+        _CUSTOM_FORMAT_BASE + base["_number_formats"] + k: _CUSTOM_FORMAT_BASE
+        + wb._number_formats.add(fmt)
+        for k, fmt in enumerate(contributions["_number_formats"])
+    }
+
+    style_ids = {}
+    for k, style in enumerate(contributions["_cell_styles"]):
+        style = StyleArray(style)
+        for field, mapping in field_maps.items():
+            old = getattr(style, field)
+            setattr(style, field, mapping.get(old, old))
+        style.numFmtId = formats.get(style.numFmtId, style.numFmtId)
+        style_ids[base["_cell_styles"] + k] = wb._cell_styles.add(style)
+    return style_ids
+
+
+@contextmanager
+def _count_rpr_cache(stats: Optional[RunStats]):
+    """Record the ``<rPr>`` cache lookups made inside this block."""
+    hits, misses = rpr_cache_info()
+    yield
+    if stats is not None:
+        new_hits, new_misses = rpr_cache_info()
+        stats.record_cache("rpr", new_hits - hits, new_misses - misses)
+
+
+def render_rows(ws, stats: RunStats = None, strings: SharedStrings = None) -> str:
+    """Serialize the ``<sheetData>`` element of a worksheet.
+
+    Highlighted values are added to ``strings``, if given.
+    """
+    writer = HighlightWorksheetWriter(ws, out=BytesIO(), strings=strings)
+    with _count_rpr_cache(stats):
+        writer.write_rows()
+    xml = writer.read().decode("utf-8")
+    return xml[xml.index("<sheetData") : xml.rindex("</worksheet>")]
+
+
+class SpooledRows:
+    """The ``<sheetData>`` element of a worksheet, kept in a temporary file.
+
+    Used in ``rows`` of ``save_workbook`` like markup from ``render_rows``,
+    so a finished worksheet's cell values can be dropped before the save.
+    """
+
+    def __init__(self, ws, stats: RunStats = None, strings: SharedStrings = None):
+        """Serialize the rows of ``ws`` to a temporary file.
+
+        Highlighted values are added to ``strings``, if given.
+        """
+        self._writer = HighlightWorksheetWriter(ws, strings=strings)
+        with _count_rpr_cache(stats):
+            self._writer.write_rows()
+        self._writer.close()
+        path = self._writer.out
+        with open(path, "rb") as f:
+            self._start = f.read(4096).index(b"<sheetData")
+        self._end = os.path.getsize(path) - len(b"</worksheet>")
+
+    def write_to(self, write) -> None:
+        """Pass the markup to ``write`` in pieces."""
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        with open(self._writer.out, "rb") as f:
+            f.seek(self._start)
+            remaining = self._end - self._start
+            while remaining > 0:
+                block = f.read(min(remaining, 1 << 20))
+                remaining -= len(block)
+                write(decoder.decode(block, final=remaining <= 0))
+
+    def close(self) -> None:
+        """Remove the temporary file."""
+        self._writer.cleanup()
+
+
+def remap_style_ids(rows: str, style_ids: Dict[int, int]) -> str:
+    """Renumber cell style ids in rows from ``render_rows``."""
+    if not style_ids:
+        return rows
+
+    def renumber(m):
+        style_id = int(m.group(2))
+        return f'{m.group(1)}{style_ids.get(style_id, style_id)}"'
+
+    return _CELL_STYLE_ID.sub(renumber, rows)
+
+
+def remap_string_ids(rows: str, string_ids: Dict[int, int]) -> str:
+    """Renumber shared string indices in rows from ``render_rows``."""
+    if not string_ids:
+        return rows
+
+    def renumber(m):
+        return f"{m.group(1)}{string_ids[int(m.group(2))]}<"
+
+    return _SHARED_STRING_ID.sub(renumber, rows)
+
+
+class _PartZipFile(ZipFile):
+    """ZipFile that picks the compression of each part by its name."""
+
+    def __init__(self, file, mode: str):
+        super().__init__(file, "w", ZIP_DEFLATED, allowZip64=True)
+        self._sheet_options, self._other_options = COMPRESSION_MODES[mode]
+
+    def _options(self, arcname: str):
+        if arcname.startswith(WORKSHEET_PREFIX):
+            return self._sheet_options
+        return self._other_options
+
+    def write(self, filename, arcname=None, compress_type=None, compresslevel=None):
+        if compress_type is None:
+            compress_type, compresslevel = self._options(arcname or str(filename))
+        super().write(filename, arcname, compress_type, compresslevel)
+
+    def writestr(
+        self, zinfo_or_arcname, data, compress_type=None, compresslevel=None
+    ):
+        if compress_type is None and not isinstance(zinfo_or_arcname, ZipInfo):
+            compress_type, compresslevel = self._options(zinfo_or_arcname)
+        super().writestr(zinfo_or_arcname, data, compress_type, compresslevel)
+
+
+class _CustomPropertiesPart:
+    """Content type entry of ``custom.xml`` for the manifest."""
+
+    path = "/" + ARC_CUSTOM
+    mime_type = CPROPS_TYPE
+
+
+class _SharedStringsPart:
+    """Content type entry of ``sharedStrings.xml`` for the manifest."""
+
+    path = "/" + ARC_SHARED_STRINGS
+    mime_type = SHARED_STRINGS
+
+
+class _SharedStringsWorkbookWriter(WorkbookWriter):
+    """WorkbookWriter that relates the workbook to a non-empty table."""
+
+    def __init__(self, wb, strings: Optional[SharedStrings]):
+        super().__init__(wb)
+        self.strings = strings
+
+    def write_rels(self):
+        if self.strings:
+            self.rels.append(
+                Relationship(type="sharedStrings", Target="sharedStrings.xml")
+            )
+        return super().write_rels()
+
+
+class _HighlightExcelWriter(ExcelWriter):
+    """ExcelWriter that writes worksheets with HighlightWorksheetWriter.
+
+    The SharedStrings table, if given, is filled as the worksheets are
+    written, so its part, its content type and the workbook's relationship
+    to it are added after them; an empty table is left out.  ``checkpoint``
+    is called once the worksheets are written.  All of it is held by the
+    instance, so overlapping saves do not affect each other.
+    """
+
+    def __init__(
+        self,
+        workbook,
+        archive,
+        strings: SharedStrings = None,
+        checkpoint: Callable[[], None] = None,
+        rows: Dict[int, Union[str, SpooledRows]] = None,
+    ):
+        super().__init__(workbook, archive)
+        self.strings = strings
+        self.checkpoint = checkpoint
+        self.rows = rows or {}
+
+    def write_worksheet(self, ws):
+        if self.workbook.write_only:
+            # Rows were written as they were appended (see use_fast_writer)
+            return super().write_worksheet(ws)
+
+        # As ExcelWriter.write_worksheet, with our writer
+        ws._drawing = SpreadsheetDrawing()
+        ws._drawing.charts = ws._charts
+        ws._drawing.images = ws._images
+        writer = HighlightWorksheetWriter(
+            ws, strings=self.strings, markup=self.rows.get(id(ws))
+        )
+        writer.write()
+        ws._rels = writer._rels
+        self._archive.write(writer.out, ws.path[1:])
+        self.manifest.append(ws)
+        writer.cleanup()
+
+    def _write_worksheets(self):
+        super()._write_worksheets()
+        if self.strings:
+            self._archive.writestr(ARC_SHARED_STRINGS, self.strings.to_xml())
+            self.manifest.append(_SharedStringsPart())
+        if self.checkpoint is not None:
+            self.checkpoint()
+
+    def write_data(self):
+        # As ExcelWriter.write_data, with _SharedStringsWorkbookWriter
+        archive = self._archive
+        workbook = self.workbook
+        archive.writestr(ARC_APP, tostring(ExtendedProperties().to_tree()))
+        archive.writestr(ARC_CORE, tostring(workbook.properties.to_tree()))
+        archive.writestr(ARC_THEME, workbook.loaded_theme or theme_xml)
+        if len(workbook.custom_doc_props) >= 1:
+            archive.writestr(ARC_CUSTOM, tostring(workbook.custom_doc_props.to_tree()))
+            self.manifest.append(_CustomPropertiesPart())
+
+        self._write_worksheets()
+        self._write_chartsheets()
+        self._write_images()
+        self._write_charts()
+        self._write_external_links()
+
+        archive.writestr(ARC_STYLE, tostring(write_stylesheet(workbook)))
+        writer = _SharedStringsWorkbookWriter(workbook, self.strings)
+        archive.writestr(ARC_ROOT_RELS, writer.write_root_rels())
+        archive.writestr(ARC_WORKBOOK, writer.write())
+        archive.writestr(ARC_WORKBOOK_RELS, writer.write_rels())
+
+        self._merge_vba()
+        self.manifest._write(archive, workbook)
+
+
+def save_workbook(
+    wb,
+    output_path: str,
+    compression: str = "default",
+    rows: Dict[int, Union[str, SpooledRows]] = None,
+    stats: RunStats = None,
+    strings: SharedStrings = None,
+    checkpoint: Callable[[], None] = None,
+) -> None:
+    """Save a workbook with the fast rich-text writer.
+
+    Nothing global is changed, so several workbooks can be saved at once.
+
+    Args:
+        wb: Workbook to save
+        output_path: Path of the output file
+        compression: One of COMPRESSION_MODES; "default" writes the archive
+            exactly like ``wb.save``
+        rows: Pre-rendered ``<sheetData>`` markup by ``id(worksheet)``, used
+            instead of the worksheets' cells
+        stats: Run statistics to count cache lookups in
+        strings: Table to write highlighted values to once each, holding
+            those of ``rows`` already; cells reference them by index
+        checkpoint: Called once the worksheets are written, e.g. to take a
+            memory snapshot while their data is still held
+    """
+    if compression not in COMPRESSION_MODES:
+        raise ValueError(f"Unknown compression mode: {compression}")
+
+    # Same steps as openpyxl's Workbook.save, with our archive and writer
+    if wb.read_only:
+        raise TypeError("Workbook is read-only")
+    if wb.write_only and not wb.worksheets:
+        wb.create_sheet()
+    with _count_rpr_cache(stats):
+        archive = _PartZipFile(output_path, compression)
+        wb.properties.modified = datetime.datetime.now(
+            tz=datetime.timezone.utc
+        ).replace(tzinfo=None)
+        _HighlightExcelWriter(wb, archive, strings, checkpoint, rows).save()
+
+    if strings is not None and stats is not None:
+        stats.strings_shared += strings.count
+        stats.strings_unique += len(strings)
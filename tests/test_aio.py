@@ -0,0 +1,163 @@
+"""Tests for the asyncio API."""
+
+import asyncio
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import openpyxl
+import pytest
+
+from cpp_highlight.aio import highlight_async, process_excel_async
+from cpp_highlight.core import CellHighlighter
+from cpp_highlight.errors import WorkbookLoadError, WorkbookSaveError
+from cpp_highlight.models import RunStats
+from cpp_highlight.processor import process_excel
+
+SHEET = "xl/worksheets/sheet1.xml"
+
+
+def make_workbook(path, rows=30):
+    wb = openpyxl.Workbook()
+    for row in range(1, rows + 1):
+        code = f"#include <vector>\nint f{row}() {{\n  return {row};\n}}"
+        wb.active.cell(row=row, column=1, value=code)
+        wb.active.cell(row=row, column=2, value=f"note {row}")
+    wb.save(path)
+
+
+def sheet_xml(path):
+    with zipfile.ZipFile(path) as z:
+        return z.read(SHEET)
+
+
+class TestProcessExcelAsync:
+    """process_excel_async against process_excel."""
+
+    def test_matches_process_excel(self, tmp_path):
+        input_path = str(tmp_path / "in.xlsx")
+        make_workbook(input_path)
+        expected = process_excel(input_path, str(tmp_path / "sync.xlsx"))
+
+        stats = RunStats()
+        count = asyncio.run(
+            process_excel_async(
+                input_path, str(tmp_path / "async.xlsx"), stats=stats, batch_size=7
+            )
+        )
+
+        assert count == expected == 30
+        assert stats.cells_highlighted == 30
+        assert stats.lex_seconds.count == 30
+        assert sheet_xml(tmp_path / "async.xlsx") == sheet_xml(tmp_path / "sync.xlsx")
+
+    def test_loop_not_blocked(self, tmp_path, monkeypatch):
+        """Results are applied to the sheet outside the event loop's thread."""
+        from cpp_highlight import aio
+
+        threads = []
+        apply = aio._apply_results
+
+        def recorded(*args):
+            threads.append(threading.get_ident())
+            return apply(*args)
+
+        monkeypatch.setattr(aio, "_apply_results", recorded)
+        input_path = str(tmp_path / "in.xlsx")
+        make_workbook(input_path)
+        count = asyncio.run(process_excel_async(input_path, input_path + ".out"))
+        assert count == 30
+        assert threads and threading.get_ident() not in threads
+
+    def test_concurrent_workbooks(self, tmp_path):
+        paths = []
+        for k in range(3):
+            paths.append(str(tmp_path / f"in{k}.xlsx"))
+            make_workbook(paths[-1], rows=10 + k)
+
+        async def run_all(executor):
+            return await asyncio.gather(
+                *(
+                    process_excel_async(path, path + ".out", executor, batch_size=4)
+                    for path in paths
+                )
+            )
+
+        with ThreadPoolExecutor(2) as executor:
+            assert asyncio.run(run_all(executor)) == [10, 11, 12]
+
+    def test_concurrent_shared_strings(self, tmp_path):
+        """Overlapping saves keep their own shared strings, or have none."""
+        input_path = str(tmp_path / "in.xlsx")
+        make_workbook(input_path)
+        for shared in (False, True):
+            process_excel(
+                input_path, str(tmp_path / f"sync{shared}.xlsx"), shared_strings=shared
+            )
+
+        async def run_all():
+            return await asyncio.gather(
+                *(
+                    process_excel_async(
+                        input_path,
+                        str(tmp_path / f"out{k}.xlsx"),
+                        batch_size=4,
+                        shared_strings=k % 2 == 1,
+                    )
+                    for k in range(8)
+                )
+            )
+
+        assert asyncio.run(run_all()) == [30] * 8
+        for k in range(8):
+            expected = tmp_path / f"sync{k % 2 == 1}.xlsx"
+            assert sheet_xml(tmp_path / f"out{k}.xlsx") == sheet_xml(expected)
+            with zipfile.ZipFile(tmp_path / f"out{k}.xlsx") as z:
+                assert ("xl/sharedStrings.xml" in z.namelist()) == (k % 2 == 1)
+
+    def test_errors_are_raised(self, tmp_path):
+        with pytest.raises(WorkbookLoadError) as exc:
+            asyncio.run(process_excel_async(str(tmp_path / "missing.xlsx"), "out.xlsx"))
+        assert exc.value.path.endswith("missing.xlsx")
+
+        input_path = str(tmp_path / "in.xlsx")
+        make_workbook(input_path)
+        with pytest.raises(WorkbookSaveError):
+            asyncio.run(
+                process_excel_async(input_path, str(tmp_path / "no" / "out.xlsx"))
+            )
+
+    def test_cancel(self, tmp_path):
+        input_path = str(tmp_path / "in.xlsx")
+        output_path = tmp_path / "out.xlsx"
+        make_workbook(input_path)
+
+        async def cancel_early():
+            task = asyncio.create_task(
+                process_excel_async(input_path, str(output_path), batch_size=1)
+            )
+            await asyncio.sleep(0)
+            task.cancel()
+            await task
+
+        with pytest.raises(asyncio.CancelledError):
+            asyncio.run(cancel_early())
+        assert not output_path.exists()
+
+
+class TestHighlightAsync:
+    """highlight_async against CellHighlighter.highlight."""
+
+    def test_thread_executor(self, sample_cpp_code):
+        expected = CellHighlighter().highlight(sample_cpp_code)
+        assert asyncio.run(highlight_async(sample_cpp_code)) == expected
+
+    def test_process_executor(self, sample_cpp_code):
+        highlighter = CellHighlighter()
+        expected = highlighter.highlight(sample_cpp_code)
+
+        async def run(executor):
+            return await highlight_async(sample_cpp_code, "A1", highlighter, executor)
+
+        with ProcessPoolExecutor(1) as executor:
+            assert asyncio.run(run(executor)) == expected
@@ -0,0 +1,86 @@
+"""Tests for NumPy column-wide detection."""
+
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+
+
+FRAGMENTS = [
+    "int", "main", "(", ")", " ", "\n", "\t", "\r", "::", "std::", "#",
+    "include", "<", ">", '"', "using", "namespace", "x", "_", "class",
+    "struct", "enum", "public", ":", "private", "define", "pragma", "for",
+    "if", "cout", "string", "map", "/", "*", "/*", "*/", "//", "template",
+    "const", "constexpr", "a1", "\x0b",
+]
+
+
+class TestBatchDetector:
+    """BatchDetector decisions must equal is_cpp_code cell by cell."""
+
+    def test_matches_is_cpp_code_on_random_cells(self):
+        """Random code-like cells get the same decisions."""
+        from cpp_highlight.core import is_cpp_code
+        from cpp_highlight.core.batch import BatchDetector
+
+        rng = random.Random(42)
+        texts = [
+            "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 60)))
+            for _ in range(3000)
+        ]
+        result = BatchDetector().detect(texts)
+        assert result.tolist() == [is_cpp_code(text) for text in texts]
+
+    def test_matches_cut_across_cells_are_not_counted(self):
+        """Patterns never match across the separator between two cells."""
+        from cpp_highlight.core.batch import BatchDetector
+
+        texts = ["using", "namespace std", "#", "define X", "/* a", "*/"]
+        assert BatchDetector().detect(texts).tolist() == [False] * len(texts)
+
+    def test_non_string_and_special_values(self, sample_cpp_code):
+        """Non-strings, empty, non-ASCII and NUL cells are handled."""
+        from cpp_highlight.core.batch import BatchDetector
+
+        texts = [None, 42, "", sample_cpp_code, "std::vector<int> v; // é", "a\x00b"]
+        result = BatchDetector().detect(texts)
+        assert result.tolist() == [False, False, False, True, True, False]
+
+    def test_line_anchored_keywords(self):
+        """Access specifiers only count at the start of a line."""
+        from cpp_highlight.core import is_cpp_code
+        from cpp_highlight.core.batch import BatchDetector
+
+        texts = [
+            "  public:\n\tprivate:\n protected:",
+            "x public:\n y private:\n z protected:",
+        ]
+        result = BatchDetector().detect(texts)
+        assert result.tolist() == [is_cpp_code(text) for text in texts]
+        assert result.tolist() == [True, False]
+
+
+class TestBatchProcessing:
+    """process_excel with column-wide detection."""
+
+    def test_same_cells_highlighted(self, tmp_path, sample_cpp_code):
+        """batch_detect highlights the same cells as per-cell detection."""
+        from openpyxl import Workbook
+
+        from cpp_highlight.processor import process_excel
+
+        wb = Workbook()
+        ws = wb.active
+        ws["A1"] = sample_cpp_code
+        ws["A2"] = "Just a note"
+        ws["B1"] = 3.14
+        ws["B2"] = "int x; int y; int z"
+        input_path = tmp_path / "input.xlsx"
+        wb.save(input_path)
+
+        per_cell = process_excel(str(input_path), str(tmp_path / "a.xlsx"))
+        batch = process_excel(
+            str(input_path), str(tmp_path / "b.xlsx"), batch_detect=True
+        )
+        assert per_cell == batch == 2
@@ -0,0 +1,53 @@
+"""Tests for the benchmark baseline comparison."""
+
+from benchmarks.bench import PHASES, compare, rank_sum_p
+
+
+def phases(seconds):
+    """Same samples for every phase."""
+    return {phase: list(seconds) for phase in PHASES}
+
+
+class TestRankSum:
+    """One-sided Mann-Whitney U p-values."""
+
+    def test_separated_samples(self):
+        # All 5 later runs slower: 1 of C(10, 5) = 252 orderings
+        assert rank_sum_p([1, 2, 3, 4, 5], [6, 7, 8, 9, 10]) == 1 / 252
+
+    def test_identical_samples(self):
+        assert rank_sum_p([1.0] * 5, [1.0] * 5) == 1.0
+
+    def test_large_samples_approximated(self):
+        before = [1.0 + k / 100 for k in range(20)]
+        after = [2.0 + k / 100 for k in range(20)]
+        assert rank_sum_p(before, after) < 0.001
+        assert rank_sum_p(after, before) > 0.999
+
+
+class TestCompare:
+    """Verdicts per scenario and phase."""
+
+    def test_regression_flagged(self):
+        baseline = {"lex-heavy": phases([1.00, 1.01, 1.02, 1.03, 1.04])}
+        current = {"lex-heavy": phases([1.30, 1.31, 1.32, 1.33, 1.34])}
+        rows = compare(baseline, current, threshold=0.1)
+        assert {row[-1] for row in rows} == {"slower"}
+
+    def test_small_or_noisy_changes_pass(self):
+        baseline = {"lex-heavy": phases([1.00, 1.01, 1.02, 1.03, 1.04])}
+        within = {"lex-heavy": phases([1.05, 1.06, 1.07, 1.08, 1.09])}
+        noisy = {"lex-heavy": phases([0.50, 2.00, 0.90, 1.60, 1.30])}
+        for current in (within, noisy):
+            rows = compare(baseline, current, threshold=0.1)
+            assert {row[-1] for row in rows} == {"same"}
+
+    def test_tiny_phases_ignored(self):
+        baseline = {"s": phases([0.001] * 5)}
+        current = {"s": phases([0.002] * 5)}
+        assert {row[-1] for row in compare(baseline, current, 0.1)} == {"same"}
+
+    def test_improvement_reported(self):
+        baseline = {"s": phases([2.0, 2.1, 2.2, 2.3, 2.4])}
+        current = {"s": phases([1.0, 1.1, 1.2, 1.3, 1.4])}
+        assert {row[-1] for row in compare(baseline, current, 0.1)} == {"faster"}
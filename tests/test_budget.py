@@ -0,0 +1,211 @@
+"""Tests for the per-cell lexing budget and the pool watchdog."""
+
+import time
+
+import pytest
+from pygments.lexers import CppLexer
+
+from cpp_highlight.config import BudgetSettings
+from cpp_highlight.core import CellHighlighter
+from cpp_highlight.models import RunStats
+from cpp_highlight.parallel import HighlightPool
+
+
+def long_code(lines: int) -> str:
+    """C++ source with the given number of lines."""
+    body = "\n".join(f"    int x{i} = {i};  // line {i}" for i in range(lines))
+    return "#include <vector>\nint main() {\n" + body + "\n}"
+
+
+class SlowLexer(CppLexer):
+    """CppLexer that sleeps between tokens."""
+
+    def get_tokens_unprocessed(self, text, stack=("root",)):
+        for item in super().get_tokens_unprocessed(text, stack):
+            time.sleep(0.0005)
+            yield item
+
+
+class HangingLexer(CppLexer):
+    """CppLexer that never returns on text containing HANG."""
+
+    def get_tokens_unprocessed(self, text, stack=("root",)):
+        if "HANG" in text:
+            time.sleep(3600)
+        yield from super().get_tokens_unprocessed(text, stack)
+
+
+def plain_text(rich_text) -> str:
+    """Concatenated text of a CellRichText."""
+    return "".join(str(block) for block in rich_text)
+
+
+class TestBudgetSettings:
+    """Validation of budget policies."""
+
+    def test_unknown_policies_rejected(self):
+        with pytest.raises(ValueError):
+            BudgetSettings(oversize="truncate")
+        with pytest.raises(ValueError):
+            BudgetSettings(on_timeout="wait")
+
+    def test_off_by_default(self):
+        """Cells are not limited unless a budget is given."""
+        assert BudgetSettings() == BudgetSettings.unlimited()
+        assert CellHighlighter().budget == BudgetSettings.unlimited()
+
+    def test_cli_opt_in(self, tmp_path, monkeypatch):
+        """The command line sets a limit only when asked to."""
+        import sys
+
+        import openpyxl
+
+        from cpp_highlight import cli
+
+        path = str(tmp_path / "in.xlsx")
+        wb = openpyxl.Workbook()
+        wb.active["A1"] = "int main() { return 0; }"
+        wb.save(path)
+        budgets = []
+        build = cli._budget
+
+        def record(args):
+            budgets.append(build(args))
+            return budgets[-1]
+
+        monkeypatch.setattr(cli, "_budget", record)
+        for options in ([], ["--max-cell-chars", "20000", "--cell-time-limit", "2"]):
+            monkeypatch.setattr(sys, "argv", ["cpp_highlight", path, *options])
+            cli.main()
+
+        assert budgets == [
+            BudgetSettings(),
+            BudgetSettings(max_chars=20000, time_limit=2.0),
+        ]
+
+
+class TestCellBudget:
+    """CellHighlighter fallbacks for oversized and slow cells."""
+
+    @pytest.mark.parametrize("oversize", ["chunked", "plain"])
+    def test_oversized_text_preserved(self, oversize):
+        """Oversized cells keep their full text under both fallbacks."""
+        code = long_code(500)
+        budget = BudgetSettings(max_chars=1000, oversize=oversize, chunk_lines=50)
+        highlighter = CellHighlighter(budget=budget)
+
+        rich_text, height = highlighter.highlight(code, "Sheet!A1")
+
+        assert plain_text(rich_text) == code
+        assert height == CellHighlighter().highlight(code)[1]
+        assert highlighter.stats.fallbacks == [("Sheet!A1", oversize)]
+
+    def test_chunked_colors_tokens(self):
+        """Chunked lexing still produces colored tokens."""
+        budget = BudgetSettings(max_chars=1000, chunk_lines=50)
+        rich_text, _ = CellHighlighter(budget=budget).highlight(long_code(500))
+        assert len(rich_text) > 1000
+
+    def test_oversized_skip(self):
+        """The skip policy leaves oversized cells alone."""
+        stats = RunStats()
+        budget = BudgetSettings(max_chars=1000, oversize="skip")
+        highlighter = CellHighlighter(budget=budget, stats=stats)
+
+        assert highlighter.highlight(long_code(500), "Sheet!B2") == (None, None)
+        assert stats.cells_skipped == 1
+        assert stats.fallbacks == [("Sheet!B2", "skip")]
+
+    def test_small_cells_unaffected(self, sample_cpp_code):
+        """Cells within the budget are lexed as before."""
+        highlighter = CellHighlighter(budget=BudgetSettings(max_chars=1000))
+        rich_text, _ = highlighter.highlight(sample_cpp_code)
+        default, _ = CellHighlighter(budget=BudgetSettings.unlimited()).highlight(
+            sample_cpp_code
+        )
+        assert [str(block) for block in rich_text] == [
+            str(block) for block in default
+        ]
+        assert highlighter.stats.fallbacks == []
+
+    def test_long_cells_whole_by_default(self):
+        """Without a budget, long cells are lexed in one piece."""
+        code = long_code(1000)
+        assert len(code) > 20000
+        highlighter = CellHighlighter()
+        rich_text, _ = highlighter.highlight(code)
+        assert plain_text(rich_text) == code
+        assert highlighter.stats.fallbacks == []
+
+    def test_timeout_colors_rest_plain(self):
+        """A cell that runs out of time keeps its text."""
+        code = long_code(400)
+        budget = BudgetSettings(max_chars=None, time_limit=0.05)
+        highlighter = CellHighlighter(lexer=SlowLexer, budget=budget)
+
+        rich_text, _ = highlighter.highlight(code, "Sheet!C3")
+
+        assert plain_text(rich_text) == code
+        assert highlighter.stats.cells_timed_out == 1
+        assert highlighter.stats.fallbacks == [("Sheet!C3", "timeout")]
+
+    def test_timeout_skip(self):
+        """on_timeout='skip' drops the cell."""
+        budget = BudgetSettings(max_chars=None, time_limit=0.05, on_timeout="skip")
+        highlighter = CellHighlighter(lexer=SlowLexer, budget=budget)
+
+        assert highlighter.highlight(long_code(400)) == (None, None)
+        assert highlighter.stats.cells_skipped == 1
+
+
+class TestWatchdog:
+    """HighlightPool recovery from stuck workers."""
+
+    def test_results_in_order(self, sample_cpp_code):
+        """Pool results match serial highlighting."""
+        highlighter = CellHighlighter()
+        texts = [sample_cpp_code, "int x = 1;", "class A {};"] * 5
+        items = [(f"Sheet!A{i}", text) for i, text in enumerate(texts, 1)]
+
+        with HighlightPool(highlighter, jobs=2, batch_size=4) as pool:
+            results = pool.highlight(items)
+
+        expected = [highlighter.highlight(text) for text in texts]
+        assert [plain_text(r) for r, _ in results] == [
+            plain_text(r) for r, _ in expected
+        ]
+        assert [h for _, h in results] == [h for _, h in expected]
+
+    def test_stuck_cell_skipped(self):
+        """A cell that hangs a worker is skipped and the rest highlighted."""
+        stats = RunStats()
+        highlighter = CellHighlighter(lexer=HangingLexer, stats=stats)
+        items = [
+            ("Sheet!A1", "int a = 1;"),
+            ("Sheet!A2", "int HANG = 2;"),
+            ("Sheet!A3", "int c = 3;"),
+            ("Sheet!A4", "int d = 4;"),
+        ]
+
+        with HighlightPool(highlighter, jobs=2, batch_size=2, watchdog=1.0) as pool:
+            results = pool.highlight(items)
+
+        assert [r is not None for r, _ in results] == [True, False, True, True]
+        assert stats.fallbacks == [("Sheet!A2", "watchdog-skip")]
+        # The costliest cell is scheduled alone, so one restart finds it
+        assert stats.workers_restarted == 1
+
+    def test_stuck_batch_retried_per_cell(self):
+        """A batch that hangs is retried one cell at a time."""
+        stats = RunStats()
+        highlighter = CellHighlighter(lexer=HangingLexer, stats=stats)
+        items = [(f"Sheet!A{row}", f"int v{row} = {row};") for row in range(40)]
+        items[5] = ("Sheet!A5", "int HANG = 5;")
+
+        with HighlightPool(highlighter, jobs=2, watchdog=1.0) as pool:
+            results = pool.highlight(items)
+
+        assert [r is None for r, _ in results].count(True) == 1
+        assert results[5][0] is None
+        assert stats.fallbacks == [("Sheet!A5", "watchdog-skip")]
+        assert stats.workers_restarted == 2
@@ -61,3 +61,28 @@ class TestHeightCalculation:
         tokens = [(Token.Text, "code")]
         height = calculate_required_height(tokens)
         assert height == 16.0
+
+
+class TestHighlightHeight:
+    """Height computed while streaming tokens in CellHighlighter.highlight."""
+
+    @pytest.mark.parametrize(
+        "text",
+        ["int x;", "int x;\n", "\n\nint x;\n\n", "a\r\nb\rc", "/* a\nb */\nint y;", ""],
+    )
+    def test_matches_token_list(self, text):
+        """Height and runs match the lexed token list minus its newline."""
+        from pygments import lex
+
+        from cpp_highlight import calculate_required_height
+        from cpp_highlight.core import CellHighlighter
+
+        highlighter = CellHighlighter()
+        tokens = list(lex(text, highlighter.lexer))
+        if tokens[-1] == (Token.Text.Whitespace, "\n"):
+            tokens = tokens[:-1]
+
+        rich_text, height = highlighter.highlight(text)
+
+        assert [block.text for block in rich_text] == [v for _, v in tokens]
+        assert height == calculate_required_height(tokens)
@@ -0,0 +1,166 @@
+"""Tests for incremental lexing and the persistent lex cache."""
+
+import random
+
+import openpyxl
+import pytest
+from pygments.lexers import CppLexer, PythonLexer
+
+from benchmarks.synthetic import CODE_LINES, code_snippet
+from cpp_highlight.core import CellHighlighter, LexCache
+from cpp_highlight.core.highlighter import _lexer_input
+from cpp_highlight.core.incremental import IncrementalLexer, supports
+from cpp_highlight.models import RunStats
+from cpp_highlight.processor import process_excel
+
+# Lines that open or close constructs spanning lines
+MULTILINE = [
+    "/* start of",
+    "comment */",
+    "#if 0",
+    "#endif",
+    'R"(raw',
+    ')"',
+    "int foo(int a,",
+    "        int b)",
+    "{",
+    "}",
+    'const char* s = "x\\',
+    'y";',
+    "// comment \\",
+    "#define X \\",
+    "",
+]
+
+
+def full_lex(lexer, source):
+    return [(t, v) for _, t, v in lexer.get_tokens_unprocessed(source)]
+
+
+def edit(rng, lines, pool):
+    lines = list(lines)
+    k = rng.randrange(len(lines) + 1)
+    op = rng.random()
+    if op < 0.4 and lines:
+        lines[min(k, len(lines) - 1)] = rng.choice(pool)
+    elif op < 0.7:
+        lines[k:k] = [rng.choice(pool) for _ in range(rng.randint(1, 3))]
+    elif lines:
+        del lines[k : k + rng.randint(1, 3)]
+    return lines
+
+
+class TestIncrementalLexer:
+    """relex against lexing the edited text from scratch."""
+
+    def test_lex_matches_pygments(self, sample_cpp_code):
+        lexer = CppLexer()
+        source = _lexer_input(sample_cpp_code)
+        entry = IncrementalLexer(lexer).lex(source)
+        assert list(entry.tokens()) == full_lex(lexer, source)
+
+    def test_random_edits(self):
+        lexer = CppLexer()
+        incremental = IncrementalLexer(lexer)
+        rng = random.Random(0)
+        pool = CODE_LINES + MULTILINE
+        for _ in range(150):
+            lines = [rng.choice(pool) for _ in range(rng.randint(1, 40))]
+            entry = incremental.lex(_lexer_input("\n".join(lines)))
+            for _ in range(3):
+                lines = edit(rng, lines, pool)
+                source = _lexer_input("\n".join(lines))
+                entry, _ = incremental.relex(entry, source)
+                assert list(entry.tokens()) == full_lex(lexer, source)
+                assert entry.checkpoints == incremental.lex(source).checkpoints
+
+    def test_restart_not_after_closing_brace(self):
+        """A function definition can span a line holding only ``}``."""
+        lexer = CppLexer()
+        incremental = IncrementalLexer(lexer)
+        entry = incremental.lex("int main()\n}\nx = 1\ny = 2\nz = 3\n")
+        source = "int main()\n}\nx = 1\ny = 2\n{\n"
+        entry, _ = incremental.relex(entry, source)
+        assert list(entry.tokens()) == full_lex(lexer, source)
+
+    def test_small_edit_relexes_few_lines(self):
+        rng = random.Random(1)
+        lines = "\n".join(code_snippet(rng, 8) for _ in range(100)).split("\n")
+        incremental = IncrementalLexer(CppLexer())
+        entry = incremental.lex(_lexer_input("\n".join(lines)))
+
+        lines[len(lines) // 2] += "  // edited"
+        _, relexed = incremental.relex(entry, _lexer_input("\n".join(lines)))
+        assert len(lines) > 500
+        assert relexed < 20
+
+    def test_unchanged_text(self, sample_cpp_code):
+        incremental = IncrementalLexer(CppLexer())
+        entry = incremental.lex(_lexer_input(sample_cpp_code))
+        assert incremental.relex(entry, entry.source) == (entry, 0)
+
+    def test_supports(self):
+        assert supports(CppLexer())
+        assert not supports(PythonLexer())
+        with pytest.raises(ValueError):
+            IncrementalLexer(PythonLexer())
+
+
+class TestLexCache:
+    """LexCache and its use by the highlighter."""
+
+    @pytest.fixture
+    def long_code(self):
+        rng = random.Random(2)
+        return "\n".join(code_snippet(rng, 6) for _ in range(20))
+
+    def test_entries_persist(self, tmp_path, long_code):
+        path = str(tmp_path / "lex.db")
+        entry = IncrementalLexer(CppLexer()).lex(_lexer_input(long_code))
+        with LexCache(path) as cache:
+            cache.put("a", entry)
+        with LexCache(path) as cache:
+            assert len(cache) == 1
+            assert list(cache.get("a").tokens()) == list(entry.tokens())
+            assert cache.get("b") is None
+
+    def test_other_lexer_empties_cache(self, tmp_path, long_code):
+        path = str(tmp_path / "lex.db")
+        entry = IncrementalLexer(CppLexer()).lex(_lexer_input(long_code))
+        with LexCache(path) as cache:
+            cache.put("a", entry)
+        with LexCache(path, "CLexer") as cache:
+            assert len(cache) == 0
+
+    def test_cached_highlight_matches(self, tmp_path, long_code):
+        edited = long_code.replace("\n", "\n// edited\n", 1)
+        with LexCache(str(tmp_path / "lex.db")) as cache:
+            stats = RunStats()
+            highlighter = CellHighlighter(stats=stats, cache=cache)
+            plain = CellHighlighter()
+            for text in (long_code, edited):
+                assert highlighter.highlight_runs(text, "Sheet!A1") == (
+                    plain.highlight_runs(text, "Sheet!A1")
+                )
+
+        assert stats.cache_misses["lex"] == 1
+        assert stats.cache_hits["lex"] == 1
+        assert 0 < stats.lines_relexed < 10
+
+    def test_process_excel_reuses_cache(self, tmp_path, long_code):
+        input_path = str(tmp_path / "in.xlsx")
+        output_path = str(tmp_path / "out.xlsx")
+        wb = openpyxl.Workbook()
+        wb.active["A1"] = long_code
+        wb.save(input_path)
+
+        with LexCache(str(tmp_path / "lex.db")) as cache:
+            process_excel(input_path, output_path, cache=cache)
+            wb = openpyxl.load_workbook(input_path)
+            wb.active["A1"] = long_code + "\nint added = 1;"
+            wb.save(input_path)
+            stats = RunStats()
+            process_excel(input_path, output_path, stats=stats, cache=cache)
+
+        assert stats.cache_hits["lex"] == 1
+        assert stats.lines_relexed <= 3
@@ -0,0 +1,147 @@
+"""Tests for building a workbook from a source tree."""
+
+import sys
+
+import openpyxl
+import pytest
+from openpyxl.cell.rich_text import CellRichText
+
+from cpp_highlight import cli
+from cpp_highlight.ingest import (
+    EXCEL_CELL_LIMIT,
+    ingest_sources,
+    iter_sources,
+    split_functions,
+)
+
+SOURCE = """#include <vector>
+
+namespace demo {
+
+/// Doubles x
+int twice(int x) {
+  if (x) { return '}'; }
+  return x * 2;  // "{"
+}
+
+struct Point { int x; };
+
+}  // namespace demo
+
+int main() { return 1'000; }
+"""
+
+
+def make_tree(root):
+    (root / "lib").mkdir(parents=True)
+    (root / ".git").mkdir()
+    (root / "main.cpp").write_text(SOURCE)
+    (root / "lib" / "util.h").write_text("#pragma once\nint util();\n")
+    (root / "notes.txt").write_text("not code")
+    (root / ".git" / "hook.c").write_text("int x;")
+
+
+class TestSplitFunctions:
+    """split_functions boundaries."""
+
+    def test_functions_and_gaps(self):
+        pieces = split_functions(SOURCE)
+        assert [line for line, _ in pieces] == [1, 5, 11, 15]
+        assert pieces[1][1].startswith("/// Doubles x\nint twice")
+        assert pieces[1][1].endswith('// "{"\n}')
+        assert pieces[2][1] == "struct Point { int x; };\n\n}  // namespace demo"
+        assert pieces[3][1] == "int main() { return 1'000; }"
+
+    def test_lossless(self):
+        code = "\n".join(piece for _, piece in split_functions(SOURCE))
+        assert code.split() == SOURCE.split()
+
+    def test_raw_strings_and_macros(self):
+        source = '#define OPEN {\nconst char* s = R"x(})x";\nvoid f() {\n}\n'
+        assert split_functions(source) == [
+            (1, '#define OPEN {\nconst char* s = R"x(})x";'),
+            (3, "void f() {\n}"),
+        ]
+
+
+class TestIngest:
+    """ingest_sources and the ingest command."""
+
+    def test_per_file(self, tmp_path):
+        make_tree(tmp_path / "src")
+        output = tmp_path / "out.xlsx"
+
+        assert [p.name for p in iter_sources(str(tmp_path / "src"))] == [
+            "main.cpp",
+            "util.h",
+        ]
+        assert ingest_sources(str(tmp_path / "src"), str(output)) == 2
+
+        ws = openpyxl.load_workbook(output, rich_text=True).active
+        assert [c.value for c in ws[1]] == ["File", "Line", "Code"]
+        assert ws["A2"].value == "main.cpp"
+        assert ws["A3"].value == "lib/util.h"
+        assert isinstance(ws["C2"].value, CellRichText)
+        assert str(ws["C2"].value) == SOURCE.strip("\n")
+        assert ws["C2"].alignment.wrap_text
+        assert ws.row_dimensions[2].height > ws.row_dimensions[3].height
+
+    def test_per_function_parallel(self, tmp_path):
+        make_tree(tmp_path / "src")
+        serial, parallel = tmp_path / "serial.xlsx", tmp_path / "parallel.xlsx"
+        ingest_sources(str(tmp_path / "src"), str(serial), per_function=True)
+        count = ingest_sources(
+            str(tmp_path / "src"), str(parallel), per_function=True, jobs=2
+        )
+        assert count == 5
+
+        expected = openpyxl.load_workbook(serial, rich_text=True).active
+        ws = openpyxl.load_workbook(parallel, rich_text=True).active
+        assert list(ws.values) == list(expected.values)
+        lines = [row[1] for row in ws.iter_rows(min_row=2, values_only=True)]
+        assert lines == [1, 5, 11, 15, 1]
+
+    def test_long_file_split(self, tmp_path):
+        line = "int value = 0;  // " + "x" * 80
+        (tmp_path / "big.cpp").write_text("\n".join([line] * 800))
+        output = tmp_path / "out.xlsx"
+        assert ingest_sources(str(tmp_path), str(output)) == 3
+
+        ws = openpyxl.load_workbook(output).active
+        cells = [row for row in ws.iter_rows(min_row=2, values_only=True)]
+        assert all(len(code) <= EXCEL_CELL_LIMIT for _, _, code in cells)
+        assert [line for _, line, _ in cells] == [1, 328, 655]
+
+    def test_cli(self, tmp_path, monkeypatch, capsys):
+        make_tree(tmp_path / "src")
+        output = tmp_path / "out.xlsx"
+        argv = ["cpp_highlight", "ingest", str(tmp_path / "src"), "-o", str(output)]
+        monkeypatch.setattr(sys, "argv", argv)
+        cli.main()
+        assert "Highlighted 2 cells" in capsys.readouterr().out
+        assert output.exists()
+
+    def test_cli_verbose_before_command(self, tmp_path, capsys):
+        make_tree(tmp_path / "src")
+        output = tmp_path / "out.xlsx"
+        cli.main(["-v", "ingest", str(tmp_path / "src"), "-o", str(output)])
+        out = capsys.readouterr().out
+        assert "main.cpp" in out
+        assert "Highlighted 2 cells" in out
+
+    def test_cli_help_lists_commands(self, capsys):
+        with pytest.raises(SystemExit):
+            cli.main(["--help"])
+        out = capsys.readouterr().out
+        assert "highlight" in out
+        assert "ingest" in out
+
+    def test_cli_highlight_is_default(self, tmp_path, capsys):
+        wb = openpyxl.Workbook()
+        wb.active["A1"] = "int main() { return 0; }"
+        wb.save(tmp_path / "in.xlsx")
+        cli.main([str(tmp_path / "in.xlsx"), "-v"])
+        assert (tmp_path / "in_output.xlsx").exists()
+        output = tmp_path / "custom.xlsx"
+        cli.main(["highlight", str(tmp_path / "in.xlsx"), "-o", str(output)])
+        assert output.exists()
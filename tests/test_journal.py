@@ -0,0 +1,140 @@
+"""Tests for the batch journal, --resume and atomic saves."""
+
+import os
+import sys
+
+import openpyxl
+import pytest
+
+from cpp_highlight import cli, processor
+from cpp_highlight.journal import Journal
+from cpp_highlight.processor import process_excel
+from cpp_highlight.watch import file_hash
+
+CODE = "#include <vector>\nint main() {\n  return 0;\n}"
+
+
+def make_workbook(path, code=CODE):
+    wb = openpyxl.Workbook()
+    wb.active["A1"] = code
+    wb.save(path)
+
+
+def run_cli(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["cpp_highlight", *map(str, args)])
+    cli.main()
+
+
+class TestJournal:
+    """Journal records and lookups."""
+
+    def test_finished_needs_same_content_and_output(self, tmp_path):
+        input_path, output_path = tmp_path / "a.xlsx", tmp_path / "a_out.xlsx"
+        output_path.write_bytes(b"out")
+        with Journal(str(tmp_path / "journal.db")) as journal:
+            journal.record(str(input_path), "hash1", str(output_path), 3)
+
+            assert journal.is_finished(str(input_path), "hash1", str(output_path))
+            assert not journal.is_finished(str(input_path), "hash2", str(output_path))
+            assert not journal.is_finished(
+                str(input_path), "hash1", str(tmp_path / "other.xlsx")
+            )
+            output_path.unlink()
+            assert not journal.is_finished(str(input_path), "hash1", str(output_path))
+
+    def test_records_persist(self, tmp_path):
+        path = str(tmp_path / "journal.db")
+        with Journal(path) as journal:
+            journal.record("a.xlsx", "hash", "a_out.xlsx", 1)
+            journal.record("a.xlsx", "hash2", "a_out.xlsx", 1)
+        with Journal(path) as journal:
+            assert len(journal) == 1
+
+
+class TestResume:
+    """--journal and --resume on the command line."""
+
+    def test_resume_skips_finished(self, tmp_path, monkeypatch, capsys):
+        monkeypatch.chdir(tmp_path)
+        first, second = tmp_path / "first.xlsx", tmp_path / "second.xlsx"
+        make_workbook(first)
+        make_workbook(second)
+
+        run_cli(monkeypatch, first, "--journal", "j.db")
+        out = capsys.readouterr().out
+        assert "Processed 1 cells" in out
+
+        run_cli(monkeypatch, first, second, "--journal", "j.db", "--resume")
+        out = capsys.readouterr().out
+        assert "Skipped" in out and "first.xlsx" in out
+        assert out.count("Processed 1 cells") == 1
+        assert (tmp_path / "second_output.xlsx").exists()
+
+        # A changed input is processed again
+        make_workbook(first, CODE + "\n// changed")
+        run_cli(monkeypatch, first, "--resume", "--journal", "j.db")
+        assert "Processed 1 cells" in capsys.readouterr().out
+
+    def test_resume_uses_default_journal(self, tmp_path, monkeypatch, capsys):
+        monkeypatch.chdir(tmp_path)
+        make_workbook(tmp_path / "in.xlsx")
+        run_cli(monkeypatch, "in.xlsx", "--resume")
+        run_cli(monkeypatch, "in.xlsx", "--resume")
+        assert "Skipped" in capsys.readouterr().out
+
+    def test_failed_input_does_not_stop_batch(self, tmp_path, monkeypatch, capsys):
+        monkeypatch.chdir(tmp_path)
+        make_workbook(tmp_path / "good.xlsx")
+        (tmp_path / "bad.xlsx").write_bytes(b"not a workbook")
+
+        with pytest.raises(SystemExit) as exc:
+            run_cli(monkeypatch, "bad.xlsx", "good.xlsx", "--journal", "j.db")
+        assert exc.value.code == 1
+        assert "Error: Failed to load workbook" in capsys.readouterr().err
+        assert (tmp_path / "good_output.xlsx").exists()
+        with Journal(str(tmp_path / "j.db")) as journal:
+            assert len(journal) == 1
+            assert journal.is_finished(
+                "good.xlsx", file_hash(tmp_path / "good.xlsx"), "good_output.xlsx"
+            )
+
+    def test_interrupt_not_counted_as_failure(self, tmp_path, monkeypatch):
+        """Only ProcessingError marks an input as failed."""
+        monkeypatch.chdir(tmp_path)
+        make_workbook(tmp_path / "good.xlsx")
+
+        def interrupted(*args, **kwargs):
+            raise KeyboardInterrupt
+
+        monkeypatch.setattr(cli, "_process_workbook", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            run_cli(monkeypatch, "good.xlsx")
+
+
+class TestAtomicSave:
+    """process_excel replaces its output only once the save completed."""
+
+    def test_failed_save_keeps_previous_output(self, tmp_path, monkeypatch):
+        input_path, output_path = tmp_path / "in.xlsx", tmp_path / "out.xlsx"
+        make_workbook(input_path)
+        output_path.write_bytes(b"previous")
+
+        def broken_save(wb, path, *args):
+            with open(path, "wb") as f:
+                f.write(b"partial")
+            raise OSError("disk full")
+
+        monkeypatch.setattr(processor, "save_workbook", broken_save)
+        with pytest.raises(SystemExit):
+            process_excel(str(input_path), str(output_path))
+
+        assert output_path.read_bytes() == b"previous"
+        assert sorted(os.listdir(tmp_path)) == ["in.xlsx", "out.xlsx"]
+
+    def test_save_leaves_no_temporary_files(self, tmp_path):
+        input_path, output_path = tmp_path / "in.xlsx", tmp_path / "out.xlsx"
+        make_workbook(input_path)
+        process_excel(str(input_path), str(output_path))
+
+        assert sorted(os.listdir(tmp_path)) == ["in.xlsx", "out.xlsx"]
+        assert openpyxl.load_workbook(output_path).active["A1"].value is not None
@@ -0,0 +1,187 @@
+"""Tests for multi-language classification and per-language lexing."""
+
+import random
+import sys
+
+import openpyxl
+import pytest
+from pygments.lexers import CSharpLexer, JavaLexer
+
+from benchmarks.synthetic import code_snippet, prose
+from cpp_highlight import cli
+from cpp_highlight.core import CellHighlighter, is_cpp_code
+from cpp_highlight.core.languages import LanguageClassifier, get_classifier
+from cpp_highlight.models import RunStats
+from cpp_highlight.processor import process_excel
+
+SNIPPETS = {
+    "cpp": '#include <iostream>\nint main() {\n  std::cout << "hi";\n}',
+    "c": (
+        "#include <stdio.h>\n#include <stdlib.h>\nint main(void) {\n"
+        '  char *p = malloc(4);\n  printf("%s", p);\n  free(p);\n}'
+    ),
+    "java": (
+        "public class Hello {\n  public static void main(String[] args) {\n"
+        '    System.out.println("hi");\n  }\n}'
+    ),
+    "csharp": (
+        "using System;\nnamespace Demo.App {\n  class P {\n"
+        '    static void Main(string[] a) { Console.WriteLine("x"); }\n  }\n}'
+    ),
+    "shell": '#!/bin/bash\nfor f in *.txt; do\n  echo "$f"\ndone',
+}
+
+PROSE = [
+    "This is free (as in beer) and it extends beyond what we need.",
+    "done",
+    "Ask the owner; then review it.",
+    "",
+]
+
+
+def make_workbook(path):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for row, (language, code) in enumerate(sorted(SNIPPETS.items()), 1):
+        ws.cell(row=row, column=1, value=code)
+        ws.cell(row=row, column=2, value=language)
+    ws.title = "Mixed"
+    other = wb.create_sheet("More")
+    other["A1"] = "class Dog extends Animal {\n  @Override\n  void bark() {}\n}"
+    other["A2"] = "if [ -f x ]; then\n  rm x\nfi"
+    wb.save(path)
+
+
+class TestClassifier:
+    """LanguageClassifier decisions."""
+
+    @pytest.mark.parametrize("language", sorted(SNIPPETS))
+    def test_snippets(self, language):
+        assert get_classifier().classify(SNIPPETS[language]) == language
+
+    @pytest.mark.parametrize("text", PROSE)
+    def test_prose(self, text):
+        assert get_classifier().classify(text) is None
+
+    def test_cpp_matches_is_cpp_code(self):
+        """C++ alone decides like is_cpp_code; with more languages, no cell
+        is_cpp_code detects is lost."""
+        cpp_only = LanguageClassifier(["cpp"])
+        everything = get_classifier()
+        rng = random.Random(7)
+        texts = [code_snippet(rng, rng.randint(1, 8)) for _ in range(300)]
+        texts += [prose(rng, rng.randint(1, 40)) for _ in range(300)] + PROSE
+        texts += list(SNIPPETS.values())
+        for text in texts:
+            detected = is_cpp_code(text)
+            assert (cpp_only.classify(text) is not None) == detected, text
+            if detected:
+                assert everything.classify(text) is not None, text
+
+    def test_selection(self):
+        classifier = LanguageClassifier(["shell", "java"])
+        assert classifier.names == ("java", "shell")
+        assert classifier.classify(SNIPPETS["cpp"]) is None
+        assert set(classifier.scores(SNIPPETS["shell"])) == {"java", "shell"}
+        with pytest.raises(ValueError):
+            LanguageClassifier(["cobol"])
+
+
+class TestLexerRegistry:
+    """Per-language lexers of a highlighter."""
+
+    def test_lexers_cached(self):
+        highlighter = CellHighlighter()
+        java = highlighter._lexers_for("java")
+        assert isinstance(java[0], JavaLexer)
+        assert highlighter._lexers_for("java") is java
+        assert highlighter._lexers_for(None)[0] is highlighter.lexer
+
+    def test_same_as_dedicated_lexer(self):
+        highlighter = CellHighlighter()
+        dedicated = CellHighlighter(lexer=CSharpLexer)
+        runs, height = highlighter.highlight_runs(SNIPPETS["csharp"], "A1", "csharp")
+        expected, expected_height = dedicated.highlight_runs(SNIPPETS["csharp"])
+        assert str(highlighter.materialize(runs)) == str(
+            dedicated.materialize(expected)
+        )
+        assert [block.font.color.rgb for block in highlighter.materialize(runs)] == [
+            block.font.color.rgb for block in dedicated.materialize(expected)
+        ]
+        assert height == expected_height
+
+
+class TestProcessing:
+    """process_excel with languages."""
+
+    @pytest.mark.parametrize(
+        "options", [{}, {"jobs": 2}, {"threads": 2}, {"jobs": 2, "per_sheet": True}]
+    )
+    def test_each_cell_lexed_once(self, tmp_path, monkeypatch, options):
+        input_path = tmp_path / "in.xlsx"
+        make_workbook(input_path)
+        lexed = []
+        token_stream = CellHighlighter._token_stream
+
+        def spy(self, text, location, language=None):
+            lexed.append((location, language))
+            return token_stream(self, text, location, language)
+
+        monkeypatch.setattr(CellHighlighter, "_token_stream", spy)
+        stats = RunStats()
+        count = process_excel(
+            str(input_path),
+            str(tmp_path / "out.xlsx"),
+            stats=stats,
+            languages=["cpp", "c", "java", "csharp", "shell"],
+            **options,
+        )
+
+        assert count == 7
+        assert stats.cells_by_language == {
+            "cpp": 1,
+            "c": 1,
+            "java": 2,
+            "csharp": 1,
+            "shell": 2,
+        }
+        if not options:
+            assert sorted(lexed) == [
+                ("Mixed!A1", "c"),
+                ("Mixed!A2", "cpp"),
+                ("Mixed!A3", "csharp"),
+                ("Mixed!A4", "java"),
+                ("Mixed!A5", "shell"),
+                ("More!A1", "java"),
+                ("More!A2", "shell"),
+            ]
+        ws = openpyxl.load_workbook(tmp_path / "out.xlsx", rich_text=True)["Mixed"]
+        assert ws["B1"].value == "c"
+
+    def test_default_is_cpp_only(self, tmp_path):
+        input_path = tmp_path / "in.xlsx"
+        make_workbook(input_path)
+        stats = RunStats()
+        count = process_excel(str(input_path), str(tmp_path / "out.xlsx"), stats=stats)
+        assert count == 3
+        assert stats.cells_by_language == {}
+
+    def test_cli(self, tmp_path, monkeypatch, capsys):
+        input_path = tmp_path / "in.xlsx"
+        make_workbook(input_path)
+        argv = ["cpp_highlight", str(input_path), "--languages", "java,shell"]
+        monkeypatch.setattr(sys, "argv", argv)
+        cli.main()
+        out = capsys.readouterr().out
+        assert "Processed 4 cells with code" in out
+        assert "Languages: java 2, shell 2" in out
+
+        monkeypatch.setattr(sys, "argv", argv[:2] + ["--languages", "cobol"])
+        with pytest.raises(SystemExit):
+            cli.main()
+        assert "unknown language cobol" in capsys.readouterr().err
+
+        monkeypatch.setattr(sys, "argv", argv + ["--batch-detect"])
+        with pytest.raises(SystemExit):
+            cli.main()
+        assert "cannot be combined" in capsys.readouterr().err
@@ -0,0 +1,100 @@
+"""Tests for width-aware row heights."""
+
+import random
+import sys
+
+import openpyxl
+import pytest
+
+from cpp_highlight.config import FontSettings
+from cpp_highlight.core.layout import (
+    MAX_ROW_HEIGHT,
+    chars_per_line,
+    column_widths,
+    estimate_heights,
+    text_width,
+    wrapped_line_counts,
+)
+from cpp_highlight.processor import process_excel
+
+
+class TestWrapping:
+    """Line widths and wrapped line counts."""
+
+    def test_chars_per_line(self):
+        assert chars_per_line(8.43) == 7
+        assert chars_per_line(100) == 86
+        assert chars_per_line(100, FontSettings(size=22)) == 43
+        assert chars_per_line(100, FontSettings(name="Unknown Mono")) == 79
+        assert chars_per_line(0.5) == 1
+
+    def test_text_width(self):
+        assert text_width("int x;") == 6
+        assert text_width("名前 = 1") == 8
+        assert text_width("é") == 1
+
+    @pytest.mark.parametrize(
+        "text, limit, lines",
+        [
+            ("int x = 1;", 10, 1),
+            ("int x = 1;", 7, 2),
+            ("a\nb\n\nc", 1, 4),
+            ("x" * 25, 10, 3),
+            ("    return value;", 12, 2),
+            ("f(a, b);   ", 8, 1),
+            ("名前名前名前", 10, 2),
+        ],
+    )
+    def test_counts(self, text, limit, lines):
+        assert wrapped_line_counts([text], [limit]) == [lines]
+
+    def test_without_numpy(self, monkeypatch):
+        """The plain Python pass counts the same lines."""
+        rng = random.Random(3)
+        alphabet = "int x = y;  // é名\n(){}" + "abc" * 5
+        texts = [
+            "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 200)))
+            for _ in range(200)
+        ]
+        limits = [rng.randint(1, 40) for _ in texts]
+        vectorized = wrapped_line_counts(texts, limits)
+        monkeypatch.setitem(sys.modules, "numpy", None)
+        assert wrapped_line_counts(texts, limits) == vectorized
+        assert wrapped_line_counts([], []) == []
+
+    def test_heights_capped(self):
+        heights = estimate_heights(["x", "x\ny", "\n" * 100], [10, 10, 10])
+        assert heights == [16.0, 32.0, MAX_ROW_HEIGHT]
+
+
+class TestRowHeights:
+    """Row heights set by process_excel."""
+
+    def test_column_widths(self, tmp_path):
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.column_dimensions["B"].width = 30
+        ws.column_dimensions.group("D", "F", hidden=False)
+        ws.column_dimensions["D"].width = 12
+        wb.save(tmp_path / "in.xlsx")
+
+        assert column_widths(ws)[2] == 30
+        loaded = openpyxl.load_workbook(tmp_path / "in.xlsx").active
+        widths = column_widths(loaded)
+        assert widths[2] == 30
+        assert widths[4] == widths[5] == widths[6] == 12
+
+    def test_narrow_columns_grow_rows(self, tmp_path):
+        code = "int total = compute(first_value, second_value);  // sum\nreturn 0;"
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.column_dimensions["A"].width = 100
+        ws["A1"] = ws["B2"] = code
+        ws["A3"] = "int x;\n" * 40
+        wb.save(tmp_path / "in.xlsx")
+        process_excel(str(tmp_path / "in.xlsx"), str(tmp_path / "out.xlsx"))
+
+        rows = openpyxl.load_workbook(tmp_path / "out.xlsx").active.row_dimensions
+        assert rows[1].height == 32.0
+        assert rows[2].height == 16.0 + 9 * 16.0
+        assert rows[3].height == MAX_ROW_HEIGHT
@@ -0,0 +1,186 @@
+"""Tests for the --max-memory budget and --memory-report."""
+
+import sys
+import tracemalloc
+import zipfile
+
+import openpyxl
+import pytest
+
+from cpp_highlight import cli, memory
+from cpp_highlight.core import CellHighlighter
+from cpp_highlight.memory import MemoryBudget, MemoryReport, parse_size
+from cpp_highlight.models import RunStats
+from cpp_highlight.processor import process_excel
+from cpp_highlight.writer import SpooledRows, render_rows, save_workbook
+
+
+def make_workbook(path, sheets=3, rows=40):
+    wb = openpyxl.Workbook()
+    for k in range(sheets):
+        ws = wb.active if k == 0 else wb.create_sheet(f"Sheet{k}")
+        for row in range(1, rows + 1):
+            code = f"#include <map>\nint f{row}() {{\n  return {row} * {k};\n}}"
+            ws.cell(row=row, column=1, value=code)
+            ws.cell(row=row, column=2, value=f"note {row}")
+    wb.worksheets[1]["B2"].hyperlink = "https://example.com/"
+    wb.save(path)
+
+
+def parts(path):
+    with zipfile.ZipFile(path) as z:
+        return {name: z.read(name) for name in z.namelist() if "core" not in name}
+
+
+class TestBudget:
+    """parse_size and MemoryBudget."""
+
+    def test_parse_size(self):
+        assert parse_size("1024") == 1024
+        assert parse_size("512M") == 512 << 20
+        assert parse_size("1.5GB") == 3 << 29
+        assert parse_size("2 GiB") == 2 << 30
+        with pytest.raises(ValueError):
+            parse_size("lots")
+
+    def test_relief_needs_growth(self, monkeypatch):
+        rss = [70 << 20]
+        monkeypatch.setattr(memory, "current_rss", lambda: rss[0])
+        budget = MemoryBudget(100 << 20)
+        assert not budget.needs_relief()
+        rss[0] = 85 << 20
+        assert budget.needs_relief()
+        assert not budget.needs_relief()
+        rss[0] = 95 << 20
+        assert budget.needs_relief()
+        assert budget.relieved == budget.stats.memory_relieved == 2
+        assert budget.peak == 95 << 20
+
+    def test_pending_without_rss(self, monkeypatch):
+        monkeypatch.setattr(memory, "current_rss", lambda: None)
+        budget = MemoryBudget(1000)
+        budget.pending = 900
+        assert budget.used() == 900
+        assert budget.needs_relief()
+
+
+class TestSpooling:
+    """Worksheets moved to disk before the save."""
+
+    def test_spooled_rows_match_render(self):
+        wb = openpyxl.Workbook()
+        highlighter = CellHighlighter()
+        for row in range(1, 30):
+            runs, _ = highlighter.highlight_runs(f"int x{row} = 'é'; // ü€")
+            wb.active.cell(row=row, column=1, value=highlighter.defer(runs))
+        spooled = SpooledRows(wb.active)
+        markup = []
+        spooled.write_to(markup.append)
+        spooled.close()
+        assert "".join(markup) == render_rows(wb.active)
+
+    @pytest.mark.parametrize("jobs", [1, 2])
+    def test_output_unchanged(self, tmp_path, monkeypatch, jobs):
+        input_path = tmp_path / "in.xlsx"
+        make_workbook(input_path)
+        process_excel(str(input_path), str(tmp_path / "plain.xlsx"), jobs=jobs)
+
+        # Memory grows past the limit with every check
+        rss = iter(range(1 << 30, 1 << 40, 1 << 28))
+        monkeypatch.setattr(memory, "current_rss", lambda: next(rss))
+        stats = RunStats()
+        count = process_excel(
+            str(input_path),
+            str(tmp_path / "budget.xlsx"),
+            jobs=jobs,
+            stats=stats,
+            max_memory=1 << 30,
+        )
+
+        assert count == 120
+        assert stats.sheets_spooled == 3
+        assert stats.memory_relieved >= 3
+        assert parts(tmp_path / "budget.xlsx") == parts(tmp_path / "plain.xlsx")
+
+    def test_spooled_without_openpyxl_stream(self, tmp_path, monkeypatch):
+        """Spooling does not depend on openpyxl's (possibly lxml) stream."""
+        from openpyxl.worksheet import _writer as worksheet_writer
+
+        def xmlfile(out):
+            raise AssertionError("openpyxl's stream used")
+
+        input_path = tmp_path / "in.xlsx"
+        make_workbook(input_path)
+        monkeypatch.setattr(worksheet_writer, "xmlfile", xmlfile)
+        rss = iter(range(1 << 30, 1 << 40, 1 << 28))
+        monkeypatch.setattr(memory, "current_rss", lambda: next(rss))
+        stats = RunStats()
+        process_excel(
+            str(input_path),
+            str(tmp_path / "out.xlsx"),
+            stats=stats,
+            max_memory=1 << 30,
+        )
+        assert stats.sheets_spooled == 3
+
+
+class TestMemoryReport:
+    """Per-phase memory reports."""
+
+    def test_phases(self, tmp_path):
+        input_path = tmp_path / "in.xlsx"
+        make_workbook(input_path)
+        with MemoryReport(top=3) as report:
+            count = process_excel(
+                str(input_path), str(tmp_path / "out.xlsx"), memory_report=report
+            )
+        assert not tracemalloc.is_tracing()
+
+        assert count == report.cells == 120
+        assert set(report.peak) == set(report.growth) == set(MemoryReport.PHASES)
+        assert all(peak > 0 for peak in report.peak.values())
+        assert report.bytes_per_cell() == report.growth["highlight"] / 120
+        # The cells of the workbook are allocated while loading
+        assert any("openpyxl" in site for site in report.sites["load"])
+        lines = report.format()
+        assert lines[0].startswith("Memory report")
+        assert any(line.startswith("  Per highlighted cell:") for line in lines)
+        # At most three sites per phase
+        sites = [line for line in lines if line.startswith("    ")]
+        assert 0 < len(sites) <= 3 * len(MemoryReport.PHASES)
+
+    def test_tracing_left_on(self):
+        tracemalloc.start()
+        try:
+            with MemoryReport() as report:
+                with report.phase("load"):
+                    data = [bytearray(1 << 16) for _ in range(4)]
+            assert tracemalloc.is_tracing()
+        finally:
+            tracemalloc.stop()
+        assert report.growth["load"] >= len(data) << 16
+        assert report.peak["load"] >= len(data) << 16
+
+    def test_save_checkpoint(self, tmp_path):
+        highlighter = CellHighlighter()
+        wb = openpyxl.Workbook()
+        runs, _ = highlighter.highlight_runs("int x = 1;")
+        wb.active["A1"] = highlighter.defer(runs)
+        calls = []
+        save_workbook(wb, str(tmp_path / "plain.xlsx"))
+        save_workbook(
+            wb, str(tmp_path / "checked.xlsx"), checkpoint=lambda: calls.append(1)
+        )
+        assert calls == [1]
+        assert parts(tmp_path / "checked.xlsx") == parts(tmp_path / "plain.xlsx")
+
+    def test_cli(self, tmp_path, monkeypatch, capsys):
+        input_path = tmp_path / "in.xlsx"
+        make_workbook(input_path, sheets=2, rows=5)
+        argv = ["cpp_highlight", str(input_path), "--memory-report"]
+        monkeypatch.setattr(sys, "argv", argv)
+        cli.main()
+        out = capsys.readouterr().out
+        assert "Memory report" in out
+        assert "Per highlighted cell" in out
+        assert "Processed 10 cells" in out
@@ -0,0 +1,120 @@
+"""Tests for run metrics."""
+
+import json
+
+import pytest
+
+from cpp_highlight import cli
+from cpp_highlight.metrics import format_prometheus, write_metrics
+from cpp_highlight.models import RunStats
+from cpp_highlight.models.stats import Histogram
+from cpp_highlight.processor import process_excel
+
+
+@pytest.fixture
+def processed_stats(tmp_path, sample_cpp_code):
+    """Stats of processing a small workbook."""
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    wb.active["A1"] = sample_cpp_code
+    wb.active["A2"] = "Just a note"
+    wb.active["A3"] = "int x = 1; int y = 2; int z = 3;"
+    input_path = tmp_path / "input.xlsx"
+    wb.save(input_path)
+
+    stats = RunStats()
+    process_excel(str(input_path), str(tmp_path / "output.xlsx"), stats=stats)
+    return stats
+
+
+class TestHistogram:
+    """Bucketed durations."""
+
+    def test_observe_and_merge(self):
+        a = Histogram(buckets=(0.1, 1.0))
+        a.observe(0.05)
+        a.observe(1.0)
+        b = Histogram(buckets=(0.1, 1.0))
+        b.observe(5.0)
+        a.merge(b)
+        assert a.counts == [1, 1, 1]
+        assert a.count == 3
+        assert a.total == pytest.approx(6.05)
+
+    def test_merge_different_buckets(self):
+        with pytest.raises(ValueError):
+            Histogram(buckets=(1.0,)).merge(Histogram(buckets=(2.0,)))
+
+
+class TestRunMetrics:
+    """Instrumentation of process_excel and CellHighlighter."""
+
+    def test_counters(self, processed_stats):
+        stats = processed_stats
+        assert stats.files_processed == 1
+        assert stats.cells_scanned == 3
+        assert stats.cells_highlighted == 2
+        assert stats.lex_seconds.count == 2
+        assert stats.detect_seconds.count == 1
+        assert 0 < stats.cache_hit_rate("font") < 1
+        assert stats.cache_hit_rate("rpr") is not None
+
+    def test_prometheus(self, processed_stats, tmp_path):
+        path = tmp_path / "cpp_highlight.prom"
+        write_metrics(processed_stats, str(path))
+        text = path.read_text()
+
+        assert "cpp_highlight_cells_highlighted_total 2\n" in text
+        assert 'cpp_highlight_lex_seconds_bucket{le="+Inf"} 2\n' in text
+        assert "cpp_highlight_lex_seconds_count 2\n" in text
+        assert 'cpp_highlight_cache_hits_total{cache="font"}' in text
+        assert not list(tmp_path.glob("*.tmp"))
+
+    def test_prometheus_buckets_cumulative(self):
+        stats = RunStats()
+        for value in (0.0001, 0.003, 20.0):
+            stats.lex_seconds.observe(value)
+        lines = format_prometheus(stats).splitlines()
+        buckets = [
+            int(line.rsplit(" ", 1)[1])
+            for line in lines
+            if line.startswith("cpp_highlight_lex_seconds_bucket")
+        ]
+        assert buckets == sorted(buckets)
+        assert buckets[0] == 1
+        assert buckets[-2:] == [2, 3]
+
+    def test_jsonl_appends_events(self, processed_stats, tmp_path):
+        path = tmp_path / "metrics.jsonl"
+        write_metrics(processed_stats, str(path), "jsonl", input="a.xlsx")
+        write_metrics(processed_stats, str(path), "jsonl", input="b.xlsx")
+
+        events = [json.loads(line) for line in path.read_text().splitlines()]
+        assert [e["input"] for e in events] == ["a.xlsx", "b.xlsx"]
+        assert events[0]["event"] == "run"
+        assert events[0]["cells_highlighted"] == 2
+        assert events[0]["lex_seconds"]["count"] == 2
+        assert "font" in events[0]["cache_hit_rate"]
+
+    @pytest.mark.parametrize("fmt", ["prometheus", "jsonl"])
+    def test_cli_metrics_cover_all_inputs(self, tmp_path, sample_cpp_code, fmt):
+        from openpyxl import Workbook
+
+        inputs = []
+        for name in ("a.xlsx", "b.xlsx"):
+            wb = Workbook()
+            wb.active["A1"] = sample_cpp_code
+            wb.save(tmp_path / name)
+            inputs.append(str(tmp_path / name))
+        path = tmp_path / "metrics"
+        cli.main(inputs + ["--metrics", str(path), "--metrics-format", fmt])
+
+        if fmt == "prometheus":
+            text = path.read_text()
+            assert "cpp_highlight_files_processed_total 2\n" in text
+            assert "cpp_highlight_cells_highlighted_total 2\n" in text
+        else:
+            events = [json.loads(line) for line in path.read_text().splitlines()]
+            assert [e["input"] for e in events] == inputs
+            assert [e["files_processed"] for e in events] == [1, 1]
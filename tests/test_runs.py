@@ -0,0 +1,158 @@
+"""Tests for compact color runs."""
+
+import copy
+import pickle
+
+import pytest
+from openpyxl.cell.rich_text import CellRichText
+
+from cpp_highlight.config import BudgetSettings
+from cpp_highlight.core import CellHighlighter
+from cpp_highlight.models import ColorRuns
+
+
+class TestColorRuns:
+    """highlight_runs and its materializers against highlight."""
+
+    @pytest.mark.parametrize("text", ["int x;", "  a\n\tb  ", "", "x\r\n/* c */"])
+    def test_materialized_matches_highlight(self, text, sample_cpp_code):
+        highlighter = CellHighlighter()
+        for cell in (text, sample_cpp_code):
+            rich_text, height = highlighter.highlight(cell)
+            runs, runs_height = highlighter.highlight_runs(cell)
+
+            assert runs_height == height
+            assert highlighter.materialize(runs) == rich_text
+            assert highlighter.runs_xml(runs) == "".join(
+                block.to_xml() for block in rich_text
+            )
+
+    def test_runs_cover_text(self, sample_cpp_code):
+        runs, _ = CellHighlighter().highlight_runs(sample_cpp_code)
+        assert "".join(value for _, value in runs) == runs.text
+        assert runs.text == sample_cpp_code
+        assert len(runs) == len(runs.colors) == len(runs.lengths)
+
+    def test_other_highlighter_materializes(self, sample_cpp_code):
+        """Runs carry their palette, so any highlighter can build them."""
+        worker, parent = CellHighlighter(), CellHighlighter()
+        parent.highlight_runs("// comment first")
+        runs, _ = worker.highlight_runs(sample_cpp_code)
+        runs = pickle.loads(pickle.dumps(runs))
+
+        assert parent.materialize(runs) == worker.highlight(sample_cpp_code)[0]
+
+    def test_pickles_smaller(self, sample_cpp_code):
+        """A batch of runs pickles to well under half of its rich text."""
+        highlighter = CellHighlighter()
+        cells = [f"{sample_cpp_code}\n// cell {k}" for k in range(64)]
+        rich_texts = [highlighter.highlight(cell)[0] for cell in cells]
+        runs = [highlighter.highlight_runs(cell)[0] for cell in cells]
+        assert len(pickle.dumps(runs)) * 2 < len(pickle.dumps(rich_texts))
+
+    def test_budget_fallback(self):
+        highlighter = CellHighlighter(
+            budget=BudgetSettings(max_chars=10, oversize="plain")
+        )
+        text = "int x = 1;\nint y = 2;"
+        runs, _ = highlighter.highlight_runs(text)
+        assert isinstance(runs, ColorRuns)
+        assert len(runs) == 1 and runs.text == text
+        assert highlighter.materialize(runs) == highlighter.highlight(text)[0]
+
+
+class TestLazyRichText:
+    """Deferred cell values built from color runs."""
+
+    def test_saved_like_rich_text(self, tmp_path, sample_cpp_code):
+        """A deferred cell is written exactly like its rich text."""
+        import zipfile
+
+        from openpyxl import Workbook
+
+        from cpp_highlight.writer import save_workbook
+
+        highlighter = CellHighlighter()
+        paths = []
+        for mode in ("eager", "deferred"):
+            wb = Workbook()
+            for row, text in enumerate([sample_cpp_code, "  x\n", ""], 1):
+                if mode == "eager":
+                    value = highlighter.highlight(text)[0]
+                else:
+                    value = highlighter.defer(highlighter.highlight_runs(text)[0])
+                wb.active.cell(row, 1, value)
+            paths.append(tmp_path / f"{mode}.xlsx")
+            save_workbook(wb, paths[-1])
+
+        sheet = "xl/worksheets/sheet1.xml"
+        with zipfile.ZipFile(paths[0]) as a, zipfile.ZipFile(paths[1]) as b:
+            assert a.read(sheet) == b.read(sheet)
+
+    def test_not_materialized_until_read(self, sample_cpp_code):
+        highlighter = CellHighlighter()
+        runs, _ = highlighter.highlight_runs(sample_cpp_code)
+        value = highlighter.defer(runs)
+
+        assert str(value) == sample_cpp_code
+        assert len(value) == len(runs)
+        assert not value.materialized
+        assert value == highlighter.highlight(sample_cpp_code)[0]
+        assert value.materialized
+
+    def test_edits_after_materializing(self):
+        from openpyxl.cell.rich_text import TextBlock
+
+        highlighter = CellHighlighter()
+        value = highlighter.defer(highlighter.highlight_runs("int x;")[0])
+        value.append(TextBlock(value[0].font, " // added"))
+
+        assert str(value) == "int x; // added"
+        assert len(value) == len(highlighter.highlight("int x;")[0]) + 1
+
+    @pytest.mark.parametrize(
+        "use",
+        [
+            lambda v: v.pop(),
+            lambda v: v.pop(0),
+            lambda v: v.index(v[-1]),
+            lambda v: v.count(v[0]),
+            lambda v: v[0] in v,
+            lambda v: list(reversed(v)),
+            lambda v: v.copy(),
+            lambda v: v + [],
+            lambda v: [] + v,
+            lambda v: v * 2,
+            lambda v: v < [],
+            lambda v: copy.copy(v),
+            lambda v: pickle.loads(pickle.dumps(v)),
+        ],
+    )
+    def test_list_methods_materialize(self, use):
+        highlighter = CellHighlighter()
+        expected = highlighter.highlight("int x = 1;")[0]
+        value = highlighter.defer(highlighter.highlight_runs("int x = 1;")[0])
+        eager = CellRichText(list(expected))
+
+        assert use(value) == use(eager)
+        assert value.materialized
+        assert list(value) == list(eager)
+
+    def test_edits_not_lost(self):
+        from openpyxl.cell.rich_text import TextBlock
+
+        highlighter = CellHighlighter()
+        expected = list(highlighter.highlight("int x;")[0])
+
+        value = highlighter.defer(highlighter.highlight_runs("int x;")[0])
+        value.insert(0, TextBlock(expected[0].font, "// a\n"))
+        assert str(value) == "// a\nint x;"
+
+        value = highlighter.defer(highlighter.highlight_runs("int x;")[0])
+        value.remove(value[0])
+        del value[0]
+        assert list(value) == expected[2:]
+
+        value = highlighter.defer(highlighter.highlight_runs("int x;")[0])
+        value.clear()
+        assert len(value) == 0 and str(value) == ""
@@ -0,0 +1,131 @@
+"""Tests for the linear-time Aho-Corasick detection backend."""
+
+import random
+import re
+import time
+
+import pytest
+
+
+def _regex_counts(text):
+    """Count matches the way the regex path of is_cpp_code does."""
+    from cpp_highlight.core.detection import C_DETECTORS_HIGH, C_DETECTORS_MEDIUM
+
+    high = sum(len(re.findall(p, text, re.MULTILINE)) for p in C_DETECTORS_HIGH)
+    medium = sum(len(re.findall(p, text, re.MULTILINE)) for p in C_DETECTORS_MEDIUM)
+    return high, medium
+
+
+class TestAhoCorasick:
+    """Tests for the keyword automaton."""
+
+    def test_reports_overlapping_matches(self):
+        """Overlapping and nested keywords are all reported."""
+        from cpp_highlight.core.scanner import AhoCorasick
+
+        automaton = AhoCorasick(["he", "she", "his", "hers"])
+        matches = sorted(
+            (start, automaton.words[i]) for start, i in automaton.iter_matches("ushers")
+        )
+        assert matches == [(1, "she"), (2, "he"), (2, "hers")]
+
+    def test_empty_keyword_rejected(self):
+        """Empty keywords are rejected."""
+        from cpp_highlight.core.scanner import AhoCorasick
+
+        with pytest.raises(ValueError):
+            AhoCorasick(["int", ""])
+
+
+class TestScanDetectorEquivalence:
+    """The scan backend must count exactly what the regex patterns count."""
+
+    FRAGMENTS = [
+        "int", "main", "(", ")", " ", "\n", "\t", "\r", "\x0b", "::", "std::",
+        "#", "include", "<", ">", '"', "using", "namespace", "x", "_", "class",
+        "struct", "enum", "public", ":", "private", "define", "pragma", "for",
+        "if", "cout", "string", "map", "/", "*", "/*", "*/", "//", "template",
+        "const", "constexpr", "a1", "é",
+    ]
+
+    def test_counts_match_regex_on_random_fragments(self):
+        """Random code-like strings produce identical counts."""
+        from cpp_highlight.core.scanner import ScanDetector
+
+        detector = ScanDetector()
+        rng = random.Random(1234)
+        for _ in range(5000):
+            text = "".join(
+                rng.choice(self.FRAGMENTS) for _ in range(rng.randint(0, 40))
+            )
+            assert detector.count(text) == _regex_counts(text), repr(text)
+
+    def test_decisions_match_regex_path(self, sample_cpp_code):
+        """Default is_cpp_code decisions equal the explicit-pattern path."""
+        from cpp_highlight.core.detection import (
+            C_DETECTORS_HIGH,
+            C_DETECTORS_MEDIUM,
+            is_cpp_code,
+        )
+
+        samples = [
+            sample_cpp_code,
+            "int x; int y",
+            "int x; int y; " + "x" * 100,
+            "  public:\n  private:\n  protected:",
+            "#\n  #define X\n#pragma once",
+            "/* one */ /* two\n */ /* three */",
+            "Hello, this is just plain text.",
+        ]
+        for text in samples:
+            assert is_cpp_code(text) == is_cpp_code(
+                text, C_DETECTORS_HIGH, C_DETECTORS_MEDIUM
+            ), repr(text)
+
+    def test_block_comment_must_close_on_same_line(self):
+        """Block comments spanning lines do not count, as in the regex path."""
+        from cpp_highlight.core.scanner import ScanDetector
+
+        detector = ScanDetector()
+        assert detector.count("/* a */")[1] == 1
+        assert detector.count("/* a\n */")[1] == 0
+        assert detector.count("/*\n/* a */")[1] == 1
+
+
+class TestScanDetectorLinearTime:
+    """1 MB adversarial inputs must be scanned in linear time."""
+
+    SIZE = 1 << 20
+    TIME_LIMIT = 5.0
+
+    @pytest.mark.parametrize(
+        "text",
+        [
+            "/* " * (SIZE // 3),
+            "/*\n" * (SIZE // 3) + "*/",
+            "\n" * SIZE,
+            " \t\n" * (SIZE // 3) + "public",
+            "#" * SIZE,
+            "::" + "a" * SIZE,
+            "int " * (SIZE // 4),
+            "2024-01-01 12:00:00 INFO worker /* id=42 path=/a/b\n" * (SIZE // 50),
+        ],
+        ids=[
+            "unclosed-comments",
+            "comments-split-by-newlines",
+            "newlines",
+            "whitespace-lines",
+            "hashes",
+            "long-identifier",
+            "keywords",
+            "log-dump",
+        ],
+    )
+    def test_pathological_input(self, text):
+        """Detection finishes well within the time bound."""
+        from cpp_highlight.core.scanner import ScanDetector
+
+        detector = ScanDetector()
+        start = time.perf_counter()
+        detector.count(text)
+        assert time.perf_counter() - start < self.TIME_LIMIT
@@ -0,0 +1,61 @@
+"""Tests for cost-aware batching."""
+
+from cpp_highlight.core import CellHighlighter
+from cpp_highlight.models import RunStats
+from cpp_highlight.parallel import HighlightPool, HighlightThreads
+from cpp_highlight.scheduler import estimate_cost, plan_batches
+
+
+def skewed(count=60, big=(7, 31)):
+    items = []
+    for row in range(count):
+        lines = 400 if row in big else 2
+        code = "\n".join(f"int v{row}_{k} = {k};" for k in range(lines))
+        items.append((f"Sheet!A{row}", code))
+    return items
+
+
+class TestPlanBatches:
+    """plan_batches ordering and packing."""
+
+    def test_cost_counts_lines(self):
+        assert estimate_cost("a" * 100) < estimate_cost("a\n" * 50)
+
+    def test_every_item_once(self):
+        items = skewed()
+        batches = plan_batches(items, 4, 64)
+        assert sorted(i for batch in batches for i in batch) == list(range(60))
+
+    def test_largest_first_and_alone(self):
+        batches = plan_batches(skewed(), 4, 64)
+        assert sorted(batches[:2]) == [[7], [31]]
+        costs = [sum(estimate_cost(skewed()[i][1]) for i in b) for b in batches]
+        assert max(costs[2:]) <= costs[1]
+
+    def test_max_items(self):
+        items = [(f"A{row}", "x") for row in range(100)]
+        batches = plan_batches(items, 1, 8)
+        assert max(len(batch) for batch in batches) == 8
+        assert plan_batches([], 4, 8) == []
+
+
+class TestUtilization:
+    """Pools keep result order and report worker utilization."""
+
+    def test_pool(self):
+        items = skewed()
+        expected = [CellHighlighter().highlight_runs(t, loc) for loc, t in items]
+        stats = RunStats()
+        with HighlightPool(CellHighlighter(), 2, stats=stats) as pool:
+            assert pool.highlight_runs(items) == expected
+        assert stats.worker_busy_seconds > 0
+        assert 0 < stats.worker_utilization() <= 1
+
+    def test_threads(self):
+        items = skewed()
+        expected = [CellHighlighter().highlight_runs(t, loc) for loc, t in items]
+        stats = RunStats()
+        with HighlightThreads(CellHighlighter(), 3, stats=stats) as threads:
+            assert threads.highlight_runs(items) == expected
+        assert 0 < stats.worker_utilization() <= 1
+        assert RunStats().worker_utilization() is None
@@ -0,0 +1,174 @@
+"""Tests for writing highlighted values once to the shared strings."""
+
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import openpyxl
+import pytest
+
+from cpp_highlight.core import CellHighlighter
+from cpp_highlight.models import RunStats
+from cpp_highlight.processor import process_excel
+from cpp_highlight.writer import SharedStrings, remap_string_ids, save_workbook
+from tests.test_writer import build_workbook
+
+CODE = '#include <a&b>\nint main() {\n  return "x<y>";\n}'
+
+
+def cell_values(path):
+    """Return (str(value), colors) of every cell of a workbook."""
+    wb = openpyxl.load_workbook(path, rich_text=True)
+    values = {}
+    for ws in wb.worksheets:
+        for row in ws.iter_rows():
+            for cell in row:
+                value = cell.value
+                colors = None
+                if not isinstance(value, (str, int, type(None))):
+                    colors = [
+                        getattr(block.font, "color", None) and block.font.color.rgb
+                        for block in value
+                        if not isinstance(block, str)
+                    ]
+                values[(ws.title, cell.coordinate)] = (str(value), colors)
+    return values
+
+
+def make_input(path, sheets=2, rows=20):
+    wb = openpyxl.Workbook()
+    for index in range(sheets):
+        ws = wb.active if index == 0 else wb.create_sheet()
+        for row in range(1, rows + 1):
+            ws.cell(row=row, column=1, value=CODE)
+            ws.cell(row=row, column=2, value=f"std::string v{row % 3} = {index};")
+            ws.cell(row=row, column=3, value="plain text")
+    wb.save(path)
+
+
+class TestSharedStrings:
+    """SharedStrings and the saved parts."""
+
+    def test_keys(self):
+        highlighter = CellHighlighter()
+        strings = SharedStrings()
+        lazy = highlighter.defer(highlighter.highlight_runs(CODE)[0])
+        again = highlighter.defer(highlighter.highlight_runs(CODE)[0])
+        assert strings.add_runs(lazy) == strings.add_runs(again) == 0
+        # Equal markup is one value however it was added
+        assert strings.add_markup(lazy.to_xml()) == 0
+        other = highlighter.defer(highlighter.highlight_runs("int x;")[0])
+        assert strings.add_runs(other) == 1
+        assert (len(strings), strings.count) == (2, 4)
+
+        merged = SharedStrings()
+        merged.add_markup(other.to_xml())
+        assert merged.merge(strings.items, strings.count) == {0: 1, 1: 0}
+        assert (len(merged), merged.count) == (2, 5)
+
+    def test_remap(self):
+        rows = '<c r="A1" t="s"><v>0</v></c><c r="B1" t="n"><v>0</v></c>'
+        assert remap_string_ids(rows, {0: 7}) == rows.replace(
+            't="s"><v>0', 't="s"><v>7'
+        )
+
+    def test_same_values(self, tmp_path):
+        """Only the way highlighted values are stored changes."""
+        highlighter = CellHighlighter()
+        save_workbook(build_workbook(highlighter), str(tmp_path / "inline.xlsx"))
+        stats = RunStats()
+        strings = SharedStrings()
+        save_workbook(
+            build_workbook(highlighter),
+            str(tmp_path / "shared.xlsx"),
+            stats=stats,
+            strings=strings,
+        )
+
+        assert cell_values(tmp_path / "shared.xlsx") == cell_values(
+            tmp_path / "inline.xlsx"
+        )
+        # Highlighted A1 and Other!A1 and the TextBlocks of B2
+        assert (stats.strings_shared, stats.strings_unique) == (3, 3)
+        with zipfile.ZipFile(tmp_path / "shared.xlsx") as archive:
+            rels = archive.read("xl/_rels/workbook.xml.rels").decode()
+            content_types = archive.read("[Content_Types].xml").decode()
+            sheet = archive.read("xl/worksheets/sheet1.xml").decode()
+        assert 'Target="sharedStrings.xml"' in rels
+        assert 'PartName="/xl/sharedStrings.xml"' in content_types
+        assert '<c r="A1" t="s"><v>0</v></c>' in sheet
+        # Rich text with openpyxl's own TextBlocks stays inline
+        assert '<c r="C3" t="inlineStr">' in sheet
+
+    def test_empty_table_left_out(self, tmp_path):
+        wb = openpyxl.Workbook()
+        wb.active["A1"] = "text"
+        save_workbook(wb, str(tmp_path / "out.xlsx"), strings=SharedStrings())
+        with zipfile.ZipFile(tmp_path / "out.xlsx") as archive:
+            assert "xl/sharedStrings.xml" not in archive.namelist()
+            assert "sharedStrings" not in archive.read(
+                "xl/_rels/workbook.xml.rels"
+            ).decode()
+
+    def test_concurrent_saves(self, tmp_path):
+        """Overlapping saves each write their own table, or none."""
+        highlighter = CellHighlighter()
+        save_workbook(build_workbook(highlighter), str(tmp_path / "inline.xlsx"))
+        expected = cell_values(tmp_path / "inline.xlsx")
+
+        def save(index):
+            path = str(tmp_path / f"out{index}.xlsx")
+            if index % 3 == 0:
+                # A plain openpyxl save in between
+                wb = openpyxl.Workbook()
+                wb.active["A1"] = "text"
+                wb.save(path)
+                return path
+            strings = SharedStrings() if index % 3 == 1 else None
+            save_workbook(build_workbook(highlighter), path, strings=strings)
+            return path
+
+        with ThreadPoolExecutor(4) as executor:
+            paths = list(executor.map(save, range(24)))
+
+        for index, path in enumerate(paths):
+            with zipfile.ZipFile(path) as archive:
+                rels = archive.read("xl/_rels/workbook.xml.rels").decode()
+                sheet = archive.read("xl/worksheets/sheet1.xml").decode()
+            assert ("sharedStrings" in rels) == (index % 3 == 1)
+            assert ('t="s"' in sheet) == (index % 3 == 1)
+            if index % 3:
+                assert cell_values(path) == expected
+
+
+class TestProcessing:
+    """process_excel with shared_strings."""
+
+    @pytest.mark.parametrize(
+        "options",
+        [{}, {"jobs": 2, "per_sheet": True}, {"max_memory": 1}, {"threads": 2}],
+    )
+    def test_duplicates_written_once(self, tmp_path, options):
+        input_path = tmp_path / "in.xlsx"
+        make_input(input_path)
+        process_excel(str(input_path), str(tmp_path / "inline.xlsx"), **options)
+        stats = RunStats()
+        count = process_excel(
+            str(input_path),
+            str(tmp_path / "shared.xlsx"),
+            stats=stats,
+            shared_strings=True,
+            **options,
+        )
+
+        assert count == 80
+        # CODE and three declarations per sheet
+        assert (stats.strings_shared, stats.strings_unique) == (80, 7)
+        assert cell_values(tmp_path / "shared.xlsx") == cell_values(
+            tmp_path / "inline.xlsx"
+        )
+        with zipfile.ZipFile(tmp_path / "shared.xlsx") as archive:
+            table = archive.read("xl/sharedStrings.xml").decode()
+        assert 'count="80" uniqueCount="7"' in table
+        assert (tmp_path / "shared.xlsx").stat().st_size < (
+            tmp_path / "inline.xlsx"
+        ).stat().st_size
@@ -0,0 +1,116 @@
+"""Tests for per-sheet parallel processing."""
+
+import sys
+import zipfile
+
+import pytest
+from openpyxl import Workbook
+from openpyxl.comments import Comment
+from openpyxl.styles import Alignment, Font, PatternFill
+
+from cpp_highlight.processor import process_excel
+from cpp_highlight.writer import merge_styles, style_contributions, style_snapshot
+
+
+def make_workbook(path, sheets=4):
+    """Workbook with code, styles, number formats, links and comments."""
+    wb = Workbook()
+    for k in range(sheets):
+        ws = wb.active if k == 0 else wb.create_sheet(f"S{k}")
+        for r in range(1, 20):
+            code = (r + k) % 3
+            ws.cell(r, 1, f"int x = {r}; int y; int z;" if code else "plain note")
+            ws.cell(r, 2, r * 1.5)
+        ws["B2"].number_format = "0.000%" if k % 2 else "#,##0.0000"
+        ws["A3"].font = Font(bold=True) if k == 2 else Font(italic=True)
+        ws["A4"].fill = PatternFill("solid", fgColor="FFFF00")
+        ws["A5"].hyperlink = f"http://example.com/{k}"
+        ws["A6"].comment = Comment(f"note {k}", "author")
+        ws.row_dimensions[7].height = 40
+    wb.save(path)
+
+
+class TestPerSheet:
+    """process_excel(per_sheet=True) against serial processing."""
+
+    def test_output_identical(self, tmp_path):
+        """Every part except the save timestamp matches serial output."""
+        input_path = tmp_path / "input.xlsx"
+        make_workbook(input_path)
+
+        serial = process_excel(str(input_path), str(tmp_path / "serial.xlsx"))
+        sheets = process_excel(
+            str(input_path), str(tmp_path / "sheets.xlsx"), jobs=2, per_sheet=True
+        )
+
+        assert serial == sheets
+        with zipfile.ZipFile(tmp_path / "serial.xlsx") as a, zipfile.ZipFile(
+            tmp_path / "sheets.xlsx"
+        ) as b:
+            assert a.namelist() == b.namelist()
+            for name in a.namelist():
+                if name != "docProps/core.xml":
+                    assert a.read(name) == b.read(name), name
+
+    def test_stats_merged(self, tmp_path):
+        """Worker statistics add up to the serial ones."""
+        from cpp_highlight.models import RunStats
+
+        input_path = tmp_path / "input.xlsx"
+        make_workbook(input_path)
+        serial, sheets = RunStats(), RunStats()
+
+        process_excel(str(input_path), str(tmp_path / "a.xlsx"), stats=serial)
+        process_excel(
+            str(input_path),
+            str(tmp_path / "b.xlsx"),
+            jobs=2,
+            per_sheet=True,
+            stats=sheets,
+        )
+        for name in ("cells_scanned", "cells_detected", "cells_highlighted"):
+            assert getattr(sheets, name) == getattr(serial, name)
+        assert sheets.lex_seconds.count == serial.lex_seconds.count
+        assert sheets.cache_misses["font"] >= serial.cache_misses["font"]
+
+    @pytest.mark.parametrize(
+        "options, ignored",
+        [([], True), (["-j", "2", "--max-memory", "1G"], True), (["-j", "2"], False)],
+    )
+    def test_cli_notes_ignored_flag(
+        self, tmp_path, monkeypatch, capsys, options, ignored
+    ):
+        """The CLI says when --per-sheet cannot be used."""
+        from cpp_highlight import cli
+
+        input_path = tmp_path / "input.xlsx"
+        make_workbook(input_path, sheets=2)
+        argv = ["cpp_highlight", str(input_path), "--per-sheet", *options]
+        monkeypatch.setattr(sys, "argv", argv)
+        cli.main()
+        assert ("--per-sheet is ignored" in capsys.readouterr().err) == ignored
+
+
+class TestMergeStyles:
+    """Style entries created in a workbook copy."""
+
+    def test_new_styles_renumbered(self):
+        """Styles are reused when known and appended when new."""
+        wb = Workbook()
+        wb.active["A1"].font = Font(bold=True)
+        base = style_snapshot(wb)
+
+        copy = Workbook()
+        copy.active["A1"].font = Font(bold=True)
+        copy_base = style_snapshot(copy)
+        assert copy_base == base
+        cell = copy.active["B1"]
+        cell.alignment = Alignment(wrap_text=True)
+        cell.number_format = "0.0000"
+        copy_id = cell.style_id
+
+        style_ids = merge_styles(wb, base, style_contributions(copy, copy_base))
+
+        merged = wb._cell_styles[style_ids[copy_id]]
+        assert wb._alignments[merged.alignmentId] == Alignment(wrap_text=True)
+        assert wb._number_formats[merged.numFmtId - 164] == "0.0000"
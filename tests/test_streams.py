@@ -0,0 +1,96 @@
+"""Tests for in-memory workbooks and stdin/stdout piping."""
+
+import io
+import sys
+import zipfile
+
+import openpyxl
+import pytest
+
+from cpp_highlight import cli
+from cpp_highlight.errors import WorkbookLoadError
+from cpp_highlight.processor import process_excel, process_excel_bytes
+
+CODE = "#include <vector>\nint main() {\n  return 0;\n}"
+SHEET = "xl/worksheets/sheet1.xml"
+
+
+def workbook_bytes(code=CODE):
+    wb = openpyxl.Workbook()
+    wb.active["A1"] = code
+    wb.create_sheet("Second")["B2"] = code
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def sheet_xml(workbook):
+    if isinstance(workbook, bytes):
+        workbook = io.BytesIO(workbook)
+    with zipfile.ZipFile(workbook) as z:
+        return z.read(SHEET)
+
+
+class TestInMemory:
+    """process_excel with bytes and file objects."""
+
+    def test_matches_files(self, tmp_path):
+        data = workbook_bytes()
+        input_path = tmp_path / "in.xlsx"
+        input_path.write_bytes(data)
+        expected = process_excel(str(input_path), str(tmp_path / "out.xlsx"))
+
+        output, count = process_excel_bytes(data)
+        assert count == expected == 2
+        assert sheet_xml(output) == sheet_xml(str(tmp_path / "out.xlsx"))
+
+    def test_streams(self):
+        output = io.BytesIO()
+        assert process_excel(io.BytesIO(workbook_bytes()), output) == 2
+        assert b"<is>" in sheet_xml(output.getvalue())
+
+    def test_per_sheet_jobs(self):
+        serial, _ = process_excel_bytes(workbook_bytes())
+        parallel, count = process_excel_bytes(workbook_bytes(), jobs=2, per_sheet=True)
+        assert count == 2
+        assert sheet_xml(parallel) == sheet_xml(serial)
+
+    def test_bad_bytes_raise(self):
+        with pytest.raises(WorkbookLoadError) as exc:
+            process_excel_bytes(b"not a workbook")
+        assert exc.value.path == "<bytes>"
+
+
+class TestPiping:
+    """- for stdin and stdout on the command line."""
+
+    def run_cli(self, monkeypatch, data, *args):
+        stdin = io.TextIOWrapper(io.BytesIO(data))
+        monkeypatch.setattr(sys, "stdin", stdin)
+        monkeypatch.setattr(sys, "argv", ["cpp_highlight", *map(str, args)])
+        cli.main()
+
+    def test_stdin_to_stdout(self, monkeypatch, capsysbinary):
+        self.run_cli(monkeypatch, workbook_bytes(), "-")
+        captured = capsysbinary.readouterr()
+        expected, _ = process_excel_bytes(workbook_bytes())
+        assert sheet_xml(captured.out) == sheet_xml(expected)
+        assert b"Processed 2 cells" in captured.err
+
+    def test_file_to_stdout(self, tmp_path, monkeypatch, capsysbinary):
+        input_path = tmp_path / "in.xlsx"
+        input_path.write_bytes(workbook_bytes())
+        self.run_cli(monkeypatch, b"", input_path, "-o", "-", "-v")
+        captured = capsysbinary.readouterr()
+        assert captured.out.startswith(b"PK")
+        assert b"Output: <stdout>" in captured.err
+
+    def test_stdin_to_file(self, tmp_path, monkeypatch, capsys):
+        output_path = tmp_path / "out.xlsx"
+        self.run_cli(monkeypatch, workbook_bytes(), "-", "-o", output_path)
+        assert "Input:  <stdin>" in capsys.readouterr().out
+        assert b"<is>" in sheet_xml(str(output_path))
+
+    def test_journal_rejected(self, monkeypatch):
+        with pytest.raises(SystemExit):
+            self.run_cli(monkeypatch, workbook_bytes(), "-", "--resume")
@@ -0,0 +1,62 @@
+"""Tests for highlighting in a thread pool."""
+
+import zipfile
+
+import openpyxl
+import pytest
+
+from cpp_highlight.config import ThemeConfig
+from cpp_highlight.core import CellHighlighter
+from cpp_highlight.models import RunStats
+from cpp_highlight.parallel import HighlightThreads
+from cpp_highlight.processor import process_excel
+
+
+def cells(count):
+    return [
+        (f"Sheet!A{k}", f"int f{k}(int x) {{\n  return x * {k}; // c{k}\n}}")
+        for k in range(count)
+    ]
+
+
+class TestHighlightThreads:
+    """HighlightThreads against serial highlighting."""
+
+    def test_matches_serial(self):
+        highlighter = CellHighlighter()
+        items = cells(300)
+        expected = [highlighter.highlight(text, loc) for loc, text in items]
+        with HighlightThreads(CellHighlighter(), 4, batch_size=16) as threads:
+            assert threads.highlight(items) == expected
+
+    def test_stats_merged(self):
+        stats = RunStats()
+        with HighlightThreads(CellHighlighter(), 3, batch_size=8, stats=stats) as t:
+            t.highlight_runs(cells(50))
+        assert stats.lex_seconds.count == 50
+
+    def test_theme_shared_read_only(self):
+        theme = ThemeConfig().frozen()
+        assert theme.colors["Keyword"] == ThemeConfig().colors["Keyword"]
+        with pytest.raises(TypeError):
+            theme.colors["Keyword"] = "000000"
+
+    def test_process_excel_threads(self, tmp_path):
+        input_path = tmp_path / "in.xlsx"
+        wb = openpyxl.Workbook()
+        for row, (_, text) in enumerate(cells(40), 1):
+            wb.active.cell(row=row, column=1, value=text)
+        wb.save(input_path)
+
+        serial = process_excel(str(input_path), str(tmp_path / "serial.xlsx"))
+        threaded = process_excel(
+            str(input_path), str(tmp_path / "threads.xlsx"), threads=3
+        )
+        assert serial == threaded == 40
+        sheet = "xl/worksheets/sheet1.xml"
+        with zipfile.ZipFile(tmp_path / "serial.xlsx") as a, zipfile.ZipFile(
+            tmp_path / "threads.xlsx"
+        ) as b:
+            assert a.read(sheet) == b.read(sheet)
+        with pytest.raises(ValueError):
+            process_excel(str(input_path), str(tmp_path / "x.xlsx"), jobs=2, threads=2)
@@ -0,0 +1,118 @@
+"""Tests for watch mode."""
+
+import os
+
+import pytest
+
+from cpp_highlight.watch import STATE_FILE, DirectoryWatcher
+
+
+class Recorder:
+    """process callback that remembers its calls."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, input_path, output_path):
+        self.calls.append((input_path.name, output_path.name))
+        output_path.write_bytes(b"output")
+
+
+def write(path, content, mtime):
+    """Write a file with a given mtime."""
+    path.write_bytes(content)
+    os.utime(path, (mtime, mtime))
+
+
+class TestDirectoryWatcher:
+    """Polling, debouncing and change detection."""
+
+    def test_new_file_processed_after_debounce(self, tmp_path):
+        process = Recorder()
+        watcher = DirectoryWatcher(str(tmp_path), process, debounce=1.0)
+        write(tmp_path / "spec.xlsx", b"v1", 1000)
+
+        assert watcher.run_once(now=0.0) == []
+        assert watcher.run_once(now=0.5) == []
+        assert [p.name for p in watcher.run_once(now=1.0)] == ["spec.xlsx"]
+        assert process.calls == [("spec.xlsx", "spec_output.xlsx")]
+
+        # Its own output is never picked up
+        assert watcher.run_once(now=5.0) == []
+        assert watcher.run_once(now=10.0) == []
+        assert len(process.calls) == 1
+
+    def test_growing_file_waits(self, tmp_path):
+        process = Recorder()
+        watcher = DirectoryWatcher(str(tmp_path), process, debounce=1.0)
+        write(tmp_path / "spec.xlsx", b"v", 1000)
+        watcher.run_once(now=0.0)
+        write(tmp_path / "spec.xlsx", b"v1 still copying", 1001)
+        assert watcher.run_once(now=1.0) == []
+        assert watcher.run_once(now=2.0) != []
+
+    def test_only_content_changes_reprocess(self, tmp_path):
+        process = Recorder()
+        watcher = DirectoryWatcher(str(tmp_path), process, debounce=0.0)
+        write(tmp_path / "spec.xlsx", b"v1", 1000)
+        watcher.run_once(now=0.0)
+        watcher.run_once(now=0.0)
+        assert len(process.calls) == 1
+
+        # Touched with the same content
+        write(tmp_path / "spec.xlsx", b"v1", 2000)
+        watcher.run_once(now=1.0)
+        watcher.run_once(now=1.0)
+        assert len(process.calls) == 1
+
+        write(tmp_path / "spec.xlsx", b"v2", 3000)
+        watcher.run_once(now=2.0)
+        watcher.run_once(now=2.0)
+        assert len(process.calls) == 2
+
+    def test_state_survives_restart(self, tmp_path):
+        process = Recorder()
+        write(tmp_path / "old.xlsx", b"v1", 1000)
+        watcher = DirectoryWatcher(str(tmp_path), process, debounce=0.0)
+        watcher.run_once(now=0.0)
+        watcher.run_once(now=0.0)
+        assert (tmp_path / STATE_FILE).exists()
+
+        write(tmp_path / "new.xlsx", b"v1", 1000)
+        restarted = DirectoryWatcher(str(tmp_path), process, debounce=0.0)
+        restarted.run_once(now=0.0)
+        restarted.run_once(now=0.0)
+        assert [call[0] for call in process.calls] == ["old.xlsx", "new.xlsx"]
+
+    def test_ignored_files(self, tmp_path):
+        process = Recorder()
+        watcher = DirectoryWatcher(str(tmp_path), process, debounce=0.0)
+        for name in ["~$spec.xlsx", "notes.txt", "report_output.xlsx"]:
+            write(tmp_path / name, b"x", 1000)
+        watcher.run_once(now=0.0)
+        watcher.run_once(now=0.0)
+        assert process.calls == []
+
+    def test_failure_does_not_stop_watching(self, tmp_path, sample_cpp_code):
+        from cpp_highlight.processor import _process_workbook
+
+        def process(input_path, output_path):
+            _process_workbook(str(input_path), str(output_path))
+
+        watcher = DirectoryWatcher(str(tmp_path), process, debounce=0.0)
+        write(tmp_path / "broken.xlsx", b"not a zip", 1000)
+        watcher.run_once(now=0.0)
+        assert watcher.run_once(now=0.0) != []
+        assert not (tmp_path / "broken_output.xlsx").exists()
+
+    def test_exit_not_swallowed(self, tmp_path):
+        """Only ProcessingError counts as a failed workbook."""
+
+        def process(input_path, output_path):
+            raise SystemExit(3)
+
+        watcher = DirectoryWatcher(str(tmp_path), process, debounce=0.0)
+        write(tmp_path / "a.xlsx", b"x", 1000)
+        watcher.run_once(now=0.0)
+        with pytest.raises(SystemExit):
+            watcher.run_once(now=0.0)
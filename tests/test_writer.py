@@ -0,0 +1,128 @@
+"""Tests for the fast rich-text writer."""
+
+import zipfile
+from zipfile import ZIP_DEFLATED, ZIP_STORED
+
+import openpyxl
+import pytest
+from openpyxl import LXML, Workbook
+from openpyxl.cell.rich_text import CellRichText, TextBlock as OrigTextBlock
+from openpyxl.cell.text import InlineFont
+
+from cpp_highlight.core import CellHighlighter
+from cpp_highlight.models import TextBlock
+from cpp_highlight.writer import COMPRESSION_MODES, SharedStrings, save_workbook
+
+
+def build_workbook(highlighter):
+    """Workbook mixing highlighted, hand-built and plain cells."""
+    wb = Workbook()
+    ws = wb.active
+    ws["A1"], _ = highlighter.highlight(
+        '#include <a&b>\nint main() {\n  return "x<y>&\\"" ; \n}'
+    )
+    ws["A1"].hyperlink = "http://example.com/?a=1&b=2"
+    ws["B2"] = CellRichText(
+        TextBlock(InlineFont(b=True), "  "),
+        TextBlock(InlineFont(), ""),
+        TextBlock(InlineFont(i=True), "x"),
+    )
+    ws["C3"] = CellRichText(OrigTextBlock(InlineFont(), "a "), "plain")
+    ws["D4"] = "text"
+    ws["D5"] = 3
+    other = wb.create_sheet("Other")
+    other["A1"], _ = highlighter.highlight("int x;\n\tint y;")
+    return wb
+
+
+class TestFastWriter:
+    """save_workbook output must equal openpyxl's."""
+
+    @pytest.mark.skipif(LXML, reason="openpyxl's lxml writer formats differently")
+    def test_output_identical(self, tmp_path):
+        """Every part of the saved file is byte-identical."""
+        highlighter = CellHighlighter()
+        default_path = tmp_path / "default.xlsx"
+        fast_path = tmp_path / "fast.xlsx"
+        build_workbook(highlighter).save(default_path)
+        save_workbook(build_workbook(highlighter), str(fast_path))
+
+        with zipfile.ZipFile(default_path) as a, zipfile.ZipFile(fast_path) as b:
+            assert a.namelist() == b.namelist()
+            for name in a.namelist():
+                assert a.read(name) == b.read(name), name
+
+    def test_rows_not_streamed_by_openpyxl(self, tmp_path, monkeypatch):
+        """Rows go through et_xmlfile even where openpyxl would use lxml."""
+        from openpyxl.worksheet import _writer as worksheet_writer
+
+        from cpp_highlight.writer import render_rows
+
+        def xmlfile(out):
+            raise AssertionError("openpyxl's stream used")
+
+        highlighter = CellHighlighter()
+        wb = build_workbook(highlighter)
+        rows = {id(wb["Other"]): render_rows(wb["Other"])}
+        monkeypatch.setattr(worksheet_writer, "xmlfile", xmlfile)
+        save_workbook(wb, str(tmp_path / "out.xlsx"), rows=rows)
+
+        saved = openpyxl.load_workbook(tmp_path / "out.xlsx")
+        assert saved["Other"]["A1"].value == "int x;\n\tint y;"
+        assert saved.active["D5"].value == 3
+
+    def test_to_xml_matches_to_tree(self):
+        """TextBlock.to_xml serializes like to_tree."""
+        from xml.etree.ElementTree import tostring
+
+        font = InlineFont(rFont="Consolas", sz=11)
+        for text in ["int", " x ", "\n", "a<b&c>d", "", "\t\t", "a b"]:
+            block = TextBlock(font, text)
+            assert block.to_xml() == tostring(block.to_tree(), encoding="unicode")
+
+    def test_openpyxl_untouched(self, tmp_path):
+        """Saving does not replace openpyxl's own writers."""
+        from openpyxl.worksheet import _writer as worksheet_writer
+        from openpyxl.writer import excel as excel_writer
+
+        def writers():
+            return (
+                worksheet_writer.write_cell,
+                excel_writer.WorksheetWriter,
+                excel_writer.WorkbookWriter,
+            )
+
+        original = writers()
+        save_workbook(Workbook(), str(tmp_path / "empty.xlsx"))
+        save_workbook(
+            Workbook(), str(tmp_path / "shared.xlsx"), strings=SharedStrings()
+        )
+        assert writers() == original
+
+
+class TestCompression:
+    """Output compression modes."""
+
+    @pytest.mark.parametrize("mode", list(COMPRESSION_MODES))
+    def test_round_trip(self, tmp_path, mode):
+        """Every mode produces a workbook with the same contents."""
+        path = tmp_path / f"{mode}.xlsx"
+        save_workbook(build_workbook(CellHighlighter()), str(path), mode)
+
+        wb = openpyxl.load_workbook(path, rich_text=True)
+        assert str(wb["Sheet"]["A1"].value).startswith("#include <a&b>")
+        assert wb["Sheet"]["D5"].value == 3
+        assert wb.sheetnames == ["Sheet", "Other"]
+
+    def test_part_compression(self, tmp_path):
+        """store leaves parts uncompressed; fast still deflates them."""
+        for mode, expected in [("store", ZIP_STORED), ("fast", ZIP_DEFLATED)]:
+            path = tmp_path / f"{mode}.xlsx"
+            save_workbook(build_workbook(CellHighlighter()), str(path), mode)
+            with zipfile.ZipFile(path) as archive:
+                types = {info.compress_type for info in archive.infolist()}
+            assert types == {expected}
+
+    def test_unknown_mode(self, tmp_path):
+        with pytest.raises(ValueError):
+            save_workbook(Workbook(), str(tmp_path / "x.xlsx"), "lz4")